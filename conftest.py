@@ -2,7 +2,7 @@
 import os
 import sys
 from pathlib import Path
-from typing import Generator
+from typing import Any, Dict, Generator, List
 from unittest.mock import patch
 
 import appdirs
@@ -72,6 +72,12 @@ def save_and_restore_sys_path(mocker: MockerFixture) -> None:
     mocker.patch("sys.path", list(sys.path))
 
 
+@pytest.fixture(autouse=True)
+def save_and_restore_sys_meta_path(mocker: MockerFixture) -> None:
+    """Saves and restores sys.meta_path."""
+    mocker.patch("sys.meta_path", list(sys.meta_path))
+
+
 @pytest.fixture(autouse=True)
 def save_and_restore_os_environ() -> Generator[None, None, None]:
     """Saves and restores os.environ."""
@@ -101,3 +107,16 @@ def mockpi(tmp_path: Path) -> Generator[MockPI, None, None]:
     mock_pi = MockPI(tmp_path / "mockpi")
     with mock_pi.server():
         yield mock_pi
+
+
+@pytest.fixture
+def events() -> Generator[List[Dict[str, Any]], None, None]:
+    """Fixture recording the profiling events"""
+    # scriptenv gets imported after the coverage measurement started
+    # pylint: disable=import-outside-toplevel
+    from scriptenv import profiling
+
+    recorded: List[profiling.Event] = []
+    profiling.add_hook(recorded.append)
+    yield recorded
+    profiling.remove_hook(recorded.append)
@@ -1,28 +1,73 @@
 """scriptenv"""
 from pathlib import Path
 
+from . import registry
 from .builder import ScriptEnvBuilder
-from .pipfile import parse_pipfile_lock
+from .lazy import LazyScriptEnv
+from .pipfile import read_pipfile_lock
+from .registry import invalidate
 from .scriptenv import ScriptEnv
 
-__all__ = ["ScriptEnv", "ScriptEnvBuilder", "requires", "from_pipfile_lock"]
+__all__ = [
+    "ScriptEnv",
+    "ScriptEnvBuilder",
+    "requires",
+    "requires_async",
+    "from_pipfile_lock",
+    "invalidate",
+]
 
 
-def requires(*requirements: str) -> ScriptEnv:
+def requires(*requirements: str, background: bool = False) -> ScriptEnv:
     """Makes each requirements available to import.
 
     Installs each requirement and dependency to a seperate directory
-    and adds each directory to the front of sys.path
+    and adds each directory to the front of sys.path.
+    Repeated calls with the same requirements reuse the already built ScriptEnv.
 
     Arguments:
         requirements: List of pip requirements required to be installed.
+        background: Returns immediately and builds the ScriptEnv in a thread.
+            Imports of modules named like the required projects or
+            known from an import index stored before, which can not be
+            found otherwise, wait until the ScriptEnv is built.
     """
-    builder = ScriptEnvBuilder()
-    env = builder.build(requirements)
+    env = (
+        LazyScriptEnv(
+            lambda: registry.get(requirements), registry.modules(requirements)
+        )
+        if background
+        else registry.get(requirements)
+    )
+    env.enable()
+    return env
+
+
+async def requires_async(*requirements: str) -> ScriptEnv:
+    """Makes each requirements available to import without blocking the event loop.
+
+    Resolves and installs the requirements in a thread,
+    several calls can be awaited concurrently.
+    The ScriptEnv gets enabled in the thread running the event loop.
+
+    Arguments:
+        requirements: List of pip requirements required to be installed.
+    """
+    env = await registry.get_async(requirements)
     env.enable()
     return env
 
 
 def from_pipfile_lock(pipfile_lock: Path) -> ScriptEnv:
-    """Creates a ScriptEnv based on a Pipfile.lock"""
-    return requires(*parse_pipfile_lock(pipfile_lock))
+    """Creates a ScriptEnv based on a Pipfile.lock
+
+    The pinned package files get downloaded directly from their index
+    and verified by their hashes without resolving their dependencies again.
+    Packages with markers not matching the current interpreter are skipped.
+
+    Arguments:
+        pipfile_lock: Path of the Pipfile.lock or the directory containing it.
+    """
+    entries = read_pipfile_lock(pipfile_lock)
+    ScriptEnvBuilder().lock_pinned(entries)
+    return requires(*(entry.requirement for entry in entries))
@@ -1,14 +1,28 @@
 """Installs packages and makes them available to import"""
 
-import hashlib
 import json
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
 from pathlib import Path
-from typing import Iterable, Optional, Set
+from typing import ContextManager, Dict, Iterable, List, Mapping, Optional, Set
 
-from . import pip
+from . import bytecode, lockfile, pack, pip, profiling, store
 from .config import Config
+from .finder import ImportIndex, build_index
+from .lock import lock_key, package_pin, packages_key
+from .lockfile import LockedPackage, Lockfile
+from .locking import file_lock, remove_file_lock
+from .pack import Archive
+from .pipfile import PipfileEntry, verify_hashes
 from .scriptenv import ScriptEnv
 
+# imports in threads building a ScriptEnv never wait for a ScriptEnv to be built
+BuildThreadPrefix = "scriptenv-"
+
 
 class ScriptEnvBuilder:
     """Builds a environment to import packages within a script."""
@@ -33,28 +47,460 @@ class ScriptEnvBuilder:
         """Paths where the downloaded packages are cached"""
         return self._config.cache_path / "cache"
 
-    def build(self, requirements: Iterable[str]) -> ScriptEnv:
-        """Builds a ScriptEnv."""
-        packages = self.fetch_requirements(requirements)
-        self.install_packages(packages)
-        return ScriptEnv(self.install_path, packages)
+    @property
+    def store_path(self) -> Path:
+        """Path where the content addressed files of installed packages are stored"""
+        return self._config.cache_path / "store"
+
+    @property
+    def bin_path(self) -> Path:
+        """Path where the binaries of each set of installed packages are linked"""
+        return self._config.cache_path / "bin"
+
+    @property
+    def mutex_path(self) -> Path:
+        """Path where the files to lock cache entries across processes are stored"""
+        return self._config.cache_path / "mutex"
+
+    def mutex(self, name: str) -> ContextManager[None]:
+        """Locks a cache entry exclusively across processes."""
+        return file_lock(self.mutex_path / f"{name}.lock")
+
+    def remove_mutex(self, name: str) -> None:
+        """Removes the file locking a cache entry once it is not locked anymore."""
+        remove_file_lock(self.mutex_path / f"{name}.lock")
+
+    def build(
+        self, requirements: Iterable[str], base: Optional[ScriptEnv] = None
+    ) -> ScriptEnv:
+        """
+        Builds a ScriptEnv.
+
+        With a base ScriptEnv the requirements get resolved against the packages
+        pinned by the base and the ScriptEnv is a layer containing only the
+        packages missing in the base.
+        ScriptEnvs packed before import their packages from the archive.
+        """
+        requirements = list(requirements)
+        pinned = base.pinned_packages() if base is not None else []
+        with profiling.measure("build", requirements=requirements):
+            lock = self.lock(requirements, pinned)
+            self._install_locked(requirements, pinned, lock)
+            packages = set(lock.packages)
+            archive = self._archive(requirements, pinned)
+            return ScriptEnv(
+                self.install_path,
+                packages,
+                index=None if archive else self._index(requirements, packages, pinned),
+                bin_path=self.link_binaries(packages),
+                base=base,
+                archive=archive,
+                config=self._config,
+            )
+
+    def pack(self, requirements: Iterable[str]) -> Archive:
+        """
+        Builds the ScriptEnv of a set of requirements and packs its packages
+        into a zip archive stored next to its lock file.
+        ScriptEnvs built afterwards import the packed packages from the archive,
+        a single sys.path entry instead of one directory per package.
+        """
+        requirements = list(requirements)
+        env = self.build(requirements)
+        archive_path = self._lockfile_path(requirements, []).with_suffix(".zip")
+        with profiling.measure("pack", packages=len(env.packages)):
+            with self.mutex(archive_path.name):
+                archive = pack.pack(self.install_path, env.packages, archive_path)
+                _write_atomic(
+                    archive_path.with_suffix(".packed"),
+                    json.dumps(archive.packages, indent=2),
+                )
+        return archive
+
+    def _archive(
+        self, requirements: Iterable[str], pinned: List[str]
+    ) -> Optional[Archive]:
+        packed_path = self._lockfile_path(requirements, pinned).with_suffix(".packed")
+        if not packed_path.is_file():
+            return None
+        return Archive(
+            packed_path.with_suffix(".zip"), tuple(json.loads(packed_path.read_text()))
+        )
+
+    async def build_async(self, requirements: Iterable[str]) -> ScriptEnv:
+        """Builds a ScriptEnv in a thread without blocking the event loop."""
+        # asyncio gets imported lazily to keep it out of the warm path
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        requirements = list(requirements)
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.build, requirements
+        )
 
-    def fetch_requirements(self, requirements: Iterable[str]) -> Set[str]:
-        """Resolves a set of requirements and returns a list of packages."""
-        lock = hashlib.md5("\n".join(requirements).encode("utf-8")).hexdigest()
-        lockfile_path = self.locks_path / lock
+    def fetch_requirements(
+        self, requirements: Iterable[str], pinned: Iterable[str] = ()
+    ) -> Set[str]:
+        """
+        Resolves a set of requirements and returns a list of packages.
+        Dependencies are resolved to the versions of the pinned packages,
+        which are not part of the returned packages.
+        """
+        return set(self.lock(requirements, pinned).packages)
 
-        if not lockfile_path.is_file() or not self._config.use_lockfile:
-            packages = pip.download(requirements, self.package_cache_path)
-            if not self._config.use_lockfile:
-                return packages
-            lockfile_path.write_text(json.dumps(list(packages), indent=2))
-        return set(json.loads(lockfile_path.read_text()))
+    def lock(self, requirements: Iterable[str], pinned: Iterable[str] = ()) -> Lockfile:
+        """
+        Resolves a set of requirements and returns the lock of its packages,
+        read from the lock file if the requirements were resolved before.
+        Lock files of unsupported versions are resolved again but kept.
+        Dependencies are resolved to the versions of the pinned packages,
+        which are not part of the lock.
+        """
+        pinned = list(pinned)
+        if not self._config.use_lockfile:
+            return self._resolve_lock(requirements, pinned)
+
+        lockfile_path = self._lockfile_path(requirements, pinned)
+        with profiling.measure("lock", cache_hit=lockfile_path.is_file()) as event:
+            if not event["cache_hit"]:
+                self._create_lockfile(requirements, pinned, lockfile_path)
+            _touch(lockfile_path)
+            return self._read_lockfile(requirements, pinned, lockfile_path)
+
+    def _read_lockfile(
+        self, requirements: Iterable[str], pinned: List[str], lockfile_path: Path
+    ) -> Lockfile:
+        try:
+            lock = _read_existing(lockfile_path)
+        except lockfile.UnsupportedVersion:
+            return self._resolve_lock(requirements, pinned)
+        return self.lock(requirements, pinned) if lock is None else lock
+
+    def _resolve_lock(self, requirements: Iterable[str], pinned: List[str]) -> Lockfile:
+        resolved = self._resolve(requirements, pinned)
+        return Lockfile(
+            {name: LockedPackage(url=url) for name, url in resolved.items()}
+        )
+
+    def _create_lockfile(
+        self, requirements: Iterable[str], pinned: List[str], lockfile_path: Path
+    ) -> None:
+        # processes missing the same lock file wait for the first one to resolve it
+        with self.mutex(lockfile_path.name):
+            if not lockfile_path.is_file():
+                resolved = self._resolve(requirements, pinned)
+                packages = lockfile.lock_packages(self.package_cache_path, resolved)
+                _write_atomic(lockfile_path, lockfile.dumps(Lockfile(packages)))
+
+    def lock_pinned(self, entries: Iterable[PipfileEntry]) -> None:
+        """
+        Creates the lock file of packages pinned by a Pipfile.lock
+        without resolving their dependencies again. The package file of each
+        entry is looked up on its index, downloaded and verified by its hashes.
+        Without lock files the packages get resolved when building the ScriptEnv.
+        """
+        entries = list(entries)
+        if not self._config.use_lockfile:
+            return
+        lockfile_path = self._lockfile_path(
+            [entry.requirement for entry in entries], []
+        )
+        with profiling.measure(
+            "lock_pinned", cache_hit=lockfile_path.is_file()
+        ) as event:
+            if not event["cache_hit"]:
+                self._create_pinned_lockfile(entries, lockfile_path)
+
+    def _create_pinned_lockfile(
+        self, entries: List[PipfileEntry], lockfile_path: Path
+    ) -> None:
+        with self.mutex(lockfile_path.name):
+            if not lockfile_path.is_file():
+                urls = self._find(entries)
+                with profiling.measure("fetch", packages=len(urls)):
+                    pip.fetch(
+                        urls.values(),
+                        self.package_cache_path,
+                        workers=self._config.download_workers,
+                        thread_name_prefix=f"{BuildThreadPrefix}download",
+                    )
+                packages = lockfile.lock_packages(self.package_cache_path, urls)
+                verify_hashes(
+                    entries,
+                    {name: package.sha256 for name, package in packages.items()},
+                )
+                _write_atomic(lockfile_path, lockfile.dumps(Lockfile(packages)))
+
+    def _find(self, entries: List[PipfileEntry]) -> Dict[str, str]:
+        urls: Dict[str, str] = {}
+        with profiling.measure("find", packages=len(entries)):
+            for index_url in sorted({entry.index_url or "" for entry in entries}):
+                urls.update(
+                    pip.find(
+                        {
+                            entry.requirement: entry.hashes
+                            for entry in entries
+                            if (entry.index_url or "") == index_url
+                        },
+                        index_url or None,
+                        workers=self._config.download_workers,
+                        thread_name_prefix=f"{BuildThreadPrefix}find",
+                    )
+                )
+        return urls
+
+    def _install_locked(
+        self, requirements: List[str], pinned: List[str], lock: Lockfile
+    ) -> None:
+        """
+        Installs the packages of a lock unless the lock file records them
+        as installed and compiled, then only their install paths get checked.
+        Packages neither installed nor cached get downloaded by their exact url.
+        """
+        state = "compiled" if self._config.use_precompilation else "installed"
+        _record_use(self.install_path, lock.packages)
+        if lock.reached(state) and self._installed(lock.packages):
+            return
+        self._fetch_locked(lock)
+        self.install_packages(lock.packages)
+        if self._config.use_lockfile:
+            self._advance_lockfile(
+                self._lockfile_path(requirements, pinned), lock, state, pinned
+            )
+
+    def _installed(self, packages: Iterable[str]) -> bool:
+        return all((self.install_path / package).exists() for package in packages)
+
+    def _fetch_locked(self, lock: Lockfile) -> None:
+        missing = {
+            name: package
+            for name, package in lock.packages.items()
+            if not (self.install_path / name).exists()
+        }
+        _record_use(self.package_cache_path, missing)
+        sources = [package.source for package in missing.values() if package.source]
+        with profiling.measure("fetch_locked", packages=len(sources)):
+            pip.fetch(
+                sources,
+                self.package_cache_path,
+                workers=self._config.download_workers,
+                thread_name_prefix=f"{BuildThreadPrefix}download",
+            )
+
+    def _advance_lockfile(
+        self, lockfile_path: Path, lock: Lockfile, state: str, pinned: List[str]
+    ) -> None:
+        # lock files removed by a garbage collection in the meantime stay removed,
+        # lock files of unsupported versions stay untouched
+        with self.mutex(lockfile_path.name), suppress(lockfile.UnsupportedVersion):
+            if lockfile_path.is_file():
+                lockfile.read(lockfile_path)
+                advanced = lockfile.advance(
+                    lock, state, self.package_cache_path, self.install_path, pinned
+                )
+                _write_atomic(lockfile_path, lockfile.dumps(advanced))
+
+    def _resolve(
+        self, requirements: Iterable[str], pinned: List[str]
+    ) -> Dict[str, Optional[str]]:
+        """Resolves requirements to the package files mapped to their urls if known."""
+        requirements = list(requirements)
+        constraints = [package_pin(package) for package in pinned]
+        if self._config.use_offline_resolution:
+            # falls back to the index if the cached packages are not sufficient
+            with suppress(pip.PipError), profiling.measure("offline_resolution"):
+                downloaded = pip.download(
+                    requirements,
+                    self.package_cache_path,
+                    constraints,
+                    find_links=self.package_cache_path,
+                )
+                return _without(dict.fromkeys(downloaded), pinned)
+        if not (
+            self._config.use_metadata_resolution and pip.supports_metadata_resolution()
+        ):
+            with profiling.measure("download"):
+                downloaded = pip.download(
+                    requirements, self.package_cache_path, constraints
+                )
+                return _without(dict.fromkeys(downloaded), pinned)
+
+        with profiling.measure("resolve"):
+            resolved = pip.resolve(requirements, self.package_cache_path, constraints)
+        with profiling.measure("fetch", packages=len(resolved)):
+            pip.fetch(
+                resolved.values(),
+                self.package_cache_path,
+                workers=self._config.download_workers,
+                thread_name_prefix=f"{BuildThreadPrefix}download",
+            )
+        return _without(resolved, pinned)
+
+    def import_index(
+        self,
+        requirements: Iterable[str],
+        packages: Iterable[str],
+        pinned: Iterable[str] = (),
+    ) -> ImportIndex:
+        """Returns the import index of the packages, stored next to the lock file."""
+        if not self._config.use_lockfile:
+            return build_index(self.install_path, packages)
+
+        index_path = self._index_path(requirements, pinned)
+        with profiling.measure("index", cache_hit=index_path.is_file()) as event:
+            if not event["cache_hit"]:
+                index = build_index(self.install_path, packages)
+                _write_atomic(index_path, json.dumps(index, indent=2))
+            return dict(json.loads(index_path.read_text()))
+
+    def indexed_modules(self, requirements: Iterable[str]) -> Set[str]:
+        """Top-level modules of the import index stored by a previous build."""
+        with suppress(OSError, ValueError):
+            return set(json.loads(self._index_path(requirements, []).read_text()))
+        return set()
+
+    def _index_path(self, requirements: Iterable[str], pinned: Iterable[str]) -> Path:
+        return self._lockfile_path(requirements, pinned).with_suffix(".index")
+
+    def _index(
+        self, requirements: Iterable[str], packages: Iterable[str], pinned: List[str]
+    ) -> Optional[ImportIndex]:
+        if not self._config.use_import_index:
+            return None
+        return self.import_index(requirements, packages, pinned)
+
+    def _lockfile_path(
+        self, requirements: Iterable[str], pinned: Iterable[str]
+    ) -> Path:
+        pinned = list(pinned)
+        if not pinned:
+            return self.locks_path / lock_key(requirements)
+        # layers get resolved differently depending on the packages of their base
+        return self.locks_path / f"{lock_key(requirements)}-{packages_key(pinned)}"
 
     def install_packages(self, packages: Iterable[str]) -> None:
-        """Installs a set of packages"""
-        for package in packages:
-            if not (self.install_path / package).exists():
-                pip.install(
-                    self.package_cache_path / package, self.install_path / package
+        """Installs a set of packages concurrently and precompiles them"""
+        packages = list(packages)
+        missing_packages = [
+            package
+            for package in packages
+            if not (self.install_path / package).exists()
+        ]
+        with profiling.measure(
+            "install_packages",
+            cache_hits=sorted(set(packages).difference(missing_packages)),
+        ), ThreadPoolExecutor(
+            max_workers=self._config.install_workers,
+            thread_name_prefix=f"{BuildThreadPrefix}install",
+        ) as executor:
+            list(executor.map(self._install_package, missing_packages))
+        if self._config.use_precompilation:
+            with profiling.measure("compile"):
+                bytecode.compile_packages(
+                    [self.install_path / package for package in packages],
+                    workers=self._config.install_workers,
+                    unchecked_hash=self._config.use_unchecked_pycs,
                 )
+
+    def link_binaries(self, packages: Iterable[str]) -> Path:
+        """
+        Returns a directory linking the binaries of all packages,
+        which gets created once for each set of packages.
+        """
+        packages = sorted(packages)
+        path = self.bin_path / packages_key(packages)
+        _record_use(self.bin_path, [path.name])
+        with profiling.measure("link_binaries", cache_hit=path.is_dir()) as event:
+            if not event["cache_hit"]:
+                self._create_bin_dir(packages, path)
+            return path
+
+    def _create_bin_dir(self, packages: Iterable[str], path: Path) -> None:
+        self.bin_path.mkdir(parents=True, exist_ok=True)
+        temp_path = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=self.bin_path))
+        try:
+            for binary in _binaries(self.install_path, packages):
+                _link(binary, temp_path / binary.name)
+            # fails if created concurrently
+            with suppress(OSError):
+                os.replace(temp_path, path)
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def _install_package(self, package: str) -> None:
+        # processes installing the same package wait for the first one to install it
+        with profiling.measure("install", package=package) as event:
+            with self.mutex(package):
+                # installed by another process in the meantime
+                event["cache_hit"] = (self.install_path / package).exists()
+                if not event["cache_hit"]:
+                    self._install_atomic(package)
+
+    def _install_atomic(self, package: str) -> None:
+        """
+        Installs a package into a temporary directory which gets renamed
+        when complete, an interrupted installation never appears as installed.
+        """
+        self.install_path.mkdir(parents=True, exist_ok=True)
+        temp_path = Path(tempfile.mkdtemp(prefix=f".{package}-", dir=self.install_path))
+        try:
+            pip.install(self.package_cache_path / package, temp_path)
+            if self._config.use_file_store:
+                store.link_tree(temp_path, self.store_path)
+            os.replace(temp_path, self.install_path / package)
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+
+def _without(
+    resolved: Mapping[str, Optional[str]], pinned: List[str]
+) -> Dict[str, Optional[str]]:
+    return {name: url for name, url in resolved.items() if name not in pinned}
+
+
+def _touch(path: Path) -> None:
+    """Records the access of a file, used to evict least recently used entries."""
+    with suppress(OSError):
+        os.utime(path)
+
+
+def _read_existing(path: Path) -> Optional[Lockfile]:
+    """Reads a lock file unless removed by a garbage collection since checked."""
+    with suppress(FileNotFoundError):
+        return lockfile.read(path)
+    return None
+
+
+def _record_use(base: Path, names: Iterable[str]) -> None:
+    """
+    Records the use of cache entries before checking if they exist,
+    a garbage collection removes only entries unused for its grace period
+    and moves entries back which got used while removing them.
+    """
+    for name in names:
+        _touch(base / name)
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    """Writes a file which other processes see either complete or not at all."""
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    temp_path.write_text(content)
+    os.replace(temp_path, path)
+
+
+def _binaries(install_path: Path, packages: Iterable[str]) -> Iterable[Path]:
+    """Binaries of all packages, the first package providing a name wins."""
+    binaries: Dict[str, Path] = {}
+    for package in packages:
+        for binary in sorted(
+            filter(Path.is_file, (install_path / package / "bin").glob("*"))
+        ):
+            binaries.setdefault(binary.name, binary)
+    return binaries.values()
+
+
+def _link(source: Path, link: Path) -> None:
+    try:
+        link.symlink_to(source)
+    except OSError:
+        # creating symlinks can require privileges on windows
+        shutil.copy2(source, link)
@@ -0,0 +1,51 @@
+"""Precompiles the bytecode of installed packages"""
+
+import subprocess
+import sys
+from contextlib import suppress
+from pathlib import Path
+from typing import Iterable, List
+
+CompiledMarker = ".scriptenv-compiled"
+
+
+def compile_packages(
+    package_paths: Iterable[Path], workers: int, unchecked_hash: bool = False
+) -> None:
+    """
+    Compiles the bytecode of each package which was not compiled yet.
+
+    compileall runs in a subprocess with a pool of workers,
+    which avoids re-importing the __main__ module of the current process.
+    Installed packages are never modified, therefore the bytecode can be
+    compiled with unchecked hashes to skip validating the sources on import.
+    """
+    package_paths = [
+        path for path in package_paths if not (path / CompiledMarker).exists()
+    ]
+    if package_paths:
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "compileall",
+                "-qq",
+                "-j",
+                str(workers),
+                *_invalidation_mode(unchecked_hash),
+                *map(str, package_paths),
+            ],
+            stdout=subprocess.DEVNULL,
+            check=False,
+        )
+        _mark_compiled(package_paths)
+
+
+def _invalidation_mode(unchecked_hash: bool) -> List[str]:
+    return ["--invalidation-mode", "unchecked-hash"] if unchecked_hash else []
+
+
+def _mark_compiled(package_paths: Iterable[Path]) -> None:
+    for path in package_paths:
+        with suppress(OSError):
+            (path / CompiledMarker).touch()
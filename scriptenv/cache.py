@@ -0,0 +1,214 @@
+"""Garbage collection of the cache directories"""
+
+import os
+import shutil
+import time
+import uuid
+from contextlib import suppress
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+from . import lockfile
+from .builder import ScriptEnvBuilder
+from .config import Config
+from .lock import packages_key
+
+# entries used more recently may belong to a build in progress or a running process
+GracePeriod = 3600.0
+
+
+class _Lock(NamedTuple):
+    path: Path
+    accessed: float
+    packages: FrozenSet[str]
+
+
+def collect_garbage(
+    config: Optional[Config] = None,
+    max_size: Optional[int] = None,
+    max_age: Optional[float] = None,
+) -> List[Path]:
+    """
+    Removes the least recently used lock files exceeding a budget
+    and all installed packages and downloaded artifacts
+    which are not referenced by the remaining lock files anymore.
+    Entries used within the grace period are kept, builds record the use
+    of each entry before checking it exists and entries used while
+    getting removed are moved back.
+
+    Arguments:
+        config: Config of the cache to clean up.
+        max_size: Approximate size in bytes of the packages to keep.
+        max_age: Seconds since the last use of a lock file to keep it.
+
+    Returns:
+        List of removed paths.
+    """
+    builder = ScriptEnvBuilder(config)
+    trash = builder.locks_path.parent / "trash"
+    locks = _read_locks(builder.locks_path)
+    live = _within_size(_within_age(locks, max_age), max_size, builder)
+    removed = [
+        path
+        for lock in locks
+        if lock not in live
+        for path in _evict_lock(builder, lock, trash)
+    ]
+    # lock files created in the meantime are referencing packages too
+    locks = _read_locks(builder.locks_path)
+    removed += [
+        path
+        for package in _unreferenced(builder, locks)
+        for path in _evict_package(builder, package, trash)
+    ]
+    removed += [
+        path
+        for bin_path in _unreferenced_bin_paths(builder, locks)
+        for path in _evict(bin_path, [bin_path], trash)
+    ]
+    shutil.rmtree(trash, ignore_errors=True)
+    _remove_unlinked(builder.store_path)
+    return removed
+
+
+def _read_locks(locks_path: Path) -> List[_Lock]:
+    locks = [_read_lock(path) for path in locks_path.glob("*") if not path.suffix]
+    return sorted((lock for lock in locks if lock), key=lambda lock: -lock.accessed)
+
+
+def _read_lock(path: Path) -> Optional[_Lock]:
+    try:
+        packages = frozenset(lockfile.read(path).packages)
+        return _Lock(path, path.stat().st_mtime, packages)
+    except (OSError, ValueError, LookupError, TypeError):
+        return None
+
+
+def _within_age(locks: List[_Lock], max_age: Optional[float]) -> List[_Lock]:
+    if max_age is None:
+        return locks
+    return [lock for lock in locks if time.time() - lock.accessed <= max_age]
+
+
+def _within_size(
+    locks: List[_Lock], max_size: Optional[int], builder: ScriptEnvBuilder
+) -> List[_Lock]:
+    if max_size is None:
+        return locks
+    totals = accumulate(_added_sizes(locks, builder))
+    return [lock for total, lock in zip(totals, locks) if total <= max_size]
+
+
+def _added_sizes(locks: Iterable[_Lock], builder: ScriptEnvBuilder) -> Iterable[int]:
+    referenced: FrozenSet[str] = frozenset()
+    for lock in locks:
+        yield sum(
+            _package_size(builder, package) for package in lock.packages - referenced
+        )
+        referenced |= lock.packages
+
+
+def _package_size(builder: ScriptEnvBuilder, package: str) -> int:
+    return _size(builder.install_path / package) + _size(
+        builder.package_cache_path / package
+    )
+
+
+def _size(path: Path) -> int:
+    return sum(
+        entry.lstat().st_size for entry in [path, *path.rglob("*")] if entry.is_file()
+    )
+
+
+def _evict_lock(builder: ScriptEnvBuilder, lock: _Lock, trash: Path) -> List[Path]:
+    with builder.mutex(lock.path.name):
+        if _read_lock(lock.path) != lock or not _expired(lock.path):
+            return []  # used since it was read or within the grace period
+        removed = _evict(
+            lock.path, [lock.path, *lock.path.parent.glob(f"{lock.path.name}.*")], trash
+        )
+    # the lock file and the packed archive have a mutex each
+    for path in removed:
+        builder.remove_mutex(path.name)
+    return removed
+
+
+def _unreferenced(builder: ScriptEnvBuilder, locks: Iterable[_Lock]) -> Set[str]:
+    entries = {
+        path.name
+        for base in [builder.install_path, builder.package_cache_path]
+        if base.is_dir()
+        for path in base.iterdir()
+    }
+    return entries.difference(*(lock.packages for lock in locks))
+
+
+def _unreferenced_bin_paths(
+    builder: ScriptEnvBuilder, locks: Iterable[_Lock]
+) -> List[Path]:
+    referenced = {packages_key(lock.packages) for lock in locks}
+    paths = builder.bin_path.iterdir() if builder.bin_path.is_dir() else []
+    return [path for path in paths if path.name not in referenced and _expired(path)]
+
+
+def _evict_package(builder: ScriptEnvBuilder, package: str, trash: Path) -> List[Path]:
+    paths = [builder.install_path / package, builder.package_cache_path / package]
+    with builder.mutex(package):
+        removed = [
+            removed_path
+            for path in paths
+            if _expired(path)
+            for removed_path in _evict(path, [path], trash)
+        ]
+    if not any(os.path.lexists(path) for path in paths):
+        builder.remove_mutex(package)
+    return removed
+
+
+def _expired(path: Path) -> bool:
+    with suppress(OSError):
+        return time.time() - path.lstat().st_mtime > GracePeriod
+    return False
+
+
+def _evict(used: Path, paths: Iterable[Path], trash: Path) -> List[Path]:
+    """
+    Moves paths into the trash, or back if the path recording their use
+    got used while moving them. Returns the removed paths.
+    """
+    moved = _move_to_trash(paths, trash)
+    if used in moved and not _expired(moved[used]):
+        for path, dest in moved.items():
+            # entries created again in the meantime are kept
+            with suppress(OSError):
+                os.replace(dest, path)
+        return []
+    return list(moved)
+
+
+def _move_to_trash(paths: Iterable[Path], trash: Path) -> Dict[Path, Path]:
+    """
+    Moves each path atomically into the trash before deleting it,
+    processes using the cache see either the complete entry or none.
+    Returns the moved paths mapped to their path in the trash.
+    """
+    trash.mkdir(parents=True, exist_ok=True)
+    moved = {path: trash / uuid.uuid4().hex for path in paths}
+    return {path: dest for path, dest in moved.items() if _move(path, dest)}
+
+
+def _move(path: Path, dest: Path) -> bool:
+    try:
+        os.replace(path, dest)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _remove_unlinked(store: Path) -> None:
+    """Removes stored files which are not linked by any installed package."""
+    for path in store.glob("*/*"):
+        with suppress(FileNotFoundError):
+            if path.stat().st_nlink == 1:
+                path.unlink()
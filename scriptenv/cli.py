@@ -1,11 +1,16 @@
 """command line interface for scriptenv"""
 
 import argparse
+import socket
 import subprocess
 import sys
-from typing import Iterable, List, Optional
+from pathlib import Path
+from typing import Any, Iterable, List, Optional
 
-from . import requires
+from . import cache, prefetch, requires
+from .builder import ScriptEnvBuilder
+
+SizeUnits = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
 
 
 def run(requirements: Iterable[str], cmd: Iterable[str]) -> int:
@@ -14,6 +19,61 @@ def run(requirements: Iterable[str], cmd: Iterable[str]) -> int:
     return subprocess.run(list(cmd), check=False).returncode
 
 
+def serve() -> int:
+    """Runs a daemon serving builds to other processes until interrupted."""
+    if not hasattr(socket, "AF_UNIX"):
+        print("the daemon requires Unix sockets, not supported here", file=sys.stderr)
+        return 1
+    # the daemon gets imported lazily, its server requires Unix sockets
+    from . import daemon  # pylint: disable=import-outside-toplevel
+
+    daemon.serve()
+    return 0
+
+
+def prefetch_scripts(paths: Iterable[Path]) -> int:
+    """Builds the environments required by scripts without running them."""
+    prefetched = prefetch.prefetch(paths)
+    for requirements in prefetched.built:
+        print(f"prefetched {' '.join(requirements)}")
+    for requirements, error in prefetched.failed:
+        print(f"failed {' '.join(requirements)}: {error!r}", file=sys.stderr)
+    return 1 if prefetched.failed else 0
+
+
+def pack(requirements: Iterable[str]) -> int:
+    """Packs the packages of an environment into a single zip archive."""
+    archive = ScriptEnvBuilder().pack(requirements)
+    print(f"packed {' '.join(archive.packages)} into {archive.path}")
+    return 0
+
+
+def cache_gc(max_size: Optional[int], max_age: Optional[float]) -> int:
+    """Removes least recently used cache entries exceeding a budget."""
+    for path in cache.collect_garbage(
+        max_size=max_size, max_age=None if max_age is None else max_age * 86400
+    ):
+        print(f"removed {path}")
+    return 0
+
+
+def _size(value: str) -> int:
+    unit = SizeUnits.get(value[-1:].upper(), 1)
+    return int(float(value.rstrip("kKmMgG")) * unit)
+
+
+def _add_cache_parser(subparsers: Any) -> None:
+    cache_parser = subparsers.add_parser("cache")
+    cache_subparsers = cache_parser.add_subparsers(dest="cache_command", required=True)
+
+    gc_parser = cache_subparsers.add_parser("gc")
+    gc_parser.add_argument("--max-size", type=_size, default=None)
+    gc_parser.add_argument("--max-age", type=float, default=None, help="in days")
+    gc_parser.set_defaults(
+        func=lambda args: cache_gc(max_size=args.max_size, max_age=args.max_age)
+    )
+
+
 def main(args: Optional[List[str]] = None) -> int:
     """scriptenv cli main entrypoint"""
     if args is None:
@@ -31,5 +91,18 @@ def main(args: Optional[List[str]] = None) -> int:
     run_parser.add_argument("command", nargs="+", type=str)
     run_parser.set_defaults(func=lambda args: run(args.requires, cmd=args.command))
 
+    prefetch_parser = subparsers.add_parser("prefetch")
+    prefetch_parser.add_argument("paths", nargs="+", type=Path)
+    prefetch_parser.set_defaults(func=lambda args: prefetch_scripts(args.paths))
+
+    pack_parser = subparsers.add_parser("pack")
+    pack_parser.add_argument("requirements", nargs="+", type=str)
+    pack_parser.set_defaults(func=lambda args: pack(args.requirements))
+
+    daemon_parser = subparsers.add_parser("daemon")
+    daemon_parser.set_defaults(func=lambda args: serve())
+
+    _add_cache_parser(subparsers)
+
     parsed = parser.parse_args(args)
     return parsed.func(parsed)  # type: ignore
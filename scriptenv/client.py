@@ -0,0 +1,107 @@
+"""Requests builds from the daemon serving a cache"""
+
+import json
+import os
+import socket
+import sys
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from .config import Config
+from .lock import interpreter_tag
+from .pack import Archive
+from .scriptenv import ScriptEnv
+
+# seconds to wait for the reply of the daemon before building in-process
+RequestTimeout = 300.0
+# environment variables configuring pip besides those prefixed with PIP_,
+# e.g. proxies, certificates and the locations of pip's config files
+PipEnvironVariables = frozenset(
+    {
+        "HTTP_PROXY",
+        "HTTPS_PROXY",
+        "ALL_PROXY",
+        "NO_PROXY",
+        "REQUESTS_CA_BUNDLE",
+        "CURL_CA_BUNDLE",
+        "SSL_CERT_FILE",
+        "SSL_CERT_DIR",
+        "NETRC",
+        "HOME",
+        "XDG_CONFIG_HOME",
+        "XDG_CONFIG_DIRS",
+    }
+)
+
+
+def socket_path(config: Config) -> Path:
+    """Path of the socket the daemon of a cache listens on"""
+    return config.cache_path / "daemon.sock"
+
+
+def pip_configuration() -> Dict[str, Any]:
+    """
+    Environment variables of this process configuring pip
+    and the prefix of the interpreter, pip reads a config file from it.
+    """
+    environ = {
+        name: value
+        for name, value in os.environ.items()
+        if name.startswith("PIP_") or name.upper() in PipEnvironVariables
+    }
+    return dict(environ=environ, prefix=sys.prefix)
+
+
+def build(requirements: Iterable[str], config: Config) -> Optional[ScriptEnv]:
+    """
+    Builds a ScriptEnv by the daemon serving the cache of a config.
+    Returns None if no daemon is running, it runs on another interpreter
+    or with another pip configuration, fails or does not reply in time.
+    """
+    response = _request(
+        socket_path(config),
+        dict(
+            requirements=list(requirements),
+            config=_config_values(config),
+            interpreter=interpreter_tag(),
+            pip_configuration=pip_configuration(),
+        ),
+    )
+    if response is None or "fallback" in response:
+        return None
+    return ScriptEnv(
+        Path(response["install_path"]),
+        response["packages"],
+        index=response["index"],
+        bin_path=response["bin_path"] and Path(response["bin_path"]),
+        archive=_archive(response.get("archive")),
+        config=config,
+    )
+
+
+def _archive(value: Optional[List[Any]]) -> Optional[Archive]:
+    if value is None:
+        return None
+    path, packages = value
+    return Archive(Path(path), tuple(packages))
+
+
+def _config_values(config: Config) -> Dict[str, Any]:
+    """Config values to build with, the daemon serves only its own cache path."""
+    values = asdict(config)
+    del values["cache_path"]
+    return values
+
+
+def _request(path: Path, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        with socket.socket(socket.AF_UNIX) as connection:
+            connection.settimeout(RequestTimeout)
+            connection.connect(str(path))
+            connection.sendall(json.dumps(request).encode() + b"\n")
+            return dict(json.loads(connection.makefile("rb").readline()))
+    except (AttributeError, OSError, ValueError):
+        # no daemon is running, it did not reply in time
+        # or sockets are not supported on this platform
+        return None
@@ -30,7 +30,7 @@ def _bool_from_env(value: str) -> bool:
 
 
 @dataclass(frozen=True)
-class Config:
+class Config:  # pylint: disable=too-many-instance-attributes
     """Holds scriptenv config values."""
 
     cache_path: Path = field(
@@ -47,3 +47,59 @@ class Config:
             cast=_bool_from_env,
         )
     )
+    use_import_index: bool = field(
+        default_factory=_default_factory(
+            factory=lambda: False,
+            env_name="USE_IMPORT_INDEX",
+            cast=_bool_from_env,
+        )
+    )
+    use_metadata_resolution: bool = field(
+        default_factory=_default_factory(
+            factory=lambda: False,
+            env_name="USE_METADATA_RESOLUTION",
+            cast=_bool_from_env,
+        )
+    )
+    use_offline_resolution: bool = field(
+        default_factory=_default_factory(
+            factory=lambda: False,
+            env_name="USE_OFFLINE_RESOLUTION",
+            cast=_bool_from_env,
+        )
+    )
+    use_file_store: bool = field(
+        default_factory=_default_factory(
+            factory=lambda: True,
+            env_name="USE_FILE_STORE",
+            cast=_bool_from_env,
+        )
+    )
+    use_precompilation: bool = field(
+        default_factory=_default_factory(
+            factory=lambda: True,
+            env_name="USE_PRECOMPILATION",
+            cast=_bool_from_env,
+        )
+    )
+    use_unchecked_pycs: bool = field(
+        default_factory=_default_factory(
+            factory=lambda: False,
+            env_name="USE_UNCHECKED_PYCS",
+            cast=_bool_from_env,
+        )
+    )
+    install_workers: int = field(
+        default_factory=_default_factory(
+            factory=lambda: os.cpu_count() or 1,
+            env_name="INSTALL_WORKERS",
+            cast=int,
+        )
+    )
+    download_workers: int = field(
+        default_factory=_default_factory(
+            factory=lambda: 8,
+            env_name="DOWNLOAD_WORKERS",
+            cast=int,
+        )
+    )
@@ -0,0 +1,92 @@
+"""Daemon which builds ScriptEnvs for other processes sharing its cache"""
+
+import json
+import socketserver
+import threading
+from contextlib import suppress
+from dataclasses import replace
+from typing import Any, Dict, Optional
+
+from . import pip
+from .builder import ScriptEnvBuilder
+from .client import pip_configuration, socket_path
+from .config import Config
+from .lock import interpreter_tag
+from .scriptenv import ScriptEnv
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves build requests on the socket of a cache.
+    Builds run one after another with pip kept imported.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config: Config) -> None:
+        """Initializes a Server listening on the socket of a cache."""
+        self.config = config
+        self._build_lock = threading.Lock()
+        socket_path(config).parent.mkdir(parents=True, exist_ok=True)
+        # left over by a daemon which did not shut down properly
+        with suppress(FileNotFoundError):
+            socket_path(config).unlink()
+        super().__init__(str(socket_path(config)), _Handler)
+
+    def server_close(self) -> None:
+        """Closes the server and removes its socket."""
+        super().server_close()
+        with suppress(FileNotFoundError):
+            socket_path(self.config).unlink()
+
+    def build(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Builds a ScriptEnv for a request and returns the response.
+        Requests of clients running on another interpreter get refused,
+        the packages built for the interpreter of the daemon would not match.
+        Requests of clients with another pip configuration get refused,
+        e.g. other indexes, proxies or certificates.
+        """
+        if request.get("interpreter") != interpreter_tag():
+            return dict(fallback=f"interpreter {interpreter_tag()}")
+        if request.get("pip_configuration") != pip_configuration():
+            return dict(fallback="pip configuration")
+        return self._build(request)
+
+    def _build(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            env = self._build_env(request)
+        except Exception as error:  # pylint: disable=broad-except
+            # the client builds in-process and gets the error itself
+            return dict(fallback=repr(error))
+        return _response(env)
+
+    def _build_env(self, request: Dict[str, Any]) -> ScriptEnv:
+        config = replace(self.config, **request["config"])
+        with self._build_lock:
+            return ScriptEnvBuilder(config).build(request["requirements"])
+
+
+def _response(env: ScriptEnv) -> Dict[str, Any]:
+    return dict(
+        install_path=str(env.packages_path),
+        packages=env.packages,
+        index=env.index,
+        bin_path=env.bin_path and str(env.bin_path),
+        archive=env.archive and [str(env.archive.path), env.archive.packages],
+    )
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: Server
+
+    def handle(self) -> None:
+        request = json.loads(self.rfile.readline())
+        self.wfile.write(json.dumps(self.server.build(request)).encode() + b"\n")
+
+
+def serve(config: Optional[Config] = None) -> None:
+    """Serves build requests until interrupted."""
+    with Server(config or Config()) as server, pip.keep_session():
+        with suppress(KeyboardInterrupt):
+            server.serve_forever()
@@ -0,0 +1,98 @@
+"""Finds top-level modules of a ScriptEnv using a precomputed index"""
+
+import inspect
+from abc import abstractmethod
+from importlib.abc import MetaPathFinder
+from importlib.machinery import ModuleSpec, PathFinder
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+ImportIndex = Dict[str, List[str]]
+NonModuleDirectories = ["bin", "__pycache__"]
+
+
+class TopLevelFinder(MetaPathFinder):
+    """Finds top-level modules only, submodules are found by their packages."""
+
+    def find_spec(  # pylint: disable=unused-argument
+        self,
+        fullname: str,
+        path: Optional[Sequence[Union[bytes, str]]],
+        target: Optional[ModuleType] = None,
+    ) -> Optional[ModuleSpec]:
+        """Finds the spec of a top-level module."""
+        if path is not None:
+            return None
+        return self.find_top_level_spec(fullname)
+
+    @abstractmethod
+    def find_top_level_spec(self, fullname: str) -> Optional[ModuleSpec]:
+        """Finds the spec of a top-level module, None if not found."""
+
+
+class IndexFinder(TopLevelFinder):
+    """Resolves top-level imports with a single lookup in an ImportIndex."""
+
+    def __init__(
+        self, install_base: Path, index: ImportIndex, packages: Iterable[str] = ()
+    ) -> None:
+        """
+        Initializes a IndexFinder.
+        The distributions of the packages and of the indexed packages
+        are found by importlib.metadata.
+        """
+        self._paths = {
+            name: [str(install_base / package) for package in providers]
+            for name, providers in index.items()
+        }
+        indexed = (package for providers in index.values() for package in providers)
+        self._package_paths = [
+            str(install_base / package)
+            for package in dict.fromkeys([*packages, *indexed])
+        ]
+
+    def find_top_level_spec(self, fullname: str) -> Optional[ModuleSpec]:
+        """Finds the spec of a top-level module in the indexed packages."""
+        paths = self._paths.get(fullname)
+        if paths is None:
+            return None
+        return PathFinder.find_spec(fullname, paths)
+
+    def find_distributions(self, context: Any = None) -> Iterable[Any]:
+        """Finds the distributions of the packages for importlib.metadata."""
+        # importlib.metadata gets imported lazily to keep it out of the warm path
+        # pylint: disable=import-outside-toplevel
+        from importlib.metadata import DistributionFinder, MetadataPathFinder
+
+        name = getattr(context, "name", None)
+        return MetadataPathFinder.find_distributions(
+            DistributionFinder.Context(name=name, path=self._package_paths)
+        )
+
+
+def build_index(install_base: Path, packages: Iterable[str]) -> ImportIndex:
+    """Maps each top-level module to the packages providing it."""
+    index: ImportIndex = {}
+    for package in packages:
+        for name in _top_level_modules(install_base / package):
+            index.setdefault(name, []).append(package)
+    return index
+
+
+def _top_level_modules(package_path: Path) -> Iterable[str]:
+    return {
+        name for name in map(_module_name, package_path.iterdir()) if name is not None
+    }
+
+
+def _module_name(path: Path) -> Optional[str]:
+    if path.is_dir():
+        return _package_name(path)
+    return inspect.getmodulename(str(path))
+
+
+def _package_name(path: Path) -> Optional[str]:
+    if path.name.isidentifier() and path.name not in NonModuleDirectories:
+        return path.name
+    return None
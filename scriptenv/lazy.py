@@ -0,0 +1,152 @@
+"""ScriptEnvs built in the background while the script keeps running"""
+
+import importlib.util
+import sys
+import threading
+from concurrent.futures import Future
+from importlib.abc import Loader
+from importlib.machinery import ModuleSpec
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Iterable, Optional
+
+from .builder import BuildThreadPrefix
+from .finder import TopLevelFinder
+from .scriptenv import ScriptEnv
+
+
+class LazyScriptEnv(ScriptEnv):
+    """
+    ScriptEnv which gets built in a background thread.
+
+    While it is not built yet, an enabled LazyScriptEnv adds a finder
+    to the end of sys.meta_path. Imports of the top-level modules
+    the ScriptEnv is known to provide, which can not be found otherwise,
+    wait until the whole ScriptEnv is built and retry with it enabled,
+    not only until the package providing the module is installed.
+    Until then importlib.util.find_spec finds a placeholder for these modules.
+    """
+
+    def __init__(
+        self, build: Callable[[], ScriptEnv], modules: Iterable[str] = ()
+    ) -> None:
+        """
+        Initializes a LazyScriptEnv and starts building it in the background.
+
+        Arguments:
+            build: Builds the ScriptEnv.
+            modules: Top-level modules imports of which wait for the build.
+        """
+        super().__init__(Path(), [])
+        self._ready = False
+        self._lock = threading.RLock()
+        self._future: "Future[ScriptEnv]" = Future()
+        self._hook = _WaitingFinder(self._future.done, self.wait, modules)
+        threading.Thread(
+            target=_run,
+            args=(build, self._future),
+            name=f"{BuildThreadPrefix}build",
+            daemon=True,
+        ).start()
+
+    def wait(self) -> None:
+        """
+        Blocks until the ScriptEnv is built
+        and enables it if the LazyScriptEnv was enabled.
+        Errors raised while building are raised here.
+        """
+        env = self._future.result()
+        with self._lock:
+            if not self._ready:
+                self._take_over(env)
+
+    def _take_over(self, env: ScriptEnv) -> None:
+        enabled = self._hook in sys.meta_path
+        self.disable()
+        super().__init__(
+            env.packages_path,
+            env.packages,
+            index=env.index,
+            bin_path=env.bin_path,
+            base=env.base,
+            archive=env.archive,
+            config=env.config,
+        )
+        self._ready = True
+        if enabled:
+            self.enable()
+
+    def add(self, *requirements: str) -> ScriptEnv:
+        """Waits until the ScriptEnv is built and adds a layer on top of it."""
+        self.wait()
+        return super().add(*requirements)
+
+    def enable(self) -> None:
+        """Enables the ScriptEnv if built, otherwise imports wait for it."""
+        if self._future.done() and self._future.exception() is None:
+            self.wait()
+        if self._ready:
+            super().enable()
+        else:
+            self.disable()
+            sys.meta_path.append(self._hook)
+
+    def disable(self) -> None:
+        """Disables the ScriptEnv and stops imports waiting for it."""
+        sys.meta_path = [finder for finder in sys.meta_path if finder is not self._hook]
+        super().disable()
+
+
+class _WaitingFinder(TopLevelFinder):
+    def __init__(
+        self,
+        built: Callable[[], bool],
+        wait: Callable[[], None],
+        modules: Iterable[str],
+    ) -> None:
+        self._built = built
+        self._wait = wait
+        self._modules = frozenset(modules)
+
+    def find_top_level_spec(self, fullname: str) -> Optional[ModuleSpec]:
+        """Finds modules which were not found by other finders in the ScriptEnv."""
+        # threads building ScriptEnvs would wait for themselves
+        if _in_build_thread():
+            return None
+        if not self._built():
+            # finders get called holding the global import lock,
+            # waiting there would block the imports of the building thread
+            return (
+                ModuleSpec(fullname, _WaitingLoader(self._wait))
+                if fullname in self._modules
+                else None
+            )
+        self._wait()
+        return importlib.util.find_spec(fullname)
+
+
+class _WaitingLoader(Loader):
+    def __init__(self, wait: Callable[[], None]) -> None:
+        self._wait = wait
+
+    def create_module(self, spec: ModuleSpec) -> Optional[ModuleType]:
+        return None
+
+    def exec_module(self, module: ModuleType) -> None:
+        """Imports the module after the whole ScriptEnv is built."""
+        # replaces itself in sys.modules by the module of the built ScriptEnv,
+        # removed before waiting to not be taken for a module imported before
+        del sys.modules[module.__name__]
+        self._wait()
+        sys.modules[module.__name__] = importlib.import_module(module.__name__)
+
+
+def _in_build_thread() -> bool:
+    return threading.current_thread().name.startswith(BuildThreadPrefix)
+
+
+def _run(build: Callable[[], ScriptEnv], future: "Future[ScriptEnv]") -> None:
+    try:
+        future.set_result(build())
+    except BaseException as error:  # pylint: disable=broad-except
+        future.set_exception(error)
@@ -0,0 +1,117 @@
+"""Identifies locks of resolved requirements"""
+
+import hashlib
+import re
+import sys
+import sysconfig
+from typing import Iterable, Match, Optional, Tuple
+
+from . import pip
+
+RequirementPattern = re.compile(
+    r"^\s*(?P<name>[A-Za-z0-9][A-Za-z0-9._-]*)\s*"
+    r"(\[(?P<extras>[^\]]*)\])?\s*"
+    r"(?P<specifier>[^;]*?)\s*"
+    r"(;(?P<marker>.*))?$"
+)
+VersionClausePattern = re.compile(r"^\s*(~=|===?|!=|<=?|>=?)\s*[A-Za-z0-9.*+!_-]+\s*$")
+NameSeparatorPattern = re.compile(r"[-_.]+")
+WhitespacePattern = re.compile(r"\s+")
+
+
+def lock_key(requirements: Iterable[str]) -> str:
+    """
+    Creates a key for a set of requirements.
+    Equivalent sets of requirements create the same key
+    and the current interpreter and platform are part of the key.
+    """
+    canonical_requirements = {
+        canonical
+        for canonical in map(canonicalize, requirements)
+        if canonical is not None
+    }
+    return hashlib.md5(
+        "\n".join([interpreter_tag(), *sorted(canonical_requirements)]).encode("utf-8")
+    ).hexdigest()
+
+
+def packages_key(packages: Iterable[str]) -> str:
+    """Creates a key for a set of installed packages."""
+    return hashlib.md5("\n".join(sorted(set(packages))).encode("utf-8")).hexdigest()
+
+
+def package_pin(package: str) -> str:
+    """Creates a requirement pinning the version of a downloaded package file."""
+    name, version = _name_and_version(package)
+    return f"{canonical_name(name)}=={version}"
+
+
+def package_name(package: str) -> str:
+    """Returns the canonical name of the project of a downloaded package file."""
+    return canonical_name(_name_and_version(package)[0])
+
+
+def _name_and_version(package: str) -> Tuple[str, str]:
+    if package.endswith(".whl"):
+        name, version = package.split("-")[:2]
+        return name, version
+    name, _, version = re.sub(r"(\.tar\.gz|\.zip)$", "", package).rpartition("-")
+    return name, version
+
+
+def interpreter_tag() -> str:
+    """Tag which identifies the current interpreter and platform."""
+    return f"{sys.implementation.cache_tag}-{sysconfig.get_platform()}"
+
+
+def canonicalize(requirement: str) -> Optional[str]:
+    """
+    Returns the canonical form of a requirement
+    or None if its marker does not match the current interpreter.
+    Only names, extras, version specifiers and markers get normalized,
+    URL and path requirements are kept verbatim.
+    """
+    match = RequirementPattern.match(requirement)
+    if match is None or not _is_named(match.group("specifier")):
+        return requirement.strip()
+    if match.group("marker") and not pip.evaluate_marker(match.group("marker")):
+        return None
+    return (
+        f"{canonical_name(match.group('name'))}"
+        f"{_canonical_extras(match)}{_canonical_specifier(match)}"
+    )
+
+
+def module_name(requirement: str) -> Optional[str]:
+    """Top-level module named like the project of a requirement, if valid."""
+    match = RequirementPattern.match(requirement)
+    return canonical_name(match["name"]).replace("-", "_") if match else None
+
+
+def canonical_name(name: str) -> str:
+    """Normalizes a package name according to PEP 503."""
+    return NameSeparatorPattern.sub("-", name).lower()
+
+
+def _canonical_extras(match: Match[str]) -> str:
+    extras = sorted(
+        canonical_name(extra.strip())
+        for extra in (match.group("extras") or "").split(",")
+        if extra.strip()
+    )
+    return f"[{','.join(extras)}]" if extras else ""
+
+
+def _is_named(specifier: str) -> bool:
+    """Checks if a specifier is a URL (name @ url) or consists of version clauses."""
+    clauses = filter(None, map(str.strip, specifier.split(",")))
+    return specifier.startswith("@") or all(map(VersionClausePattern.match, clauses))
+
+
+def _canonical_specifier(match: Match[str]) -> str:
+    specifier = match.group("specifier")
+    if specifier.startswith("@"):
+        return f" @ {specifier[1:].strip()}"
+    return ",".join(
+        sorted(filter(None, WhitespacePattern.sub("", specifier).lower().split(",")))
+    )
@@ -0,0 +1,167 @@
+"""Reads and writes lock files of resolved requirements"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import urldefrag
+
+from . import pip
+from .lock import RequirementPattern, canonical_name, package_name
+
+LockfileVersion = 2
+# each state includes the ones before
+States = ("resolved", "installed", "compiled")
+
+
+class UnsupportedVersion(ValueError):
+    """Lock file of a version which can not be read."""
+
+
+class LockedPackage(NamedTuple):
+    """Downloaded package file of a lock"""
+
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    url: Optional[str] = None
+    dependencies: Tuple[str, ...] = ()
+
+    @property
+    def source(self) -> Optional[str]:
+        """URL of the package file with its hash to verify the download."""
+        if self.url is None or self.sha256 is None:
+            return self.url
+        return f"{self.url}#sha256={self.sha256}"
+
+
+class Lockfile(NamedTuple):
+    """Packages resolved for a set of requirements and how far they got installed"""
+
+    packages: Dict[str, LockedPackage]
+    state: str = States[0]
+    version: int = LockfileVersion
+
+    def reached(self, state: str) -> bool:
+        """Checks if the packages got installed at least up to a state."""
+        return States.index(self.state) >= States.index(state)
+
+
+def read(path: Path) -> Lockfile:
+    """
+    Reads a lock file, lock files of version 1 list only the package files.
+    Lock files of other versions, like those written by a newer scriptenv
+    sharing the cache, raise an UnsupportedVersion error.
+    """
+    content = json.loads(path.read_text())
+    if isinstance(content, list):
+        return Lockfile({package: LockedPackage() for package in content}, version=1)
+    if content.get("version") != LockfileVersion:
+        raise UnsupportedVersion(
+            f"unsupported version {content.get('version')} of lock file {path}"
+        )
+    return Lockfile(
+        {
+            name: LockedPackage(
+                sha256=package["sha256"],
+                size=package["size"],
+                url=package["url"],
+                dependencies=tuple(package["dependencies"]),
+            )
+            for name, package in content["packages"].items()
+        },
+        state=content["state"],
+    )
+
+
+def dumps(lockfile: Lockfile) -> str:
+    """Serializes a lock file in the current version."""
+    return json.dumps(
+        dict(
+            version=LockfileVersion,
+            state=lockfile.state,
+            packages={
+                name: package._asdict()
+                for name, package in sorted(lockfile.packages.items())
+            },
+        ),
+        indent=2,
+    )
+
+
+def lock_packages(
+    cache_path: Path, resolved: Mapping[str, Optional[str]]
+) -> Dict[str, LockedPackage]:
+    """
+    Records the hash, size and url of each resolved package
+    downloaded into the cache.
+    """
+    return {
+        name: _locked_package(cache_path / name, url) for name, url in resolved.items()
+    }
+
+
+def advance(
+    lockfile: Lockfile,
+    state: str,
+    cache_path: Path,
+    install_path: Path,
+    pinned: Iterable[str] = (),
+) -> Lockfile:
+    """
+    Returns a lock file in the current version with its packages
+    installed up to a state and the dependencies of each package
+    read from its installed metadata.
+    Hashes and sizes missing in lock files of version 1
+    are taken from the packages in the cache.
+
+    Arguments:
+        lockfile: Lock file to advance.
+        state: State the packages got installed up to.
+        cache_path: Path of the downloaded packages.
+        install_path: Path of the installed packages.
+        pinned: Packages of base ScriptEnvs the packages can depend on.
+    """
+    names = {package_name(name): name for name in [*pinned, *lockfile.packages]}
+    packages = {
+        name: _migrate(package, cache_path / name)._replace(
+            dependencies=_dependencies(install_path / name, names)
+        )
+        for name, package in lockfile.packages.items()
+    }
+    return Lockfile(packages, state=state)
+
+
+def _migrate(package: LockedPackage, path: Path) -> LockedPackage:
+    if package.sha256 is not None:
+        return package
+    return _locked_package(path, package.url)
+
+
+def _locked_package(path: Path, url: Optional[str]) -> LockedPackage:
+    url = url and urldefrag(url).url
+    if not path.is_file():
+        return LockedPackage(url=url)
+    return LockedPackage(sha256=pip.file_hash(path), size=path.stat().st_size, url=url)
+
+
+def _dependencies(package_path: Path, names: Dict[str, str]) -> Tuple[str, ...]:
+    """Locked packages required by an installed package, ignoring markers."""
+    required = {
+        _requirement_name(requirement) for requirement in _requires(package_path)
+    }
+    return tuple(sorted(names[name] for name in required.intersection(names)))
+
+
+def _requires(package_path: Path) -> List[str]:
+    # email gets imported lazily to keep it out of the warm path
+    import email.parser  # pylint: disable=import-outside-toplevel
+
+    metadata = next(package_path.glob("*.dist-info/METADATA"), None)
+    if metadata is None:
+        return []
+    message = email.parser.Parser().parsestr(metadata.read_text(encoding="utf-8"))
+    return [str(requirement) for requirement in message.get_all("Requires-Dist", [])]
+
+
+def _requirement_name(requirement: str) -> str:
+    match = RequirementPattern.match(requirement)
+    return canonical_name(match.group("name") if match else requirement)
@@ -0,0 +1,91 @@
+"""Exclusive file locks to synchronize processes sharing a cache"""
+
+import os
+import sys
+import threading
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import Dict, Generator
+
+# file locks are held per process, threads are synchronized separately
+_ThreadLocks: Dict[str, threading.Lock] = {}
+
+
+@contextmanager
+def file_lock(path: Path) -> Generator[None, None, None]:
+    """
+    Holds an exclusive lock on a file,
+    blocks until the lock is acquired by the current thread.
+    """
+    with _ThreadLocks.setdefault(str(path), threading.Lock()):
+        descriptor = _lock_current(path)
+        try:
+            yield
+        finally:
+            _unlock(descriptor)
+            os.close(descriptor)
+
+
+def remove_file_lock(path: Path) -> None:
+    """
+    Removes a lock file once it is not held anymore,
+    waiting threads and processes lock a newly created file instead.
+    """
+    if path.exists():
+        with file_lock(path), suppress(OSError):
+            path.unlink()
+
+
+def _lock_current(path: Path) -> int:
+    """Locks a file, again if it got removed while waiting for the lock."""
+    descriptor = _lock_file(path)
+    while not _is_file_at(descriptor, path):
+        _unlock(descriptor)
+        os.close(descriptor)
+        descriptor = _lock_file(path)
+    return descriptor
+
+
+def _lock_file(path: Path) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        _lock(descriptor)
+    except BaseException:
+        os.close(descriptor)
+        raise
+    return descriptor
+
+
+def _is_file_at(descriptor: int, path: Path) -> bool:
+    with suppress(FileNotFoundError):
+        return os.path.samestat(os.fstat(descriptor), os.stat(path))
+    return False
+
+
+# pylint: disable=import-outside-toplevel,import-error
+def _lock(descriptor: int) -> None:
+    if sys.platform == "win32":  # pragma: no cover
+        import msvcrt
+
+        # LK_LOCK gives up after 10 attempts, retry to block until locked
+        while True:
+            with suppress(OSError):
+                msvcrt.locking(descriptor, msvcrt.LK_LOCK, 1)
+                return
+    else:  # pragma: no cover
+        import fcntl
+
+        # lockf uses POSIX record locks, which unlike flock also work on NFS
+        fcntl.lockf(descriptor, fcntl.LOCK_EX)
+
+
+def _unlock(descriptor: int) -> None:
+    if sys.platform == "win32":  # pragma: no cover
+        import msvcrt
+
+        msvcrt.locking(descriptor, msvcrt.LK_UNLCK, 1)
+    else:  # pragma: no cover
+        import fcntl
+
+        fcntl.lockf(descriptor, fcntl.LOCK_UN)
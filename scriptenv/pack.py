@@ -0,0 +1,135 @@
+"""Packs installed packages into a single zip archive"""
+
+import importlib.machinery
+import importlib.util
+import marshal
+import os
+import uuid
+import zipfile
+from contextlib import suppress
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Set, Tuple
+
+from .bytecode import CompiledMarker
+
+# entries of archives get a fixed date to keep packing reproducible
+EntryDateTime = (1980, 1, 1, 0, 0, 0)
+UncheckedHashFlags = 0b01
+
+
+class Archive(NamedTuple):
+    """Zip archive importing the packed packages of a ScriptEnv"""
+
+    path: Path
+    packages: Tuple[str, ...]
+
+
+def pack(install_path: Path, packages: Iterable[str], archive_path: Path) -> Archive:
+    """
+    Packs installed packages into a zip archive importable by zipimport.
+
+    Each module is stored with its bytecode compiled with an unchecked hash,
+    which zipimport loads without compiling or validating the source.
+    Packages containing native extensions are not packed,
+    zipimport can not load them and they get imported from their directory.
+    The archive gets written to a temporary file which is renamed when complete.
+
+    Arguments:
+        install_path: Path of the installed packages.
+        packages: Packages to pack.
+        archive_path: Path of the zip archive to write.
+    """
+    packed = tuple(
+        sorted(
+            package
+            for package in packages
+            if not _has_extensions(install_path / package)
+        )
+    )
+    temp_path = archive_path.with_name(f".{archive_path.name}.{uuid.uuid4().hex}")
+    try:
+        _write_archive(temp_path, _entries(install_path, packed), archive_path)
+        os.replace(temp_path, archive_path)
+    finally:
+        with suppress(FileNotFoundError):
+            temp_path.unlink()
+    return Archive(archive_path, packed)
+
+
+def _has_extensions(package_path: Path) -> bool:
+    return any(
+        path.name.endswith(tuple(importlib.machinery.EXTENSION_SUFFIXES))
+        for path in package_path.rglob("*")
+    )
+
+
+def _entries(install_path: Path, packages: Iterable[str]) -> Dict[str, Path]:
+    """Files to pack by their name in the archive, the first package wins."""
+    entries: Dict[str, Path] = {}
+    for package in packages:
+        for path in _files(install_path / package):
+            entries.setdefault(
+                path.relative_to(install_path / package).as_posix(), path
+            )
+    return entries
+
+
+def _files(package_path: Path) -> Iterable[Path]:
+    return sorted(
+        path
+        for path in package_path.rglob("*")
+        if path.is_file() and _packable(path.relative_to(package_path))
+    )
+
+
+def _packable(path: Path) -> bool:
+    # binaries get linked from the package directories
+    return (
+        path.parts[0] != "bin"
+        and "__pycache__" not in path.parts
+        and path.suffix != ".pyc"
+        and path.name != CompiledMarker
+    )
+
+
+def _write_archive(path: Path, entries: Dict[str, Path], archive_path: Path) -> None:
+    with zipfile.ZipFile(path, "w") as archive:
+        # zipimport finds packages and namespace packages by their directory entries
+        for directory in sorted(_directories(entries)):
+            archive.writestr(zipfile.ZipInfo(directory, EntryDateTime), b"")
+        for name, source in entries.items():
+            _write_entry(archive, name, source.read_bytes(), archive_path)
+
+
+def _directories(names: Iterable[str]) -> Set[str]:
+    return {
+        "/".join(parts[:index]) + "/"
+        for parts in (name.split("/") for name in names)
+        for index in range(1, len(parts))
+    }
+
+
+def _write_entry(
+    archive: zipfile.ZipFile, name: str, content: bytes, archive_path: Path
+) -> None:
+    files = {name: content}
+    if name.endswith(".py"):
+        files.update(_compiled(name, content, archive_path))
+    for entry_name, entry_content in files.items():
+        archive.writestr(zipfile.ZipInfo(entry_name, EntryDateTime), entry_content)
+
+
+def _compiled(name: str, source: bytes, archive_path: Path) -> Dict[str, bytes]:
+    """Bytecode of a module stored next to its source, where zipimport looks for it."""
+    try:
+        code = compile(source, str(archive_path / name), "exec", dont_inherit=True)
+    except (SyntaxError, ValueError):
+        # like compileall, modules which can not be compiled are kept as source
+        return {}
+    return {
+        f"{name}c": importlib.util.MAGIC_NUMBER
+        + UncheckedHashFlags.to_bytes(4, "little")
+        # source_hash is missing in typeshed
+        + importlib.util.source_hash(source)  # type: ignore
+        + marshal.dumps(code)
+    }
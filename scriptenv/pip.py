@@ -1,62 +1,562 @@
 """Wrapper functions for pip."""
-import io
-import re
+import base64
+import configparser
+import csv
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import subprocess
 import sys
-from contextlib import contextmanager, redirect_stdout
+import tempfile
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
-from typing import Callable, Generator, Iterable, Set
+from typing import Any, Callable, Dict, Generator, Iterable, Optional, Set
+from urllib.parse import unquote, urldefrag, urlsplit
 
-from pip._internal.commands import create_command
-
-PackageNamePattern = re.compile(r"(/|\\)(?P<name>[^(/|\\)]+?(\.tar\.gz|\.whl))")
+WheelDataTargets = {
+    "purelib": Path(),
+    "platlib": Path(),
+    "data": Path(),
+    "headers": Path("include"),
+}
+EntryPointSections = {
+    "console_scripts": {},
+    "gui_scripts": {"gui": True},
+}
+ChunkSize = 1024 * 1024
+# pip uses global state like its logging setup, invocations in one process are serialized
+_PipLock = threading.Lock()
+# sessions shared by the pip invocations within keep_session, innermost last
+_KeptSessions: Dict[int, Dict[str, Any]] = {}
 
 
 class PipError(Exception):
     """Handles errors during pip invocations."""
 
-    def __init__(  # pylint: disable=useless-super-delegation
-        self, exit_code: int
-    ) -> None:
-        super().__init__(exit_code)
+    def __init__(self, exit_code: int, package: Optional[str] = None) -> None:
+        super().__init__(exit_code, package)
+        self.exit_code = exit_code
+        self.package = package
 
 
-def download(requirements: Iterable[str], dest: Path) -> Set[str]:
+def download(
+    requirements: Iterable[str],
+    dest: Path,
+    constraints: Iterable[str] = (),
+    find_links: Optional[Path] = None,
+) -> Set[str]:
     """
     Downloads requirements and its dependencies into a given directory.
+    Dependencies are resolved within the constraints, e.g. pinned versions.
+    With find links only the wheels in this directory are considered
+    and the index is not contacted, errors are raised without being logged.
+    Source distributions are not considered, building them requires
+    their build dependencies from the index.
     Returns a set with names of all downloaded packages.
     """
-    stdout = _pip("download", "--dest", str(dest), *requirements)
-    return {match.group("name") for match in PackageNamePattern.finditer(stdout)}
+    offline_args = (
+        []
+        if find_links is None
+        else ["--no-index", "--find-links", str(find_links), "--only-binary", ":all:"]
+    )
+    saved: Set[str] = set()
+    with _constraint_args(constraints) as args:
+        _pip(
+            "download",
+            "--dest",
+            str(dest),
+            *offline_args,
+            *args,
+            *requirements,
+            customize=partial(_customize_preparer, partial(_record_saved, saved)),
+            quiet=find_links is not None,
+        )
+    return saved
+
+
+def resolve(
+    requirements: Iterable[str], dest: Path, constraints: Iterable[str] = ()
+) -> Dict[str, str]:
+    """
+    Resolves requirements and its dependencies using the package metadata files
+    provided by the index (PEP 658). Packages without metadata files
+    are downloaded into a given directory to read their metadata.
+    Dependencies are resolved within the constraints, e.g. pinned versions.
+    Returns the names of all resolved packages mapped to their urls.
+    """
+    resolved: Dict[str, str] = {}
+    with _constraint_args(constraints) as args:
+        _pip(
+            "download",
+            "--dest",
+            str(dest),
+            *args,
+            *requirements,
+            customize=partial(_customize_preparer, partial(_record_links, resolved)),
+        )
+    return resolved
+
+
+def supports_metadata_resolution() -> bool:
+    """
+    Checks if the installed pip version can resolve requirements
+    by their metadata files only. Versions before 22.3 do not use metadata files,
+    versions from 23.2 to 24.0 require the package files to warn about legacy versions.
+    """
+    # pylint: disable=import-outside-toplevel
+    from pip import __version__
+    from pip._vendor.packaging.version import Version
+
+    version = Version(__version__)
+    return Version("22.3") <= version < Version("23.2") or version >= Version("24.1")
+
+
+def fetch(
+    urls: Iterable[str], dest: Path, workers: int = 1, thread_name_prefix: str = ""
+) -> None:
+    """
+    Downloads packages by url without their dependencies into a given directory.
+    The downloads run concurrently and share a pool of keep-alive connections.
+    Packages are verified against the hash in the url fragment,
+    packages already in the directory with a matching hash are skipped.
+    """
+    urls = [url for url in urls if not _is_fetched(url, dest)]
+    if not urls:
+        return
+    dest.mkdir(parents=True, exist_ok=True)
+    with _download_command([], workers) as (_, _, session), ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix=thread_name_prefix
+    ) as executor:
+        list(executor.map(partial(_fetch, session, dest=dest), urls))
+
+
+def find(
+    requirements: Dict[str, Iterable[str]],
+    index_url: Optional[str] = None,
+    workers: int = 1,
+    thread_name_prefix: str = "",
+) -> Dict[str, str]:
+    """
+    Finds the package file of each pinned requirement on an index
+    without resolving dependencies. Package files matching one of the hashes
+    of a requirement are preferred, the downloaded files need to be verified.
+    Without an index url the index configured for pip is used.
+
+    Arguments:
+        requirements: Pinned requirements mapped to their hashes, e.g. sha256:<hex>.
+        index_url: Url of the index to find the package files on.
+        workers: Number of requirements looked up concurrently.
+        thread_name_prefix: Prefix of the names of the worker threads.
+
+    Returns:
+        Names of the found package files mapped to their urls.
+    """
+    index_args = [] if index_url is None else ["--index-url", index_url]
+    with _download_command(index_args, workers) as (
+        command,
+        options,
+        session,
+    ), ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix=thread_name_prefix
+    ) as executor:
+        # pylint: disable=protected-access
+        finder = command._build_package_finder(options, session)
+        links = list(
+            executor.map(
+                partial(_find, finder), requirements.keys(), requirements.values()
+            )
+        )
+    return {link.filename: link.url for link in links}
 
 
 def install(package: Path, target: Path) -> None:
-    """Installs a package without its dependencies to a given target directory."""
-    _pip(
-        "install",
-        "--no-deps",
-        "--no-user",
-        "--target",
-        str(target),
-        str(package),
+    """
+    Installs a package without its dependencies to a given target directory.
+    Wheels get unpacked directly, all other packages are installed by pip
+    running in a subprocess to allow concurrent installations.
+    """
+    if package.suffix == ".whl":
+        _install_wheel(package, target)
+    else:
+        _install_with_pip(package, target)
+
+
+def file_hash(path: Path, name: str = "sha256") -> str:
+    """
+    Returns the hex digest of a file. The file gets memory-mapped
+    instead of read, large wheels are hashed without copying them into memory.
+    """
+    with path.open("rb") as file:
+        if not os.fstat(file.fileno()).st_size:
+            return hashlib.new(name).hexdigest()  # empty files can not be mapped
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.new(name, mapped).hexdigest()
+
+
+def evaluate_marker(marker: str) -> bool:
+    """Evaluates an environment marker for the current interpreter."""
+    # pylint: disable=import-outside-toplevel
+    from pip._vendor.packaging.markers import Marker
+
+    return bool(Marker(marker).evaluate())
+
+
+@contextmanager
+def keep_session() -> Generator[None, None, None]:
+    """
+    Shares one pip session between all pip invocations within the context,
+    which keeps pip's HTTP connections open instead of reconnecting each time.
+    """
+    sessions: Dict[str, Any] = {}
+    _KeptSessions[id(sessions)] = sessions
+    try:
+        yield
+    finally:
+        del _KeptSessions[id(sessions)]
+        for session in sessions.values():
+            session.close()
+
+
+def _keep_session(command: Any) -> None:
+    if _KeptSessions:
+        command.get_default_session = partial(
+            _session, command, sessions=list(_KeptSessions.values())[-1]
+        )
+
+
+def _session(command: Any, options: Any, sessions: Dict[str, Any]) -> Any:
+    if "session" not in sessions:
+        # pylint: disable=protected-access
+        sessions["session"] = command._build_session(options)
+    return sessions["session"]
+
+
+@contextmanager
+def _download_command(
+    args: Iterable[str], pool_size: int
+) -> Generator[Any, None, None]:
+    """
+    Builds pip's download command with its options
+    and a session with a connection per concurrent request.
+    """
+    # pylint: disable=import-outside-toplevel
+    from pip._internal.commands import create_command
+
+    command: Any = create_command("download")
+    with _PipLock:
+        options, _ = command.parse_args(list(args))
+        # pylint: disable=protected-access
+        session = command._build_session(options)
+    with session:
+        for adapter in set(session.adapters.values()):
+            # adapters for local files have no connection pool
+            if hasattr(adapter, "init_poolmanager"):
+                adapter.init_poolmanager(pool_size, pool_size)
+        yield command, options, session
+
+
+def _find(finder: Any, requirement: str, hashes: Iterable[str]) -> Any:
+    # pylint: disable=import-outside-toplevel
+    from pip._internal.utils.hashes import Hashes
+    from pip._vendor.packaging.requirements import Requirement
+
+    pinned = Requirement(requirement)
+    parsed = [hash_.partition(":")[::2] for hash_ in hashes]
+    allowed = {
+        name: [digest for other, digest in parsed if other == name]
+        for name, _ in parsed
+    }
+    candidate = finder.find_best_candidate(
+        pinned.name, pinned.specifier, Hashes(allowed)
+    ).best_candidate
+    if candidate is None:
+        raise PipError(1, requirement)
+    return candidate.link
+
+
+def _fetch(session: Any, url: str, dest: Path) -> None:
+    path = dest / _url_filename(url)
+    with _temp_path(path) as temp_path:
+        try:
+            _download(session, url, temp_path)
+        except OSError as error:
+            raise PipError(1, path.name) from error
+        os.replace(temp_path, path)
+
+
+@contextmanager
+def _temp_path(path: Path) -> Generator[Path, None, None]:
+    """Yields a unique path next to a path, removed again unless it got moved."""
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    try:
+        yield temp_path
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def _download(session: Any, url: str, path: Path) -> None:
+    # like pip, prevents .tar.gz packages from being decompressed in transit
+    with session.get(
+        urldefrag(url).url, headers={"Accept-Encoding": "identity"}, stream=True
+    ) as response:
+        response.raise_for_status()
+        with path.open("wb") as file:
+            for chunk in response.iter_content(ChunkSize):
+                file.write(chunk)
+    if not _hash_matches(path, url):
+        raise OSError(f"{urldefrag(url).url} does not match its hash")
+
+
+def _is_fetched(url: str, dest: Path) -> bool:
+    path = dest / _url_filename(url)
+    return path.is_file() and _hash_matches(path, url)
+
+
+def _url_filename(url: str) -> str:
+    return unquote(urlsplit(url).path.rsplit("/", 1)[-1])
+
+
+def _hash_matches(path: Path, url: str) -> bool:
+    """Checks a file against the hash in the url fragment, if there is one."""
+    name, _, digest = urldefrag(url).fragment.partition("=")
+    if name not in hashlib.algorithms_guaranteed:
+        return True
+    return file_hash(path, name) == digest
+
+
+def _install_with_pip(package: Path, target: Path) -> None:
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "--no-deps",
+            "--no-user",
+            "--target",
+            str(target),
+            str(package),
+        ],
+        stdout=subprocess.DEVNULL,
+        check=False,
     )
+    if process.returncode:
+        raise PipError(process.returncode, package.name)
+
+
+def _install_wheel(wheel: Path, target: Path) -> None:
+    try:
+        _unpack_wheel(wheel, target)
+    except (OSError, ValueError, zipfile.BadZipFile) as error:
+        raise PipError(1, wheel.name) from error
+
+
+def _unpack_wheel(wheel: Path, target: Path) -> None:
+    with zipfile.ZipFile(wheel) as archive:
+        for info in archive.infolist():
+            _extract(archive, info, target)
+    dist_info = next(target.glob("*.dist-info"), None)
+    if dist_info is None:
+        raise ValueError(f"{wheel.name} contains no .dist-info directory")
+    _install_data(dist_info.with_suffix(".data"), target)
+    _install_entry_points(dist_info / "entry_points.txt", target / "bin")
+    _write_record(dist_info, target)
+
+
+def _extract(archive: zipfile.ZipFile, info: zipfile.ZipInfo, target: Path) -> None:
+    path = Path(archive.extract(info, target))
+    if (info.external_attr >> 16) & 0o111:
+        path.chmod(path.stat().st_mode | 0o111)
+
+
+def _install_data(data: Path, target: Path) -> None:
+    for scheme in data.glob("*"):
+        if scheme.name == "scripts":
+            _install_scripts(scheme, target / "bin")
+        else:
+            _move_tree(scheme, _data_target(scheme, target))
+    shutil.rmtree(data, ignore_errors=True)
+
+
+def _data_target(scheme: Path, target: Path) -> Path:
+    data_target = WheelDataTargets.get(scheme.name)
+    if data_target is None:
+        raise ValueError(f"unknown wheel data scheme {scheme.name}")
+    return target / data_target
+
+
+def _move_tree(source: Path, dest: Path) -> None:
+    for path in sorted(source.rglob("*")):
+        if path.is_file():
+            (dest / path.relative_to(source)).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, dest / path.relative_to(source))
+
+
+def _install_scripts(scripts: Path, bin_path: Path) -> None:
+    _script_maker(scripts, bin_path).make_multiple(
+        [script.name for script in scripts.iterdir()]
+    )
+
+
+def _install_entry_points(entry_points: Path, bin_path: Path) -> None:
+    parser = configparser.ConfigParser(delimiters=("=",), interpolation=None)
+    parser.optionxform = str  # type: ignore
+    parser.read(entry_points, encoding="utf-8")
+    maker = _script_maker(None, bin_path)
+    for section, options in EntryPointSections.items():
+        if parser.has_section(section):
+            maker.make_multiple(_entry_point_specs(parser, section), options)
+
+
+def _entry_point_specs(
+    parser: configparser.ConfigParser, section: str
+) -> Iterable[str]:
+    return [f"{name} = {value}" for name, value in parser.items(section)]
+
+
+def _script_maker(source: Optional[Path], target: Path) -> Any:
+    # pylint: disable=import-outside-toplevel
+    from pip._vendor.distlib.scripts import ScriptMaker
+
+    target.mkdir(parents=True, exist_ok=True)
+    maker = ScriptMaker(source and str(source), str(target))  # type: ignore
+    maker.clobber = True
+    maker.variants = {""}
+    return maker
+
 
+def _write_record(dist_info: Path, target: Path) -> None:
+    (dist_info / "INSTALLER").write_text("scriptenv\n", encoding="utf-8")
+    record = dist_info / "RECORD"
+    rows = [
+        _record_row(path, target)
+        for path in sorted(target.rglob("*"))
+        if path.is_file() and path != record
+    ]
+    rows.append((record.relative_to(target).as_posix(), "", ""))
+    with record.open("w", newline="", encoding="utf-8") as record_file:
+        csv.writer(record_file).writerows(rows)
 
-def _pip(command: str, *args: str) -> str:
-    with _redirect_stdout() as get_stdout:
-        return_code = create_command(command).main(list(args))
+
+def _record_row(path: Path, target: Path) -> Iterable[str]:
+    content = path.read_bytes()
+    digest = base64.urlsafe_b64encode(hashlib.sha256(content).digest()).rstrip(b"=")
+    return (
+        path.relative_to(target).as_posix(),
+        f"sha256={digest.decode('ascii')}",
+        str(len(content)),
+    )
+
+
+def _pip(
+    command: str,
+    *args: str,
+    customize: Callable[[Any], None] = lambda command: None,
+    quiet: bool = False,
+) -> None:
+    """
+    Runs a pip command, customized per invocation before it runs.
+    Only warnings and errors are logged, to stderr,
+    quiet commands discard their errors instead of logging them.
+    """
+    # pip gets imported lazily to keep it out of the warm path
+    # pylint: disable=import-outside-toplevel
+    from pip._internal.commands import create_command
+
+    # sys.stdout and sys.stderr are left untouched, they are process-wide
+    with _PipLock:
+        pip_command = create_command(command)
+        _keep_session(pip_command)
+        customize(pip_command)
+        if quiet:
+            _discard_errors(pip_command)
+        return_code = pip_command.main(["--quiet", *args])
         if return_code:
             raise PipError(return_code)
-    return get_stdout()
 
 
 @contextmanager
-def _redirect_stdout() -> Generator[Callable[[], str], None, None]:
-    """Redirects stdout with a workaround for https://bugs.python.org/issue44666"""
-    stdout = io.BytesIO()
-    encoding = sys.stdout.encoding
-    wrapper = io.TextIOWrapper(
-        stdout,
-        encoding=encoding,
+def _constraint_args(
+    constraints: Iterable[str],
+) -> Generator[Iterable[str], None, None]:
+    """Writes constraints to a file and yields the pip arguments to use it."""
+    constraints = list(constraints)
+    if not constraints:
+        yield []
+        return
+    with tempfile.TemporaryDirectory() as temp_path:
+        constraints_txt = Path(temp_path) / "constraints.txt"
+        constraints_txt.write_text("\n".join(constraints), encoding="utf-8")
+        yield ["--constraint", str(constraints_txt)]
+
+
+def _customize_preparer(customize: Callable[[Any], None], command: Any) -> None:
+    """Customizes the requirement preparer of a command once it is created."""
+    make_requirement_preparer = command.make_requirement_preparer
+
+    def make_customized_preparer(**kwargs: Any) -> Any:
+        preparer = make_requirement_preparer(**kwargs)
+        customize(preparer)
+        return preparer
+
+    command.make_requirement_preparer = make_customized_preparer
+
+
+def _record_links(resolved: Dict[str, str], preparer: Any) -> None:
+    """
+    Lets the preparer of a download command record the links of all resolved
+    requirements instead of downloading the packages which were resolved
+    only by their metadata files.
+    """
+    preparer.prepare_linked_requirements_more = partial(_links, resolved)
+
+
+def _record_saved(saved: Set[str], preparer: Any) -> None:
+    """
+    Lets the preparer of a download command record the names
+    of all packages saved into or already found in the download directory.
+    """
+    preparer.save_linked_requirement = partial(
+        _save, preparer.save_linked_requirement, saved, preparer.download_dir
+    )
+
+
+def _links(
+    resolved: Dict[str, str],
+    reqs: Iterable[Any],
+    parallel_builds: bool = False,  # pylint: disable=unused-argument
+) -> None:
+    resolved.update(
+        {req.link.filename: req.link.url for req in reqs if req.link is not None}
     )
-    with redirect_stdout(wrapper):
-        yield lambda: stdout.getvalue().decode(encoding)
+
+
+def _save(
+    save: Callable[[Any], None], saved: Set[str], download_dir: str, req: Any
+) -> None:
+    save(req)
+    if req.link is not None and os.path.isfile(
+        os.path.join(download_dir, req.link.filename)
+    ):
+        saved.add(req.link.filename)
+
+
+def _discard_errors(command: Any) -> None:
+    """Removes the handler logging to stderr once the command has set it up."""
+    run = command.run
+
+    def run_discarding_errors(options: Any, args: Any) -> Any:
+        root = logging.getLogger()
+        for handler in [h for h in root.handlers if h.name == "console_errors"]:
+            root.removeHandler(handler)
+        return run(options, args)
+
+    command.run = run_discarding_errors
@@ -2,17 +2,88 @@
 
 import json
 from pathlib import Path
-from typing import Generator
+from typing import Any, Dict, Generator, List, NamedTuple, Optional, Tuple
 
+from . import pip
+from .lock import canonical_name, package_name
 
-def parse_pipfile_lock(pipfile_lock: Path) -> Generator[str, None, None]:
-    """Parses a Pipfile.lock into requirements."""
+# packages of the default index are found on the index configured for pip
+DefaultIndexUrl = "https://pypi.org/simple"
+
+
+class PipfileEntry(NamedTuple):
+    """Package pinned by a Pipfile.lock"""
+
+    name: str
+    version: str
+    hashes: Tuple[str, ...] = ()
+    markers: Optional[str] = None
+    index_url: Optional[str] = None
+
+    @property
+    def requirement(self) -> str:
+        """Requirement pinning the version of the package."""
+        return f"{self.name}{self.version}"
+
+
+def read_pipfile_lock(pipfile_lock: Path) -> List[PipfileEntry]:
+    """
+    Reads the entries of a Pipfile.lock
+    whose markers match the current interpreter.
+    """
     if pipfile_lock.is_dir():
         pipfile_lock /= "Pipfile.lock"
 
-    yield from (
-        f"{package_name}{package_spec['version']}"
-        for section, packages in json.loads(pipfile_lock.read_bytes()).items()
+    content = json.loads(pipfile_lock.read_bytes())
+    sources = {
+        source["name"]: source["url"]
+        for source in content.get("_meta", {}).get("sources", [])
+    }
+    entries = [
+        _entry(name, spec, sources)
+        for section, packages in content.items()
         if section != "_meta"
-        for package_name, package_spec in packages.items()
+        for name, spec in packages.items()
+    ]
+    return [
+        entry
+        for entry in entries
+        if entry.markers is None or pip.evaluate_marker(entry.markers)
+    ]
+
+
+def verify_hashes(
+    entries: List[PipfileEntry], package_hashes: Dict[str, Optional[str]]
+) -> None:
+    """
+    Checks the sha256 of each package file against the hashes
+    of the entry of its project, entries without hashes are not checked.
+    """
+    hashes = {canonical_name(entry.name): entry.hashes for entry in entries}
+    for package, sha256 in package_hashes.items():
+        allowed = hashes.get(package_name(package))
+        if allowed and f"sha256:{sha256}" not in allowed:
+            raise pip.PipError(1, package)
+
+
+def parse_pipfile_lock(pipfile_lock: Path) -> Generator[str, None, None]:
+    """Parses a Pipfile.lock into requirements."""
+    yield from (entry.requirement for entry in read_pipfile_lock(pipfile_lock))
+
+
+def _entry(name: str, spec: Dict[str, Any], sources: Dict[str, str]) -> PipfileEntry:
+    return PipfileEntry(
+        name=name,
+        version=spec["version"],
+        hashes=tuple(spec.get("hashes", ())),
+        markers=spec.get("markers"),
+        index_url=_index_url(spec, sources),
     )
+
+
+def _index_url(spec: Dict[str, Any], sources: Dict[str, str]) -> Optional[str]:
+    # entries without an index are found on the first source like pipenv does
+    url = sources.get(spec.get("index", next(iter(sources), "")))
+    if url is None or url.rstrip("/") == DefaultIndexUrl:
+        return None
+    return url
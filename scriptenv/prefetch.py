@@ -0,0 +1,196 @@
+"""Builds the ScriptEnvs required by scripts without running them"""
+
+import ast
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from . import pip
+from .builder import BuildThreadPrefix, ScriptEnvBuilder
+from .config import Config
+from .lock import lock_key
+from .pipfile import PipfileEntry, read_pipfile_lock
+
+# requirements found in a script and the entries of the Pipfile.lock pinning them
+Discovered = Tuple[List[str], List[PipfileEntry]]
+
+
+class Prefetched(NamedTuple):
+    """Requirements of the ScriptEnvs built by prefetch and of those which failed"""
+
+    built: List[List[str]]
+    failed: List[Tuple[List[str], Exception]]
+
+
+def prefetch(paths: Iterable[Path], config: Optional[Config] = None) -> Prefetched:
+    """
+    Builds the ScriptEnvs of all requirements found in scripts.
+
+    The requirements get resolved concurrently,
+    packages shared by several ScriptEnvs get installed only once.
+    Requirements of a Pipfile.lock get locked like by from_pipfile_lock,
+    verified by their hashes without resolving them again.
+    A set of requirements failing to build does not stop the others.
+
+    Arguments:
+        paths: Scripts or directories containing scripts.
+        config: Config of the cache to build the ScriptEnvs in.
+
+    Returns:
+        Requirements of each built ScriptEnv
+        and of each failed one with its error.
+    """
+    config = config or Config()
+    builder = ScriptEnvBuilder(config)
+    discovered = _discover(paths)
+    with pip.keep_session(), ThreadPoolExecutor(
+        max_workers=config.install_workers,
+        thread_name_prefix=f"{BuildThreadPrefix}prefetch",
+    ) as executor:
+        packages, errors = _fetch_all(executor, builder, discovered)
+    builder.install_packages(packages)
+    requirement_sets = [requirements for requirements, _ in discovered]
+    built = _build_fetched(builder, requirement_sets, errors)
+    return Prefetched(
+        built, [(requirement_sets[index], errors[index]) for index in sorted(errors)]
+    )
+
+
+def discover(paths: Iterable[Path]) -> List[List[str]]:
+    """
+    Finds the requirements of calls to requires and from_pipfile_lock
+    with literal arguments in scripts. Paths to Pipfile.lock files
+    are relative to the directory of the script.
+    Equivalent sets of requirements are returned only once.
+    """
+    return [requirements for requirements, _ in _discover(paths)]
+
+
+def _discover(paths: Iterable[Path]) -> List[Discovered]:
+    discovered: Dict[str, Discovered] = {}
+    for script in _scripts(paths):
+        for requirements, entries in _requirements(script):
+            discovered.setdefault(lock_key(requirements), (requirements, entries))
+    return list(discovered.values())
+
+
+def _fetch_all(
+    executor: ThreadPoolExecutor,
+    builder: ScriptEnvBuilder,
+    discovered: List[Discovered],
+) -> Tuple[Set[str], Dict[int, Exception]]:
+    """
+    Fetches the requirement sets concurrently and returns the packages
+    of all fetched sets and the errors of the failed ones by their index.
+    """
+    futures = {
+        executor.submit(_try_fetch, builder, requirements, entries): index
+        for index, (requirements, entries) in enumerate(discovered)
+    }
+    packages: Set[str] = set()
+    errors: Dict[int, Exception] = {}
+    for future in as_completed(futures):
+        fetched, error = future.result()
+        packages.update(fetched)
+        if error is not None:
+            errors[futures[future]] = error
+    return packages, errors
+
+
+def _try_fetch(
+    builder: ScriptEnvBuilder, requirements: List[str], entries: List[PipfileEntry]
+) -> Tuple[Set[str], Optional[Exception]]:
+    try:
+        return _fetch(builder, requirements, entries), None
+    except Exception as error:  # pylint: disable=broad-except
+        return set(), error
+
+
+def _fetch(
+    builder: ScriptEnvBuilder, requirements: List[str], entries: List[PipfileEntry]
+) -> Set[str]:
+    if entries:
+        builder.lock_pinned(entries)
+    return builder.fetch_requirements(requirements)
+
+
+def _build_fetched(
+    builder: ScriptEnvBuilder,
+    requirement_sets: List[List[str]],
+    errors: Dict[int, Exception],
+) -> List[List[str]]:
+    """Builds each requirement set fetched without errors and records new errors."""
+    built = []
+    for index, requirements in enumerate(requirement_sets):
+        error = errors.get(index) or _build(builder, requirements)
+        if error is None:
+            built.append(requirements)
+        else:
+            errors[index] = error
+    return built
+
+
+def _build(builder: ScriptEnvBuilder, requirements: List[str]) -> Optional[Exception]:
+    try:
+        builder.build(requirements)
+    except Exception as error:  # pylint: disable=broad-except
+        return error
+    return None
+
+
+def _scripts(paths: Iterable[Path]) -> Iterable[Path]:
+    for path in paths:
+        yield from sorted(path.rglob("*.py")) if path.is_dir() else [path]
+
+
+def _requirements(script: Path) -> List[Discovered]:
+    try:
+        tree = ast.parse(script.read_bytes(), str(script))
+    except (SyntaxError, ValueError):
+        return []
+    calls = (node for node in ast.walk(tree) if isinstance(node, ast.Call))
+    found = (_call_requirements(call, script.parent) for call in calls)
+    return [discovered for discovered in found if discovered and discovered[0]]
+
+
+def _call_requirements(call: ast.Call, base: Path) -> Optional[Discovered]:
+    name = _function_name(call.func)
+    if name == "requires":
+        return _literals(call.args) or [], []
+    if name == "from_pipfile_lock":
+        return _pipfile_requirements(call.args, base)
+    return None
+
+
+def _function_name(func: ast.expr) -> Optional[str]:
+    if isinstance(func, ast.Name):
+        return func.id
+    return func.attr if isinstance(func, ast.Attribute) else None
+
+
+def _literals(args: List[ast.expr]) -> Optional[List[str]]:
+    values = [_literal(arg) for arg in args]
+    strings = [value for value in values if value is not None]
+    return strings if len(strings) == len(values) else None
+
+
+def _literal(node: ast.expr) -> Optional[str]:
+    try:
+        value = ast.literal_eval(node)
+    except ValueError:
+        return None
+    return value if isinstance(value, str) else None
+
+
+def _pipfile_requirements(args: List[ast.expr], base: Path) -> Optional[Discovered]:
+    path = _path_literal(args[0]) if len(args) == 1 else None
+    if path is None or not (base / path).exists():
+        return None
+    entries = read_pipfile_lock(base / path)
+    return [entry.requirement for entry in entries], entries
+
+
+def _path_literal(node: ast.expr) -> Optional[str]:
+    if isinstance(node, ast.Call) and _function_name(node.func) == "Path":
+        return _literal(node.args[0]) if len(node.args) == 1 else None
+    return _literal(node)
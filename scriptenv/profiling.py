@@ -0,0 +1,66 @@
+"""Timings of the phases of building and enabling ScriptEnvs"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, List
+
+ProfileEnvName = "SCRIPTENV_PROFILE"
+Event = Dict[str, Any]
+Hook = Callable[[Event], None]
+
+_Hooks: List[Hook] = []
+_WriteLock = threading.Lock()
+
+
+def add_hook(hook: Hook) -> None:
+    """
+    Calls a hook with an event after each measured phase.
+
+    Each event contains the name of the phase, its start time,
+    its duration in seconds, the process id and details of the phase
+    like the package being installed or whether the cache was hit.
+    """
+    _Hooks.append(hook)
+
+
+def remove_hook(hook: Hook) -> None:
+    """Stops calling a hook added by add_hook."""
+    _Hooks.remove(hook)
+
+
+def write(path: Path, event: Event) -> None:
+    """Appends an event as a line of JSON to a file."""
+    with _WriteLock, path.open("a", encoding="utf-8") as profile:
+        profile.write(json.dumps(event, default=str) + "\n")
+
+
+@contextmanager
+def measure(phase: str, **details: Any) -> Generator[Event, None, None]:
+    """
+    Measures the duration of a phase and passes it to all hooks.
+    Details known only while the phase runs can be added to the yielded event.
+    """
+    event: Event = dict(phase=phase, start=time.time(), pid=os.getpid(), **details)
+    start = time.perf_counter()
+    try:
+        yield event
+    except BaseException as error:
+        event["error"] = type(error).__name__
+        raise
+    finally:
+        event["duration"] = time.perf_counter() - start
+        _emit(event)
+
+
+def _emit(event: Event) -> None:
+    profile_path = os.environ.get(ProfileEnvName)
+    if profile_path:
+        # profiling never breaks the measured phase or hides its errors
+        with suppress(OSError):
+            write(Path(profile_path), event)
+    for hook in list(_Hooks):
+        hook(event)
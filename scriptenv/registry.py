@@ -0,0 +1,72 @@
+"""Keeps track of the ScriptEnvs built in the current process"""
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import client
+from .builder import ScriptEnvBuilder
+from .config import Config
+from .lock import lock_key, module_name
+from .scriptenv import ScriptEnv
+
+_Envs: Dict[Tuple[Config, str], ScriptEnv] = {}
+
+
+def get(requirements: Iterable[str], config: Optional[Config] = None) -> ScriptEnv:
+    """
+    Returns a ScriptEnv for a set of requirements.
+
+    Each ScriptEnv gets built only once per process,
+    unless lock files are disabled or the ScriptEnv got invalidated.
+    """
+    requirements = list(requirements)
+    config = config or Config()
+    if not config.use_lockfile:
+        return _build(requirements, config)
+
+    key = (config, lock_key(requirements))
+    if key not in _Envs:
+        # keeps the ScriptEnv stored first when built concurrently in another thread
+        return _Envs.setdefault(key, _build(requirements, config))
+    return _Envs[key]
+
+
+async def get_async(
+    requirements: Iterable[str], config: Optional[Config] = None
+) -> ScriptEnv:
+    """Returns a ScriptEnv for a set of requirements, built in a thread if needed."""
+    # asyncio gets imported lazily to keep it out of the warm path
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    requirements = list(requirements)
+    return await asyncio.get_running_loop().run_in_executor(
+        None, get, requirements, config
+    )
+
+
+def _build(requirements: List[str], config: Config) -> ScriptEnv:
+    """Builds a ScriptEnv by the daemon if running, otherwise in-process."""
+    return client.build(requirements, config) or ScriptEnvBuilder(config).build(
+        requirements
+    )
+
+
+def modules(requirements: Iterable[str], config: Optional[Config] = None) -> Set[str]:
+    """
+    Top-level modules known to be provided by the ScriptEnv of a set of
+    requirements before it is built. These are the modules named like
+    the required projects and the modules of an import index stored before.
+    """
+    requirements = list(requirements)
+    names = {name for name in map(module_name, requirements) if name is not None}
+    return names | ScriptEnvBuilder(config).indexed_modules(requirements)
+
+
+def invalidate(*requirements: str) -> None:
+    """
+    Forgets the ScriptEnvs built for a set of requirements,
+    or all ScriptEnvs if no requirements are given.
+    """
+    key = lock_key(requirements)
+    for config_and_key in list(_Envs):
+        if not requirements or config_and_key[1] == key:
+            del _Envs[config_and_key]
@@ -4,16 +4,53 @@ import os
 import sys
 from pathlib import Path
 from types import ModuleType, TracebackType
-from typing import Callable, Iterable, List, Optional, Type
+from typing import Callable, Iterable, List, Optional, Set, Tuple, Type
 
+from . import profiling
+from .config import Config
+from .finder import ImportIndex, IndexFinder
+from .pack import Archive
 
-class ScriptEnv:
+
+class ScriptEnv:  # pylint: disable=too-many-instance-attributes
     """Environment which can be applied to the current runtime."""
 
-    def __init__(self, install_base: Path, packages: Iterable[str]) -> None:
-        """Initializes a ScriptEnv."""
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        install_base: Path,
+        packages: Iterable[str],
+        index: Optional[ImportIndex] = None,
+        bin_path: Optional[Path] = None,
+        base: Optional["ScriptEnv"] = None,
+        archive: Optional[Archive] = None,
+        config: Optional[Config] = None,
+    ) -> None:
+        """
+        Initializes a ScriptEnv.
+
+        With an import index top-level modules are resolved by a single
+        finder in sys.meta_path instead of one sys.path entry per package.
+        With a bin path containing the binaries of all packages
+        only this path gets added to PATH instead of one entry per package.
+        A ScriptEnv with a base is a layer adding packages on top of its base,
+        enabling or disabling a layer changes only the paths of its own packages.
+        With an archive the packed packages are imported from a single zip archive
+        added to sys.path instead of one entry per package.
+        Layers get added with the config the ScriptEnv was built with.
+        """
         self.packages_path = install_base
         self.packages = list(packages)
+        self.index = index
+        self.bin_path = bin_path
+        self.base = base
+        self.archive = archive
+        self.config = config
+        self._finder = (
+            None if index is None else IndexFinder(install_base, index, self.packages)
+        )
+        # precomputed for filtering paths and modules in disable
+        self._package_paths = _package_paths(install_base, self.packages, archive)
+        self._preexisting_modules: Optional[Set[str]] = None
 
     def __enter__(self) -> None:
         self.enable()
@@ -26,53 +63,112 @@ class ScriptEnv:
     ) -> None:
         self.disable()
 
+    def pinned_packages(self) -> List[str]:
+        """Packages of this ScriptEnv and all its bases."""
+        if self.base is None:
+            return list(self.packages)
+        return [*self.packages, *self.base.pinned_packages()]
+
+    def add(self, *requirements: str) -> "ScriptEnv":
+        """
+        Adds a layer with additional requirements on top of this ScriptEnv.
+
+        Only the additional requirements get resolved,
+        their dependencies are pinned to the versions of the packages
+        of this ScriptEnv. The layer gets enabled and contains only
+        the packages missing in this ScriptEnv.
+
+        Arguments:
+            requirements: List of pip requirements required to be installed.
+        """
+        # imported lazily, the builder depends on this module
+        # pylint: disable=import-outside-toplevel,cyclic-import
+        from .builder import ScriptEnvBuilder
+
+        layer = ScriptEnvBuilder(self.config).build(requirements, base=self)
+        layer.enable()
+        return layer
+
     def enable(self) -> None:
         """
         Updates the current runtime to make the packages available.
 
-        sys.path gets updated to support imports.
+        sys.path or sys.meta_path gets updated to support imports.
         PYTHONPATH gets updated to support imports in subprocesses.
         PATH gets updated to support entry points called from subprocesses.
+        Enabling again moves the paths to the front
+        and keeps the modules already imported from the packages.
         """
-        # first disable to avoid duplicates when already enabled
-        self.disable()
-
-        sys.path[0:0] = [str(self.packages_path / pkg) for pkg in self.packages]
-        _extend_environ_path(
-            "PYTHONPATH", [str(self.packages_path / pkg) for pkg in self.packages]
-        )
-        _extend_environ_path(
-            "PATH", [str(self.packages_path / pkg / "bin") for pkg in self.packages]
-        )
+        with profiling.measure("enable", packages=len(self.packages)):
+            # first remove the paths to avoid duplicates when already enabled
+            self._remove_paths()
+
+            if self._finder is None:
+                sys.path[0:0] = self._package_paths
+            else:
+                sys.meta_path.insert(0, self._finder)
+            _extend_environ_path("PYTHONPATH", list(self._package_paths))
+            _extend_environ_path("PATH", self._bin_paths())
+            if self._preexisting_modules is None:
+                self._preexisting_modules = set(sys.modules)
 
     def disable(self) -> None:
         """
         Removes the entries from paths added by calling `self.enable`
 
-        Additionally removes modules from `sys.modules`.
+        Additionally removes the modules imported from the packages
+        since the last call of `self.enable` from `sys.modules`.
         """
+        with profiling.measure("disable", packages=len(self.packages)):
+            self._remove_paths()
+            for name in self._imported_modules():
+                sys.modules.pop(name, None)
+            self._preexisting_modules = None
+
+    def _remove_paths(self) -> None:
         sys.path = list(filter(self._is_non_scriptenv_path, sys.path))
+        sys.meta_path = [
+            finder for finder in sys.meta_path if finder is not self._finder
+        ]
         _revert_environ_path("PYTHONPATH", self._is_non_scriptenv_path)
-        _revert_environ_path("PATH", self._is_non_scriptenv_path)
-
-        for name in list(sys.modules):
-            if self._is_scriptenv_module(sys.modules[name]):
-                sys.modules.pop(name, None)
+        _revert_environ_path("PATH", self._is_non_scriptenv_bin_path)
+
+    def _imported_modules(self) -> List[str]:
+        """Names of the modules imported from the packages since enabled."""
+        if self._preexisting_modules is None:
+            return []
+        return [
+            name
+            for name in sys.modules.keys() - self._preexisting_modules
+            if self._is_scriptenv_module(sys.modules.get(name))
+        ]
+
+    def _bin_paths(self) -> List[str]:
+        if self.bin_path is not None:
+            return [str(self.bin_path)]
+        return [str(self.packages_path / pkg / "bin") for pkg in self.packages]
+
+    def _is_non_scriptenv_bin_path(self, path: str) -> bool:
+        return path not in self._bin_paths() and self._is_non_scriptenv_path(path)
 
     def _is_non_scriptenv_path(self, path: str) -> bool:
-        package_paths = [str(self.packages_path / pkg) for pkg in self.packages]
-        return not any(
-            (
-                path.startswith(package_path)
-                for package_path in package_paths
-                if package_path
-            )
-        )
-
-    def _is_scriptenv_module(self, module: ModuleType) -> bool:
-        if getattr(module, "__file__", None) is None:
-            return False
-        return not self._is_non_scriptenv_path(module.__file__)
+        return not path.startswith(self._package_paths)
+
+    def _is_scriptenv_module(self, module: Optional[ModuleType]) -> bool:
+        file = getattr(module, "__file__", None)
+        return isinstance(file, str) and file.startswith(self._package_paths)
+
+
+def _package_paths(
+    install_base: Path, packages: Iterable[str], archive: Optional[Archive]
+) -> Tuple[str, ...]:
+    if archive is None:
+        return tuple(str(install_base / pkg) for pkg in packages)
+    # packages which are not packed contain native extensions zipimport can not load
+    return (
+        str(archive.path),
+        *(str(install_base / pkg) for pkg in packages if pkg not in archive.packages),
+    )
 
 
 def _extend_environ_path(name: str, items: List[str]) -> None:
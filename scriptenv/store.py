@@ -0,0 +1,42 @@
+"""Content addressed store to deduplicate the files of installed packages"""
+
+import hashlib
+import os
+from contextlib import suppress
+from pathlib import Path
+
+
+def link_tree(tree: Path, store: Path) -> None:
+    """
+    Replaces each file in a tree by a hardlink to a file in the store
+    with the same content. Files which can not be linked are kept as copies.
+    """
+    for path in sorted(tree.rglob("*")):
+        if path.is_file() and not path.is_symlink():
+            _link_file(path, store)
+
+
+def _link_file(path: Path, store: Path) -> None:
+    stored = store / _content_key(path)
+    with suppress(OSError):
+        _store(path, stored)
+        _replace_with_link(stored, path)
+
+
+def _content_key(path: Path) -> str:
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    mode = path.stat().st_mode & 0o777
+    return f"{digest[:2]}/{digest}-{mode:o}"
+
+
+def _store(path: Path, stored: Path) -> None:
+    stored.parent.mkdir(parents=True, exist_ok=True)
+    with suppress(FileExistsError):
+        os.link(path, stored)
+
+
+def _replace_with_link(stored: Path, path: Path) -> None:
+    if not stored.samefile(path):
+        link = path.with_name(f"{path.name}.link")
+        os.link(stored, link)
+        os.replace(link, path)
@@ -1,14 +1,17 @@
 """Mocks a pypi server"""
 
+import hashlib
 import io
 import os
+import time
+import zipfile
 from contextlib import contextmanager, redirect_stderr, redirect_stdout
 from enum import Enum
 from functools import partial
 from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from threading import Thread
-from typing import Generator, Iterable, Mapping, NamedTuple, Optional
+from typing import Generator, Iterable, List, Mapping, NamedTuple, Optional
 from unittest.mock import patch
 
 from setuptools import sandbox
@@ -75,23 +78,75 @@ __version__ = '{self.version}'
 """
 
 
-@contextmanager
-def _serve_directory(path: Path) -> Generator[str, None, None]:
-    host, port = "localhost", 9000
+def _sha256(content: bytes) -> str:
+    return f"sha256={hashlib.sha256(content).hexdigest()}"
+
+
+def _wheel_metadata(wheel: Path) -> bytes:
+    with zipfile.ZipFile(wheel) as archive:
+        return archive.read(
+            next(
+                name
+                for name in archive.namelist()
+                if name.endswith(".dist-info/METADATA")
+            )
+        )
+
+
+def _anchor(dist: Path) -> str:
+    metadata = dist.with_name(f"{dist.name}.metadata")
+    attributes = ""
+    if metadata.is_file():
+        metadata_hash = _sha256(metadata.read_bytes())
+        attributes = (
+            f' data-dist-info-metadata="{metadata_hash}"'
+            f' data-core-metadata="{metadata_hash}"'
+        )
+    return (
+        f'<a href="{dist.name}#{_sha256(dist.read_bytes())}"{attributes}>'
+        f"{dist.name}</a>"
+    )
+
+
+class SilentHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """
+    SimpleHTTPRequestHandler without logging which records requested paths,
+    keeps connections alive and delays each response by a latency in seconds.
+    """
+
+    protocol_version = "HTTP/1.1"
+    requests: List[str] = []
+    latency: float = 0.0
+
+    def do_GET(self) -> None:
+        """Records the requested path."""
+        self.requests.append(self.path)
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(
+        self,
+        format: str,  # pylint: disable=unused-argument,redefined-builtin
+        *args: str,
+    ) -> None:
+        """Discard all log messages."""
+        return
 
-    class SilentHTTPRequestHandler(SimpleHTTPRequestHandler):
-        """SimpleHTTPRequestHandler without logging."""
 
-        def log_message(
-            self,
-            format: str,  # pylint: disable=unused-argument,redefined-builtin
-            *args: str,
-        ) -> None:
-            """Discard all log messages."""
-            return
+@contextmanager
+def _serve_directory(
+    path: Path, requests: List[str], latency: float
+) -> Generator[str, None, None]:
+    host, port = "localhost", 9000
+    handler = type(
+        "Handler",
+        (SilentHTTPRequestHandler,),
+        dict(requests=requests, latency=latency),
+    )
 
     with ThreadingHTTPServer(
-        (host, port), partial(SilentHTTPRequestHandler, directory=path.absolute())
+        (host, port),
+        partial(handler, directory=path.absolute()),
     ) as httpd:
         thread = Thread(target=httpd.serve_forever, daemon=True)
         thread.start()
@@ -105,23 +160,45 @@ def _serve_directory(path: Path) -> Generator[str, None, None]:
 class MockPI:
     """Serves a python package index server with dummy packages"""
 
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, metadata: bool = True, latency: float = 0.0):
         self._serve_path = path / "packages"
         self._build_path = path / "build"
+        self._metadata = metadata
+        self._latency = latency
 
         self.url: Optional[str] = None
+        self.requests: List[str] = []
 
     def add(self, pkg: Package) -> None:
-        """Adds a dummy package to the pypi server"""
+        """
+        Adds a dummy package to the pypi server.
+        Wheels are served with a metadata file (PEP 658) if enabled.
+        """
         serve_path = self._serve_path / pkg.name
         serve_path.mkdir(parents=True, exist_ok=True)
         dist_path = pkg.build(self._build_path)
         (serve_path / dist_path.name).write_bytes(dist_path.read_bytes())
+        if self._metadata and pkg.dist_type == DistType.WHEEL:
+            (serve_path / f"{dist_path.name}.metadata").write_bytes(
+                _wheel_metadata(dist_path)
+            )
+        self._write_project_page(serve_path)
+
+    @staticmethod
+    def _write_project_page(serve_path: Path) -> None:
+        anchors = [
+            _anchor(dist)
+            for dist in sorted(serve_path.glob("*"))
+            if dist.suffix not in [".metadata", ".html"]
+        ]
+        (serve_path / "index.html").write_text(
+            f"<html><body>{''.join(anchors)}</body></html>"
+        )
 
     @contextmanager
     def server(self) -> Generator[None, None, None]:
         """Starts the pypi server"""
-        with _serve_directory(self._serve_path) as url:
+        with _serve_directory(self._serve_path, self.requests, self._latency) as url:
             self.url = url
             with patch.dict(
                 os.environ, dict(PIP_INDEX_URL=url, PIP_NO_CACHE_DIR="off")
@@ -1,16 +1,28 @@
 # pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
 
+import asyncio
 import hashlib
 import json
+import os
+import tempfile
+import threading
 from dataclasses import replace
 from pathlib import Path
+from typing import List
 from unittest.mock import call
 
 import pytest
 from pytest_mock import MockerFixture
 
+from scriptenv import lockfile, profiling
 from scriptenv.builder import ScriptEnvBuilder
 from scriptenv.config import Config
+from scriptenv.lock import lock_key, packages_key
+from scriptenv.lockfile import LockedPackage, Lockfile
+from scriptenv.pack import Archive
+from scriptenv.pip import PipError
+from scriptenv.pipfile import PipfileEntry
+from scriptenv.scriptenv import ScriptEnv
 
 
 @pytest.fixture
@@ -24,6 +36,8 @@ def test_paths(config: Config) -> None:
     assert builder.install_path == config.cache_path / "install"
     assert builder.locks_path == config.cache_path / "locks"
     assert builder.package_cache_path == config.cache_path / "cache"
+    assert builder.store_path == config.cache_path / "store"
+    assert builder.mutex_path == config.cache_path / "mutex"
 
     assert builder.locks_path.is_dir()
 
@@ -32,11 +46,7 @@ def test_fetch_requirements_from_lockfile(
     config: Config, mocker: MockerFixture
 ) -> None:
     download_mock = mocker.patch("scriptenv.pip.download")
-    lockfile = (
-        config.cache_path
-        / "locks"
-        / hashlib.md5(b"requirement0\nrequirement1").hexdigest()
-    )
+    lockfile = config.cache_path / "locks" / lock_key(["requirement0", "requirement1"])
     lockfile.parent.mkdir(parents=True)
     lockfile.write_text('["cached", "packages"]')
 
@@ -48,14 +58,57 @@ def test_fetch_requirements_from_lockfile(
     download_mock.assert_not_called()
 
 
+def test_fetch_requirements_records_access(
+    config: Config, mocker: MockerFixture
+) -> None:
+    lockfile = config.cache_path / "locks" / lock_key(["requirement"])
+    lockfile.parent.mkdir(parents=True)
+    lockfile.write_text('["cached"]')
+    os.utime(lockfile, (0, 0))
+
+    ScriptEnvBuilder(config).fetch_requirements(["requirement"])
+    assert lockfile.stat().st_mtime > 0
+
+    mocker.patch("os.utime", side_effect=PermissionError)
+    ScriptEnvBuilder(config).fetch_requirements(["requirement"])
+
+
+def test_fetch_requirements_waits_for_concurrent_resolution(
+    config: Config, mocker: MockerFixture
+) -> None:
+    download_mock = mocker.patch("scriptenv.pip.download")
+    lockfile = config.cache_path / "locks" / lock_key(["requirement"])
+    builder = ScriptEnvBuilder(config)
+    mutex_mock = mocker.patch.object(builder, "mutex")
+    mutex_mock.return_value.__enter__.side_effect = lambda: lockfile.write_text(
+        '["concurrently", "resolved"]'
+    )
+
+    assert builder.fetch_requirements(["requirement"]) == {
+        "concurrently",
+        "resolved",
+    }
+    mutex_mock.assert_called_once_with(lockfile.name)
+    download_mock.assert_not_called()
+
+
+def test_fetch_requirements_from_equivalent_lockfile(
+    config: Config, mocker: MockerFixture
+) -> None:
+    download_mock = mocker.patch("scriptenv.pip.download")
+    download_mock.return_value = {"resolved", "packages"}
+
+    builder = ScriptEnvBuilder(config)
+    builder.fetch_requirements(["Requirement0==1", "requirement1"])
+    builder.fetch_requirements(["requirement1", "requirement0 == 1"])
+
+    download_mock.assert_called_once()
+
+
 def test_fetch_requirements_with_pip(config: Config, mocker: MockerFixture) -> None:
     download_mock = mocker.patch("scriptenv.pip.download")
     download_mock.return_value = {"resolved", "packages"}
-    lockfile = (
-        config.cache_path
-        / "locks"
-        / hashlib.md5(b"requirement0\nrequirement1").hexdigest()
-    )
+    lockfile = config.cache_path / "locks" / lock_key(["requirement0", "requirement1"])
 
     builder = ScriptEnvBuilder(config)
     resolved_packages = builder.fetch_requirements(["requirement0", "requirement1"])
@@ -65,9 +118,95 @@ def test_fetch_requirements_with_pip(config: Config, mocker: MockerFixture) -> N
         "packages",
     }
     download_mock.assert_called_once_with(
-        ["requirement0", "requirement1"], config.cache_path / "cache"
+        ["requirement0", "requirement1"], config.cache_path / "cache", []
     )
-    assert set(json.loads(lockfile.read_text())) == {"resolved", "packages"}
+    assert set(json.loads(lockfile.read_text())["packages"]) == {"resolved", "packages"}
+
+
+def test_fetch_requirements_with_metadata_resolution(
+    config: Config, mocker: MockerFixture
+) -> None:
+    mocker.patch("scriptenv.pip.supports_metadata_resolution", return_value=True)
+    resolve_mock = mocker.patch("scriptenv.pip.resolve")
+    resolve_mock.return_value = {
+        "cached.whl": "url/cached",
+        "missing.whl": "url/missing",
+    }
+    fetch_mock = mocker.patch("scriptenv.pip.fetch")
+
+    builder = ScriptEnvBuilder(
+        replace(config, use_metadata_resolution=True, download_workers=3)
+    )
+    resolved_packages = builder.fetch_requirements(["requirement"])
+
+    assert resolved_packages == {"cached.whl", "missing.whl"}
+    resolve_mock.assert_called_once_with(
+        ["requirement"], config.cache_path / "cache", []
+    )
+    fetch_mock.assert_called_once_with(
+        mocker.ANY,
+        config.cache_path / "cache",
+        workers=3,
+        thread_name_prefix="scriptenv-download",
+    )
+    assert list(fetch_mock.call_args.args[0]) == ["url/cached", "url/missing"]
+
+
+def test_fetch_requirements_without_supported_metadata_resolution(
+    config: Config, mocker: MockerFixture
+) -> None:
+    mocker.patch("scriptenv.pip.supports_metadata_resolution", return_value=False)
+    resolve_mock = mocker.patch("scriptenv.pip.resolve")
+    download_mock = mocker.patch("scriptenv.pip.download")
+    download_mock.return_value = {"downloaded"}
+
+    builder = ScriptEnvBuilder(replace(config, use_metadata_resolution=True))
+
+    assert builder.fetch_requirements(["requirement"]) == {"downloaded"}
+    resolve_mock.assert_not_called()
+
+
+@pytest.mark.parametrize("use_metadata_resolution", [False, True])
+def test_fetch_requirements_pinned(
+    config: Config, mocker: MockerFixture, use_metadata_resolution: bool
+) -> None:
+    resolved = {"pkg-1.0-py3-none-any.whl", "Dep_Name-0.1.tar.gz"}
+    download_mock = mocker.patch("scriptenv.pip.download")
+    download_mock.return_value = resolved
+    mocker.patch("scriptenv.pip.supports_metadata_resolution", return_value=True)
+    resolve_mock = mocker.patch("scriptenv.pip.resolve")
+    resolve_mock.return_value = dict.fromkeys(resolved, "")
+    mocker.patch("scriptenv.pip.fetch")
+    builder = ScriptEnvBuilder(
+        replace(config, use_metadata_resolution=use_metadata_resolution)
+    )
+
+    assert builder.fetch_requirements(["pkg"], ["Dep_Name-0.1.tar.gz"]) == {
+        "pkg-1.0-py3-none-any.whl"
+    }
+    assert builder.fetch_requirements(["pkg"]) == resolved
+
+    resolver = resolve_mock if use_metadata_resolution else download_mock
+    assert resolver.call_args_list == [
+        call(["pkg"], config.cache_path / "cache", ["dep-name==0.1"]),
+        call(["pkg"], config.cache_path / "cache", []),
+    ]
+
+
+def test_fetch_requirements_offline(config: Config, mocker: MockerFixture) -> None:
+    download_mock = mocker.patch("scriptenv.pip.download")
+    download_mock.side_effect = [{"cached"}, PipError(1), {"downloaded"}]
+    builder = ScriptEnvBuilder(replace(config, use_offline_resolution=True))
+
+    assert builder.fetch_requirements(["requirement0"]) == {"cached"}
+    assert builder.fetch_requirements(["requirement1"]) == {"downloaded"}
+
+    cache = config.cache_path / "cache"
+    assert download_mock.call_args_list == [
+        call(["requirement0"], cache, [], find_links=cache),
+        call(["requirement1"], cache, [], find_links=cache),
+        call(["requirement1"], cache, []),
+    ]
 
 
 def test_fetch_requirements_disable_lockfile(
@@ -75,11 +214,7 @@ def test_fetch_requirements_disable_lockfile(
 ) -> None:
     download_mock = mocker.patch("scriptenv.pip.download")
     download_mock.return_value = {"resolved", "packages"}
-    lockfile = (
-        config.cache_path
-        / "locks"
-        / hashlib.md5(b"requirement0\nrequirement1").hexdigest()
-    )
+    lockfile = config.cache_path / "locks" / lock_key(["requirement0", "requirement1"])
     lockfile.parent.mkdir(parents=True)
     lockfile.write_text('["cached", "packages"]')
 
@@ -90,42 +225,565 @@ def test_fetch_requirements_disable_lockfile(
     }
 
 
+def test_import_index(config: Config, mocker: MockerFixture) -> None:
+    build_index_mock = mocker.patch("scriptenv.builder.build_index")
+    build_index_mock.return_value = {"module": ["pkg"]}
+    index_path = config.cache_path / "locks" / f"{lock_key(['requirement'])}.index"
+
+    builder = ScriptEnvBuilder(config)
+    assert builder.import_index(["requirement"], ["pkg"]) == {"module": ["pkg"]}
+    assert json.loads(index_path.read_text()) == {"module": ["pkg"]}
+    build_index_mock.assert_called_once_with(config.cache_path / "install", ["pkg"])
+
+    assert builder.import_index(["requirement"], ["pkg"]) == {"module": ["pkg"]}
+    build_index_mock.assert_called_once()
+
+
+def test_import_index_disable_lockfile(config: Config, mocker: MockerFixture) -> None:
+    build_index_mock = mocker.patch("scriptenv.builder.build_index")
+    build_index_mock.return_value = {"module": ["pkg"]}
+    index_path = config.cache_path / "locks" / f"{lock_key(['requirement'])}.index"
+    index_path.parent.mkdir(parents=True)
+    index_path.write_text('{"cached": ["index"]}')
+
+    builder = ScriptEnvBuilder(replace(config, use_lockfile=False))
+    assert builder.import_index(["requirement"], ["pkg"]) == {"module": ["pkg"]}
+
+
+def test_indexed_modules(config: Config) -> None:
+    index_path = config.cache_path / "locks" / f"{lock_key(['requirement'])}.index"
+    builder = ScriptEnvBuilder(config)
+    assert not builder.indexed_modules(["requirement"])
+
+    index_path.write_text('{"module": ["pkg"]}')
+    assert builder.indexed_modules(["requirement"]) == {"module"}
+
+    index_path.write_text("{")
+    assert not builder.indexed_modules(["requirement"])
+
+
+def _install(package: Path, target: Path) -> None:
+    (target / "module.py").write_text(package.name)
+
+
 def test_install_packages(config: Config, mocker: MockerFixture) -> None:
-    install_mock = mocker.patch("scriptenv.pip.install")
+    install_mock = mocker.patch("scriptenv.pip.install", side_effect=_install)
     (config.cache_path / "install" / "already_installed").mkdir(parents=True)
 
     builder = ScriptEnvBuilder(config)
     builder.install_packages(["pkg0", "already_installed", "pkg1"])
 
-    install_mock.assert_has_calls(
+    assert {call.args[0] for call in install_mock.call_args_list} == {
+        config.cache_path / "cache" / "pkg0",
+        config.cache_path / "cache" / "pkg1",
+    }
+    assert sorted(path.name for path in builder.install_path.iterdir()) == [
+        "already_installed",
+        "pkg0",
+        "pkg1",
+    ]
+    assert (builder.install_path / "pkg1" / "module.py").read_text() == "pkg1"
+
+
+def test_install_packages_atomic(config: Config, mocker: MockerFixture) -> None:
+    def install(package: Path, target: Path) -> None:
+        _install(package, target)
+        raise PipError(1, package.name)
+
+    mocker.patch("scriptenv.pip.install", side_effect=install)
+
+    builder = ScriptEnvBuilder(config)
+    with pytest.raises(PipError):
+        builder.install_packages(["pkg"])
+    assert not list(builder.install_path.iterdir())
+
+
+def test_install_packages_waits_for_concurrent_install(
+    config: Config, mocker: MockerFixture
+) -> None:
+    install_mock = mocker.patch("scriptenv.pip.install")
+    builder = ScriptEnvBuilder(config)
+    mutex_mock = mocker.patch.object(builder, "mutex")
+    mutex_mock.return_value.__enter__.side_effect = lambda: (
+        builder.install_path / "pkg"
+    ).mkdir(parents=True)
+
+    builder.install_packages(["pkg"])
+
+    mutex_mock.assert_called_once_with("pkg")
+    install_mock.assert_not_called()
+
+
+def test_install_packages_links_into_store(
+    config: Config, mocker: MockerFixture
+) -> None:
+    mocker.patch("scriptenv.pip.install")
+    link_tree_mock = mocker.patch("scriptenv.store.link_tree")
+
+    ScriptEnvBuilder(config).install_packages(["pkg"])
+    ScriptEnvBuilder(replace(config, use_file_store=False)).install_packages(["pkg0"])
+
+    link_tree_mock.assert_called_once()
+    assert link_tree_mock.call_args.args[1] == config.cache_path / "store"
+
+
+def test_install_packages_precompiles(config: Config, mocker: MockerFixture) -> None:
+    mocker.patch("scriptenv.pip.install")
+    compile_mock = mocker.patch("scriptenv.bytecode.compile_packages")
+
+    ScriptEnvBuilder(
+        replace(config, install_workers=2, use_unchecked_pycs=True)
+    ).install_packages(["pkg0", "pkg1"])
+    ScriptEnvBuilder(replace(config, use_precompilation=False)).install_packages(
+        ["pkg0"]
+    )
+
+    compile_mock.assert_called_once_with(
         [
-            call(
-                config.cache_path / "cache" / "pkg0",
-                config.cache_path / "install" / "pkg0",
-            ),
-            call(
-                config.cache_path / "cache" / "pkg1",
-                config.cache_path / "install" / "pkg1",
-            ),
-        ]
+            config.cache_path / "install" / "pkg0",
+            config.cache_path / "install" / "pkg1",
+        ],
+        workers=2,
+        unchecked_hash=True,
     )
 
 
-def test_build(mocker: MockerFixture) -> None:
-    builder = ScriptEnvBuilder()
+def test_install_packages_with_workers(config: Config, mocker: MockerFixture) -> None:
+    mocker.patch("scriptenv.pip.install")
+    executor_mock = mocker.patch("scriptenv.builder.ThreadPoolExecutor")
+
+    builder = ScriptEnvBuilder(replace(config, install_workers=3))
+    builder.install_packages(["pkg"])
+
+    executor_mock.assert_called_once_with(
+        max_workers=3, thread_name_prefix="scriptenv-install"
+    )
+
+
+def test_install_packages_error(config: Config, mocker: MockerFixture) -> None:
+    def install(package: Path, target: Path) -> None:
+        if package.name == "failing":
+            raise PipError(1, package.name)
+
+    mocker.patch("scriptenv.pip.install", side_effect=install)
+
+    builder = ScriptEnvBuilder(config)
+    with pytest.raises(PipError) as exc_info:
+        builder.install_packages(["pkg0", "failing", "pkg1"])
+    assert exc_info.value.package == "failing"
+
+
+def test_build(config: Config, mocker: MockerFixture) -> None:
+    builder = ScriptEnvBuilder(config)
 
     requirements = ["requirement"]
     packages = {"requirement", "dependency"}
 
-    fetch_mock = mocker.patch.object(builder, "fetch_requirements")
-    fetch_mock.return_value = packages
+    lock_mock = mocker.patch.object(builder, "lock")
+    lock_mock.return_value = Lockfile(dict.fromkeys(packages, LockedPackage()))
 
     install_mock = mocker.patch.object(builder, "install_packages")
 
     env = builder.build(["requirement"])
 
     assert env.packages_path == builder.install_path
-    assert env.packages == list(packages)
+    assert sorted(env.packages) == sorted(packages)
+    assert env.bin_path == builder.link_binaries(packages)
+
+    lock_mock.assert_called_once_with(requirements, [])
+    install_mock.assert_called_once_with(lock_mock.return_value.packages)
+
+
+def test_build_packed(config: Config, mocker: MockerFixture) -> None:
+    mocker.patch("scriptenv.pip.install", side_effect=_install)
+    builder = ScriptEnvBuilder(replace(config, use_import_index=True))
+    builder.locks_path.joinpath(lock_key(["requirement"])).write_text(
+        lockfile.dumps(Lockfile(dict.fromkeys(["pkg0", "pkg1"], LockedPackage())))
+    )
+
+    builder.locks_path.joinpath(lock_key(["other"])).write_text(
+        lockfile.dumps(Lockfile({"pkg0": LockedPackage()}))
+    )
+
+    archive = builder.pack(["requirement"])
+    env = builder.build(["requirement"])
+
+    assert archive == Archive(
+        builder.locks_path / f"{lock_key(['requirement'])}.zip", ("pkg0", "pkg1")
+    )
+    assert env.archive == archive
+    assert env.index is None
+    assert builder.build(["other"]).archive is None
+
+
+def test_build_profiling(
+    config: Config, mocker: MockerFixture, events: List[profiling.Event]
+) -> None:
+    mocker.patch("scriptenv.pip.download").return_value = {"pkg0", "pkg1"}
+    mocker.patch("scriptenv.pip.install", side_effect=_install)
+    builder = ScriptEnvBuilder(replace(config, use_precompilation=False))
+
+    builder.build(["requirement"])
+    (builder.install_path / "pkg0").rename(builder.install_path / ".pkg0")
+    builder.build(["requirement"])
+
+    phases = [(event["phase"], event.get("cache_hit")) for event in events]
+    assert [phase for phase in phases if phase[0] != "install"] == [
+        ("download", None),
+        ("lock", False),
+        ("fetch_locked", None),
+        ("install_packages", None),
+        ("link_binaries", False),
+        ("build", None),
+        ("lock", True),
+        ("fetch_locked", None),
+        ("install_packages", None),
+        ("link_binaries", True),
+        ("build", None),
+    ]
+    assert sorted(
+        (event["package"], event["cache_hit"])
+        for event in events
+        if event["phase"] == "install"
+    ) == [("pkg0", False), ("pkg0", False), ("pkg1", False)]
+    assert events[-3]["cache_hits"] == ["pkg1"]
+    assert events[-1]["requirements"] == ["requirement"]
+    assert all(event["duration"] >= 0 for event in events)
+
+
+@pytest.mark.parametrize(
+    "use_precompilation, state", [(False, "installed"), (True, "compiled")]
+)
+def test_build_records_install_state(
+    config: Config, mocker: MockerFixture, use_precompilation: bool, state: str
+) -> None:
+    mocker.patch("scriptenv.pip.download").return_value = {"pkg"}
+    mocker.patch("scriptenv.pip.install", side_effect=_install)
+    mocker.patch("scriptenv.bytecode.compile_packages")
+    builder = ScriptEnvBuilder(replace(config, use_precompilation=use_precompilation))
+    lockfile_path = builder.locks_path / lock_key(["requirement"])
+
+    builder.build(["requirement"])
+    install_spy = mocker.spy(builder, "install_packages")
+    builder.build(["requirement"])
+
+    assert json.loads(lockfile_path.read_text())["state"] == state
+    install_spy.assert_not_called()
+
+
+def test_build_without_lockfile(config: Config, mocker: MockerFixture) -> None:
+    mocker.patch("scriptenv.pip.download").return_value = {"pkg"}
+    builder = ScriptEnvBuilder(replace(config, use_lockfile=False))
+    install_mock = mocker.patch.object(builder, "install_packages")
+
+    builder.build(["requirement"])
+    builder.build(["requirement"])
+
+    assert install_mock.call_count == 2
+    assert not list(builder.locks_path.iterdir())
+
+
+def test_build_state_of_removed_lockfile(config: Config, mocker: MockerFixture) -> None:
+    mocker.patch("scriptenv.pip.download").return_value = {"pkg"}
+    builder = ScriptEnvBuilder(config)
+    lockfile_path = builder.locks_path / lock_key(["requirement"])
+    # removed by a garbage collection while installing
+    mocker.patch.object(builder, "install_packages").side_effect = lambda packages: (
+        lockfile_path.unlink()
+    )
+
+    builder.build(["requirement"])
+
+    assert not lockfile_path.exists()
+
+
+def test_build_fetches_locked_packages(config: Config, mocker: MockerFixture) -> None:
+    fetch_mock = mocker.patch("scriptenv.pip.fetch")
+    builder = ScriptEnvBuilder(replace(config, download_workers=3))
+    mocker.patch.object(builder, "install_packages")
+    (builder.install_path / "installed").mkdir(parents=True)
+    (builder.locks_path / lock_key(["requirement"])).write_text(
+        lockfile.dumps(
+            Lockfile(
+                {
+                    "installed": LockedPackage(sha256="0", url="url/installed"),
+                    "missing": LockedPackage(sha256="1", url="url/missing"),
+                    "unknown": LockedPackage(),
+                }
+            )
+        )
+    )
+
+    builder.build(["requirement"])
+
+    fetch_mock.assert_called_once_with(
+        ["url/missing#sha256=1"],
+        config.cache_path / "cache",
+        workers=3,
+        thread_name_prefix="scriptenv-download",
+    )
+
+
+def test_build_records_use_of_entries(config: Config, mocker: MockerFixture) -> None:
+    mocker.patch("scriptenv.pip.fetch")
+    builder = ScriptEnvBuilder(config)
+    mocker.patch.object(builder, "install_packages")
+    (builder.install_path / "installed").mkdir(parents=True)
+    builder.package_cache_path.mkdir()
+    (builder.package_cache_path / "missing").write_text("")
+    bin_path = builder.link_binaries(["installed", "missing"])
+    (builder.locks_path / lock_key(["requirement"])).write_text(
+        lockfile.dumps(
+            Lockfile({"installed": LockedPackage(), "missing": LockedPackage()})
+        )
+    )
+    entries = [
+        builder.install_path / "installed",
+        builder.package_cache_path / "missing",
+        bin_path,
+    ]
+    for path in entries:
+        os.utime(path, (0, 0))
+
+    builder.build(["requirement"])
+
+    assert all(path.stat().st_mtime > 0 for path in entries)
+
+
+def test_lock_removed_concurrently(config: Config, mocker: MockerFixture) -> None:
+    lock = Lockfile({"pkg": LockedPackage()})
+    lockfile_path = config.cache_path / "locks" / lock_key(["requirement"])
+    lockfile_path.parent.mkdir(parents=True)
+    lockfile_path.write_text(lockfile.dumps(lock))
+    # removed by a garbage collection after checking it exists
+    mocker.patch("scriptenv.lockfile.read", side_effect=[FileNotFoundError, lock])
+
+    assert ScriptEnvBuilder(config).lock(["requirement"]) == lock
+
+
+def test_build_migrates_lockfile(config: Config, mocker: MockerFixture) -> None:
+    mocker.patch("scriptenv.pip.install", side_effect=_install)
+    builder = ScriptEnvBuilder(replace(config, use_precompilation=False))
+    lockfile_path = builder.locks_path / lock_key(["requirement"])
+    lockfile_path.write_text('["pkg"]')
+    builder.package_cache_path.mkdir()
+    (builder.package_cache_path / "pkg").write_bytes(b"package")
+
+    builder.build(["requirement"])
+
+    assert json.loads(lockfile_path.read_text()) == {
+        "version": 2,
+        "state": "installed",
+        "packages": {
+            "pkg": {
+                "sha256": hashlib.sha256(b"package").hexdigest(),
+                "size": 7,
+                "url": None,
+                "dependencies": [],
+            }
+        },
+    }
+
+
+def test_lock_pinned(config: Config, mocker: MockerFixture) -> None:
+    download_mock = mocker.patch("scriptenv.pip.download")
+    find_mock = mocker.patch(
+        "scriptenv.pip.find",
+        side_effect=lambda packages, index_url, **_: {
+            f"{index_url}-{name}": f"{index_url}/{name}" for name in packages
+        },
+    )
+    fetch_mock = mocker.patch("scriptenv.pip.fetch")
+    entries = [
+        PipfileEntry("pkg0", "==1.0"),
+        PipfileEntry("pkg1", "==1.0", index_url="mirror"),
+    ]
+    builder = ScriptEnvBuilder(replace(config, download_workers=3))
+
+    builder.lock_pinned(entries)
+    builder.lock_pinned(entries)
+
+    find_mock.assert_has_calls(
+        [
+            call(
+                {"pkg0==1.0": ()},
+                None,
+                workers=3,
+                thread_name_prefix="scriptenv-find",
+            ),
+            call(
+                {"pkg1==1.0": ()},
+                "mirror",
+                workers=3,
+                thread_name_prefix="scriptenv-find",
+            ),
+        ]
+    )
+    fetch_mock.assert_called_once()
+    download_mock.assert_not_called()
+    assert builder.lock(["pkg0==1.0", "pkg1==1.0"]) == Lockfile(
+        {
+            "None-pkg0==1.0": LockedPackage(url="None/pkg0==1.0"),
+            "mirror-pkg1==1.0": LockedPackage(url="mirror/pkg1==1.0"),
+        }
+    )
+
+
+def test_lock_pinned_waits_for_concurrent_lock(
+    config: Config, mocker: MockerFixture
+) -> None:
+    find_mock = mocker.patch("scriptenv.pip.find")
+    lockfile_path = config.cache_path / "locks" / lock_key(["pkg==1.0"])
+    builder = ScriptEnvBuilder(config)
+    mutex_mock = mocker.patch.object(builder, "mutex")
+    mutex_mock.return_value.__enter__.side_effect = lambda: lockfile_path.write_text(
+        '["concurrently-locked"]'
+    )
+
+    builder.lock_pinned([PipfileEntry("pkg", "==1.0")])
+
+    mutex_mock.assert_called_once_with(lockfile_path.name)
+    find_mock.assert_not_called()
+
+
+def test_lock_pinned_hash_mismatch(config: Config, mocker: MockerFixture) -> None:
+    mocker.patch(
+        "scriptenv.pip.find", return_value={"pkg-1.0.tar.gz": "url/pkg-1.0.tar.gz"}
+    )
+    mocker.patch(
+        "scriptenv.pip.fetch",
+        side_effect=lambda urls, dest, **_: (dest / "pkg-1.0.tar.gz").write_text(""),
+    )
+    builder = ScriptEnvBuilder(config)
+    builder.package_cache_path.mkdir()
+
+    with pytest.raises(PipError):
+        builder.lock_pinned([PipfileEntry("pkg", "==1.0", hashes=("sha256:0",))])
+
+    assert not (builder.locks_path / lock_key(["pkg==1.0"])).exists()
+
+
+def test_lock_pinned_disable_lockfile(config: Config, mocker: MockerFixture) -> None:
+    find_mock = mocker.patch("scriptenv.pip.find")
+    builder = ScriptEnvBuilder(replace(config, use_lockfile=False))
+
+    builder.lock_pinned([PipfileEntry("pkg", "==1.0")])
+
+    find_mock.assert_not_called()
+
+
+def test_build_layer(config: Config, mocker: MockerFixture) -> None:
+    builder = ScriptEnvBuilder(config)
+    lock_mock = mocker.patch.object(builder, "lock")
+    lock_mock.return_value = Lockfile({"pkg1": LockedPackage()})
+    mocker.patch.object(builder, "install_packages")
+    base = ScriptEnv(builder.install_path, ["pkg0"])
+
+    layer = builder.build(["requirement"], base=base)
+
+    lock_mock.assert_called_once_with(["requirement"], ["pkg0"])
+    assert layer.packages == ["pkg1"]
+    assert layer.base is base
+    assert layer.bin_path == builder.link_binaries(["pkg1"])
+
+
+def test_build_async(config: Config, mocker: MockerFixture) -> None:
+    builder = ScriptEnvBuilder(config)
+    threads = []
+    build_mock = mocker.patch.object(builder, "build")
+    build_mock.side_effect = lambda requirements: threads.append(threading.get_ident())
+
+    env = asyncio.run(builder.build_async(iter(["requirement"])))
+
+    assert env is None
+    build_mock.assert_called_once_with(["requirement"])
+    assert threading.get_ident() not in threads
+
+
+def test_build_with_import_index(config: Config, mocker: MockerFixture) -> None:
+    builder = ScriptEnvBuilder(replace(config, use_import_index=True))
+    mocker.patch.object(builder, "lock").return_value = Lockfile(
+        {"pkg": LockedPackage()}
+    )
+    mocker.patch.object(builder, "install_packages")
+    index_mock = mocker.patch.object(builder, "import_index")
+    index_mock.return_value = {"module": ["pkg"]}
+    scriptenv_mock = mocker.patch("scriptenv.builder.ScriptEnv")
+
+    builder.build(["requirement"])
+
+    index_mock.assert_called_once_with(["requirement"], {"pkg"}, [])
+    scriptenv_mock.assert_called_once_with(
+        builder.install_path,
+        {"pkg"},
+        index={"module": ["pkg"]},
+        bin_path=builder.link_binaries({"pkg"}),
+        base=None,
+        archive=None,
+        config=builder._config,  # pylint: disable=protected-access
+    )
+
+
+def _binary(config: Config, package: str, name: str) -> Path:
+    path = config.cache_path / "install" / package / "bin" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(package)
+    return path
+
+
+def test_link_binaries(config: Config) -> None:
+    _binary(config, "pkg0", "shared")
+    _binary(config, "pkg1", "shared")
+    _binary(config, "pkg1", "tool")
+    (config.cache_path / "install" / "pkg1" / "bin" / "__pycache__").mkdir()
+    (config.cache_path / "install" / "no_binaries").mkdir()
+
+    builder = ScriptEnvBuilder(config)
+    bin_path = builder.link_binaries(["pkg1", "no_binaries", "pkg0"])
+
+    assert bin_path.parent == builder.bin_path
+    assert sorted(path.name for path in bin_path.iterdir()) == ["shared", "tool"]
+    assert (bin_path / "shared").resolve() == _binary(config, "pkg0", "shared")
+    assert (bin_path / "tool").is_symlink()
+    assert [path.name for path in builder.bin_path.iterdir()] == [bin_path.name]
+
+
+def test_link_binaries_once(config: Config, mocker: MockerFixture) -> None:
+    _binary(config, "pkg", "tool")
+    builder = ScriptEnvBuilder(config)
+    bin_path = builder.link_binaries(["pkg"])
+    mkdtemp_spy = mocker.spy(tempfile, "mkdtemp")
+
+    assert builder.link_binaries(["pkg"]) == bin_path
+    assert mkdtemp_spy.call_count == 0
+    assert builder.link_binaries(["pkg", "other"]) != bin_path
+    assert mkdtemp_spy.call_count == 1
+
+
+def test_link_binaries_created_concurrently(
+    config: Config, mocker: MockerFixture
+) -> None:
+    _binary(config, "pkg", "tool")
+    builder = ScriptEnvBuilder(config)
+    link_mock = mocker.patch("pathlib.Path.symlink_to")
+    link_mock.side_effect = lambda source: (
+        builder.bin_path / packages_key(["pkg"]) / "concurrent"
+    ).mkdir(parents=True)
+
+    bin_path = builder.link_binaries(["pkg"])
+
+    assert [path.name for path in bin_path.iterdir()] == ["concurrent"]
+    assert [path.name for path in builder.bin_path.iterdir()] == [bin_path.name]
+
+
+def test_link_binaries_copies_without_symlinks(
+    config: Config, mocker: MockerFixture
+) -> None:
+    _binary(config, "pkg", "tool").chmod(0o755)
+    mocker.patch("pathlib.Path.symlink_to", side_effect=OSError)
+
+    bin_path = ScriptEnvBuilder(config).link_binaries(["pkg"])
 
-    fetch_mock.assert_called_once_with(requirements)
-    install_mock.assert_called_once_with(packages)
+    assert not (bin_path / "tool").is_symlink()
+    assert (bin_path / "tool").read_text() == "pkg"
+    assert os.access(bin_path / "tool", os.X_OK)
@@ -0,0 +1,64 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import importlib.util
+import subprocess
+from pathlib import Path
+from typing import List
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv import bytecode
+
+
+@pytest.fixture
+def packages(tmp_path: Path) -> List[Path]:
+    paths = [tmp_path / "pkg0", tmp_path / "pkg1"]
+    for path in paths:
+        (path / path.name).mkdir(parents=True)
+        (path / path.name / "__init__.py").write_text("value = 1")
+    (paths[1] / "invalid.py").write_text("invalid syntax")
+    return paths
+
+
+def _pyc(path: Path) -> Path:
+    return Path(importlib.util.cache_from_source(str(path)))
+
+
+def _pyc_flags(path: Path) -> int:
+    return int.from_bytes(_pyc(path).read_bytes()[4:8], "little")
+
+
+def test_compile_packages(packages: List[Path]) -> None:
+    bytecode.compile_packages(packages, workers=2)
+
+    for path in packages:
+        assert _pyc_flags(path / path.name / "__init__.py") == 0
+        assert (path / bytecode.CompiledMarker).is_file()
+    assert not _pyc(packages[1] / "invalid.py").exists()
+
+
+def test_compile_packages_unchecked_hash(packages: List[Path]) -> None:
+    bytecode.compile_packages(packages, workers=1, unchecked_hash=True)
+
+    assert _pyc_flags(packages[0] / "pkg0" / "__init__.py") == 0b01
+
+
+def test_compile_packages_once(packages: List[Path], mocker: MockerFixture) -> None:
+    run_mock = mocker.patch("subprocess.run", wraps=subprocess.run)
+
+    bytecode.compile_packages(packages[:1], workers=1)
+    bytecode.compile_packages(packages, workers=1)
+    bytecode.compile_packages(packages, workers=1)
+
+    assert run_mock.call_count == 2
+    assert run_mock.call_args[0][0][-1:] == [str(packages[1])]
+
+
+def test_compile_packages_read_only(
+    packages: List[Path], mocker: MockerFixture
+) -> None:
+    mocker.patch("pathlib.Path.touch", side_effect=PermissionError)
+
+    bytecode.compile_packages(packages, workers=1)
+
+    assert not (packages[0] / bytecode.CompiledMarker).exists()
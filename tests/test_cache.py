@@ -0,0 +1,259 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterable
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv import cache, lockfile, store
+from scriptenv.builder import ScriptEnvBuilder
+from scriptenv.config import Config
+from scriptenv.lock import packages_key
+from scriptenv.lockfile import LockedPackage, Lockfile
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> Config:
+    return Config(cache_path=tmp_path / "base")
+
+
+@pytest.fixture
+def builder(config: Config) -> ScriptEnvBuilder:
+    return ScriptEnvBuilder(config)
+
+
+def _old(path: Path, age: float = cache.GracePeriod + 1) -> Path:
+    os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+
+def _lock(
+    builder: ScriptEnvBuilder,
+    name: str,
+    packages: Iterable[str],
+    age: float,
+    version: int = lockfile.LockfileVersion,
+) -> Path:
+    lock = builder.locks_path / name
+    if version == 1:
+        lock.write_text(json.dumps(list(packages)))
+    else:
+        lock.write_text(
+            lockfile.dumps(Lockfile(dict.fromkeys(packages, LockedPackage())))
+        )
+    (builder.locks_path / f"{name}.index").write_text("{}")
+    _old(builder.link_binaries(packages))
+    return _old(lock, age)
+
+
+def _package(builder: ScriptEnvBuilder, name: str, size: int) -> None:
+    (builder.install_path / name).mkdir(parents=True)
+    (builder.install_path / name / "module.py").write_text(name)
+    builder.package_cache_path.mkdir(exist_ok=True)
+    (builder.package_cache_path / name).write_bytes(b"0" * size)
+    store.link_tree(builder.install_path / name, builder.store_path)
+    _old(builder.install_path / name)
+    _old(builder.package_cache_path / name)
+
+
+@pytest.fixture
+def locks(builder: ScriptEnvBuilder) -> None:
+    _package(builder, "shared", 100)
+    _package(builder, "new", 100)
+    _package(builder, "old", 100)
+    _lock(builder, "new-lock", ["shared", "new"], age=cache.GracePeriod + 10)
+    _lock(
+        builder, "old-lock", ["shared", "old"], age=cache.GracePeriod + 100, version=1
+    )
+
+
+def _entries(builder: ScriptEnvBuilder) -> Iterable[str]:
+    return {
+        path.relative_to(builder.locks_path.parent).as_posix()
+        for base in [builder.locks_path, builder.install_path]
+        for path in base.iterdir()
+    } | {path.name for path in builder.package_cache_path.iterdir()}
+
+
+def test_gc_without_budget(
+    config: Config, builder: ScriptEnvBuilder, locks: None
+) -> None:
+    assert not cache.collect_garbage(config)
+
+
+def test_gc_max_age(config: Config, builder: ScriptEnvBuilder, locks: None) -> None:
+    removed = cache.collect_garbage(config, max_age=cache.GracePeriod + 50)
+
+    assert set(removed) == {
+        builder.locks_path / "old-lock",
+        builder.locks_path / "old-lock.index",
+        builder.install_path / "old",
+        builder.package_cache_path / "old",
+        builder.bin_path / packages_key(["shared", "old"]),
+    }
+    assert _entries(builder) == {
+        "locks/new-lock",
+        "locks/new-lock.index",
+        "install/shared",
+        "install/new",
+        "shared",
+        "new",
+    }
+    assert not (builder.locks_path.parent / "trash").exists()
+    assert list(builder.bin_path.iterdir()) == [
+        builder.link_binaries(["shared", "new"])
+    ]
+
+
+def test_gc_removes_mutexes_of_removed_entries(
+    config: Config, builder: ScriptEnvBuilder, locks: None
+) -> None:
+    for name in ["old-lock", "old-lock.zip", "old", "new-lock", "new", "shared"]:
+        with builder.mutex(name):
+            pass
+    with builder.mutex("old-lock"):
+        (builder.locks_path / "old-lock.zip").write_text("")
+
+    cache.collect_garbage(config, max_age=cache.GracePeriod + 50)
+
+    assert sorted(path.name for path in builder.mutex_path.iterdir()) == [
+        "new-lock.lock",
+        "new.lock",
+        "shared.lock",
+    ]
+
+
+def test_gc_keeps_mutexes_of_recent_packages(
+    config: Config, builder: ScriptEnvBuilder
+) -> None:
+    (builder.install_path / "in-progress").mkdir(parents=True)
+    with builder.mutex("in-progress"):
+        pass
+
+    cache.collect_garbage(config)
+
+    assert (builder.mutex_path / "in-progress.lock").exists()
+
+
+def test_gc_max_size(config: Config, builder: ScriptEnvBuilder, locks: None) -> None:
+
+    cache.collect_garbage(config, max_size=400)
+    assert (builder.install_path / "old").exists()
+
+    cache.collect_garbage(config, max_size=250)
+    assert not (builder.install_path / "old").exists()
+    assert (builder.install_path / "new").exists()
+
+    cache.collect_garbage(config, max_size=0)
+    assert not list(builder.install_path.iterdir())
+
+
+def test_gc_removes_unlinked_store_files(
+    config: Config, builder: ScriptEnvBuilder, locks: None
+) -> None:
+    cache.collect_garbage(config, max_age=cache.GracePeriod + 50)
+
+    stored = [path.read_text() for path in builder.store_path.glob("*/*")]
+    assert sorted(stored) == ["new", "shared"]
+
+
+def test_gc_keeps_recent_unreferenced_entries(
+    config: Config, builder: ScriptEnvBuilder
+) -> None:
+    _package(builder, "unreferenced", 1)
+    _package(builder, "in-progress", 1)
+    os.utime(builder.install_path / "in-progress")
+    (builder.install_path / "install-only").mkdir()
+    _old(builder.install_path / "install-only")
+
+    removed = cache.collect_garbage(config)
+
+    assert builder.install_path / "unreferenced" in removed
+    assert builder.install_path / "install-only" in removed
+    assert (builder.install_path / "in-progress").exists()
+
+
+def test_gc_ignores_invalid_locks(config: Config, builder: ScriptEnvBuilder) -> None:
+    (builder.locks_path / "invalid").write_text("invalid")
+    (builder.locks_path / "incomplete").write_text('{"version": 2}')
+    (builder.locks_path / "newer").write_text('{"version": 3, "packages": {}}')
+
+    assert not cache.collect_garbage(config)
+
+
+def test_gc_ignores_concurrently_removed_entries(
+    config: Config, builder: ScriptEnvBuilder, locks: None, mocker: MockerFixture
+) -> None:
+    (builder.store_path / "00").mkdir()
+    (builder.store_path / "00" / "removed").symlink_to("missing")
+    mocker.patch("os.replace", side_effect=FileNotFoundError)
+
+    cache.collect_garbage(config, max_age=0)
+
+    assert (builder.install_path / "old").exists()
+
+
+def test_gc_keeps_locks_used_concurrently(
+    config: Config, builder: ScriptEnvBuilder, locks: None, mocker: MockerFixture
+) -> None:
+    mutex_mock = mocker.patch.object(ScriptEnvBuilder, "mutex")
+    mutex_mock.return_value.__enter__.side_effect = lambda: os.utime(
+        builder.locks_path / "old-lock"
+    )
+
+    assert not cache.collect_garbage(config, max_age=cache.GracePeriod + 50)
+    assert (builder.install_path / "old").exists()
+
+
+def test_gc_keeps_recent_unreferenced_bin_paths(
+    config: Config, builder: ScriptEnvBuilder
+) -> None:
+    bin_path = builder.link_binaries(["unreferenced"])
+
+    assert not cache.collect_garbage(config)
+    assert bin_path.exists()
+
+
+def test_gc_keeps_locks_used_within_grace_period(
+    config: Config, builder: ScriptEnvBuilder
+) -> None:
+    _package(builder, "recent", 100)
+    _lock(builder, "recent-lock", ["recent"], age=0)
+
+    assert not cache.collect_garbage(config, max_size=0)
+
+
+def _use_while_removing(mocker: MockerFixture, used: Path) -> None:
+    replace = os.replace
+
+    def use_and_replace(path: Path, dest: Path) -> None:
+        if path == used:
+            os.utime(path)
+        replace(path, dest)
+
+    mocker.patch("os.replace", side_effect=use_and_replace)
+
+
+def test_gc_restores_locks_used_while_removing(
+    config: Config, builder: ScriptEnvBuilder, locks: None, mocker: MockerFixture
+) -> None:
+    _use_while_removing(mocker, builder.locks_path / "old-lock")
+
+    assert not cache.collect_garbage(config, max_age=cache.GracePeriod + 50)
+    assert (builder.locks_path / "old-lock").is_file()
+    assert (builder.locks_path / "old-lock.index").is_file()
+
+
+def test_gc_restores_packages_used_while_removing(
+    config: Config, builder: ScriptEnvBuilder, locks: None, mocker: MockerFixture
+) -> None:
+    _use_while_removing(mocker, builder.install_path / "old")
+
+    removed = cache.collect_garbage(config, max_age=cache.GracePeriod + 50)
+
+    assert builder.locks_path / "old-lock" in removed
+    assert builder.install_path / "old" not in removed
+    assert (builder.install_path / "old" / "module.py").is_file()
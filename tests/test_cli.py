@@ -1,12 +1,20 @@
 # pylint: disable=missing-module-docstring,missing-function-docstring,redefined-outer-name,unused-argument
 
+import socket
+import subprocess
+import sys
+from pathlib import Path
 from subprocess import CompletedProcess
+from typing import List
 from unittest.mock import Mock, call
 
 import pytest
 from pytest_mock import MockerFixture
 
 from scriptenv import cli
+from scriptenv.pack import Archive
+from scriptenv.pip import PipError
+from scriptenv.prefetch import Prefetched
 
 
 @pytest.fixture(autouse=True)
@@ -76,3 +84,131 @@ def test_main_without_args() -> None:
     with pytest.raises(SystemExit) as exc_info:
         cli.main([])
     assert exc_info.value.code == 0
+
+
+def test_cache_gc(mocker: MockerFixture, capsys: pytest.CaptureFixture[str]) -> None:
+    gc_mock = mocker.patch("scriptenv.cache.collect_garbage")
+    gc_mock.return_value = [Path("removed")]
+
+    assert cli.cache_gc(max_size=1, max_age=2) == 0
+    cli.cache_gc(max_size=None, max_age=None)
+
+    gc_mock.assert_has_calls(
+        [
+            call(max_size=1, max_age=2 * 86400),
+            call(max_size=None, max_age=None),
+        ]
+    )
+    assert capsys.readouterr().out == f"removed {Path('removed')}\n" * 2
+
+
+@pytest.mark.parametrize(
+    "args, max_size, max_age",
+    [
+        ([], None, None),
+        (["--max-size", "10"], 10, None),
+        (["--max-size", "1.5k", "--max-age", "7"], 1536, 7.0),
+        (["--max-size", "2M"], 2 * 1024 ** 2, None),
+        (["--max-size", "1g"], 1024 ** 3, None),
+    ],
+)
+def test_main_cache_gc_parser(
+    mocker: MockerFixture, args: List[str], max_size: int, max_age: float
+) -> None:
+    cache_gc_mock = mocker.patch.object(cli, "cache_gc")
+
+    cli.main(["cache", "gc", *args])
+    cache_gc_mock.assert_called_with(max_size=max_size, max_age=max_age)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires Unix sockets")
+def test_serve(mocker: MockerFixture) -> None:
+    serve_mock = mocker.patch("scriptenv.daemon.serve")
+
+    assert cli.serve() == 0
+    serve_mock.assert_called_once_with()
+
+
+def test_serve_without_unix_sockets(
+    monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    monkeypatch.delattr(socket, "AF_UNIX", raising=False)
+
+    assert cli.serve() == 1
+    assert "Unix sockets" in capsys.readouterr().err
+
+
+def test_import_without_unix_sockets() -> None:
+    # subprocess.run is mocked in these tests
+    with subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import socket, sys\n"
+            "if hasattr(socket, 'AF_UNIX'): del socket.AF_UNIX\n"
+            "import scriptenv.cli\n"
+            "sys.exit(scriptenv.cli.main(['daemon']))",
+        ],
+        stderr=subprocess.PIPE,
+    ) as process:
+        assert process.wait(timeout=30) == 1
+
+
+def test_main_daemon_parser(mocker: MockerFixture) -> None:
+    serve_mock = mocker.patch.object(cli, "serve")
+
+    cli.main(["daemon"])
+    serve_mock.assert_called_once_with()
+
+
+def test_prefetch_scripts(
+    mocker: MockerFixture, capsys: pytest.CaptureFixture[str]
+) -> None:
+    prefetch_mock = mocker.patch("scriptenv.prefetch.prefetch")
+    prefetch_mock.return_value = Prefetched([["pkg0"], ["pkg0", "pkg1"]], [])
+
+    assert cli.prefetch_scripts([Path("scripts")]) == 0
+
+    prefetch_mock.assert_called_once_with([Path("scripts")])
+    assert capsys.readouterr().out == "prefetched pkg0\nprefetched pkg0 pkg1\n"
+
+
+def test_prefetch_scripts_failed(
+    mocker: MockerFixture, capsys: pytest.CaptureFixture[str]
+) -> None:
+    prefetch_mock = mocker.patch("scriptenv.prefetch.prefetch")
+    prefetch_mock.return_value = Prefetched(
+        [["pkg0"]], [(["pkg1", "pkg2"], PipError(1, "pkg1"))]
+    )
+
+    assert cli.prefetch_scripts([Path("scripts")]) == 1
+
+    captured = capsys.readouterr()
+    assert captured.out == "prefetched pkg0\n"
+    assert captured.err == "failed pkg1 pkg2: PipError(1, 'pkg1')\n"
+
+
+def test_main_prefetch_parser(mocker: MockerFixture) -> None:
+    prefetch_mock = mocker.patch.object(cli, "prefetch_scripts")
+
+    cli.main(["prefetch", "script.py", "scripts"])
+    prefetch_mock.assert_called_once_with([Path("script.py"), Path("scripts")])
+
+
+def test_pack(mocker: MockerFixture, capsys: pytest.CaptureFixture[str]) -> None:
+    builder_mock = mocker.patch("scriptenv.cli.ScriptEnvBuilder")
+    builder_mock.return_value.pack.return_value = Archive(
+        Path("archive.zip"), ("pkg0", "pkg1")
+    )
+
+    assert cli.pack(["requirement"]) == 0
+
+    builder_mock.return_value.pack.assert_called_once_with(["requirement"])
+    assert capsys.readouterr().out == f"packed pkg0 pkg1 into {Path('archive.zip')}\n"
+
+
+def test_main_pack_parser(mocker: MockerFixture) -> None:
+    pack_mock = mocker.patch.object(cli, "pack")
+
+    cli.main(["pack", "requirement0", "requirement1"])
+    pack_mock.assert_called_once_with(["requirement0", "requirement1"])
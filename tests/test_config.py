@@ -16,17 +16,44 @@ def test_defaults() -> None:
     assert Config() == Config(
         cache_path=Path(appdirs.user_cache_dir("scriptenv")),
         use_lockfile=True,
+        use_import_index=False,
+        use_metadata_resolution=False,
+        use_offline_resolution=False,
+        use_file_store=True,
+        use_precompilation=True,
+        use_unchecked_pycs=False,
+        install_workers=os.cpu_count() or 1,
+        download_workers=8,
     )
 
 
 def test_environ_overrides(mocker: MockFixture) -> None:
     mocker.patch.dict(
         os.environ,
-        dict(SCRIPTENV_CACHE_PATH="/custom/path", SCRIPTENV_USE_LOCKFILE="false"),
+        dict(
+            SCRIPTENV_CACHE_PATH="/custom/path",
+            SCRIPTENV_USE_LOCKFILE="false",
+            SCRIPTENV_USE_IMPORT_INDEX="true",
+            SCRIPTENV_USE_METADATA_RESOLUTION="true",
+            SCRIPTENV_USE_OFFLINE_RESOLUTION="true",
+            SCRIPTENV_USE_FILE_STORE="false",
+            SCRIPTENV_USE_PRECOMPILATION="false",
+            SCRIPTENV_USE_UNCHECKED_PYCS="true",
+            SCRIPTENV_INSTALL_WORKERS="2",
+            SCRIPTENV_DOWNLOAD_WORKERS="3",
+        ),
     )
     assert Config() == Config(
         cache_path=Path("/custom/path"),
         use_lockfile=False,
+        use_import_index=True,
+        use_metadata_resolution=True,
+        use_offline_resolution=True,
+        use_file_store=False,
+        use_precompilation=False,
+        use_unchecked_pycs=True,
+        install_workers=2,
+        download_workers=3,
     )
 
 
@@ -0,0 +1,188 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import sys
+import threading
+from dataclasses import replace
+from pathlib import Path
+from typing import Generator
+from unittest.mock import Mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv import client
+from scriptenv.config import Config
+from scriptenv.lock import interpreter_tag
+from scriptenv.pack import Archive
+from scriptenv.pip import PipError
+from scriptenv.scriptenv import ScriptEnv
+
+if sys.platform == "win32":  # pragma: no cover
+    pytest.skip("requires Unix sockets", allow_module_level=True)
+
+# the daemon can only be imported on platforms supporting Unix sockets
+from scriptenv import daemon  # pylint: disable=wrong-import-position
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> Config:
+    return Config(cache_path=tmp_path / "base")
+
+
+@pytest.fixture
+def build(mocker: MockerFixture, config: Config) -> Mock:
+    mock = mocker.patch("scriptenv.daemon.ScriptEnvBuilder.build")
+    mock.return_value = ScriptEnv(
+        config.cache_path / "install", ["pkg"], index={"module": ["pkg"]}
+    )
+    return mock
+
+
+@pytest.fixture
+def server(config: Config) -> Generator[daemon.Server, None, None]:
+    with daemon.Server(config) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield server
+        server.shutdown()
+        thread.join()
+
+
+def test_build_by_daemon(config: Config, build: Mock, server: daemon.Server) -> None:
+    env = client.build(iter(["requirement"]), config)
+
+    assert env is not None
+    assert env.packages_path == config.cache_path / "install"
+    assert env.packages == ["pkg"]
+    assert env.index == {"module": ["pkg"]}
+    assert env.archive is None
+    assert env.config == config
+    build.assert_called_once_with(["requirement"])
+
+
+def test_build_packed_by_daemon(
+    config: Config, build: Mock, server: daemon.Server
+) -> None:
+    build.return_value = ScriptEnv(
+        config.cache_path / "install",
+        ["pkg"],
+        archive=Archive(config.cache_path / "archive.zip", ("pkg",)),
+    )
+
+    env = client.build(["requirement"], config)
+
+    assert env is not None
+    assert env.archive == Archive(config.cache_path / "archive.zip", ("pkg",))
+
+
+def test_build_by_daemon_with_client_config(
+    config: Config, mocker: MockerFixture, server: daemon.Server
+) -> None:
+    builder_mock = mocker.patch("scriptenv.daemon.ScriptEnvBuilder")
+    builder_mock.return_value.build.return_value = ScriptEnv(Path(), [])
+
+    client.build([], replace(config, install_workers=3))
+
+    builder_mock.assert_called_once_with(replace(config, install_workers=3))
+
+
+def test_build_by_daemon_error(
+    config: Config, build: Mock, server: daemon.Server
+) -> None:
+    build.side_effect = PipError(2, "pkg")
+
+    assert client.build(["requirement"], config) is None
+
+
+def test_build_without_daemon(config: Config) -> None:
+    assert client.build(["requirement"], config) is None
+
+
+def test_build_with_failing_daemon(
+    config: Config, build: Mock, server: daemon.Server
+) -> None:
+    build.side_effect = RuntimeError()
+
+    assert client.build(["requirement"], config) is None
+
+
+def test_server_replies_to_unexpected_errors(
+    config: Config, build: Mock, server: daemon.Server
+) -> None:
+    build.side_effect = RuntimeError("failed")
+    request = dict(
+        interpreter=interpreter_tag(),
+        pip_configuration=client.pip_configuration(),
+        config={},
+        requirements=[],
+    )
+
+    assert server.build(request) == dict(fallback="RuntimeError('failed')")
+    del request["config"]
+    assert server.build(request) == dict(fallback="KeyError('config')")
+
+
+def test_build_by_daemon_on_other_interpreter(
+    config: Config, build: Mock, server: daemon.Server, mocker: MockerFixture
+) -> None:
+    mocker.patch("scriptenv.client.interpreter_tag", return_value="other")
+
+    assert client.build(["requirement"], config) is None
+    build.assert_not_called()
+
+
+def test_build_by_daemon_with_other_pip_configuration(
+    config: Config, build: Mock, server: daemon.Server, mocker: MockerFixture
+) -> None:
+    mocker.patch(
+        "scriptenv.client.pip_configuration",
+        return_value=dict(environ=dict(PIP_INDEX_URL="other"), prefix=sys.prefix),
+    )
+
+    assert client.build(["requirement"], config) is None
+    build.assert_not_called()
+
+
+def test_pip_configuration(mocker: MockerFixture) -> None:
+    mocker.patch(
+        "os.environ",
+        dict(PIP_INDEX_URL="index", https_proxy="proxy", HOME="home", OTHER="other"),
+    )
+
+    assert client.pip_configuration() == dict(
+        environ=dict(PIP_INDEX_URL="index", https_proxy="proxy", HOME="home"),
+        prefix=sys.prefix,
+    )
+
+
+def test_build_with_hanging_daemon(
+    config: Config, build: Mock, server: daemon.Server, mocker: MockerFixture
+) -> None:
+    mocker.patch("scriptenv.client.RequestTimeout", 0.1)
+    release = threading.Event()
+    build.side_effect = lambda requirements: release.wait()
+
+    try:
+        assert client.build(["requirement"], config) is None
+    finally:
+        release.set()
+
+
+def test_server_replaces_stale_socket(config: Config) -> None:
+    client.socket_path(config).parent.mkdir(parents=True)
+    client.socket_path(config).write_text("")
+
+    with daemon.Server(config):
+        assert client.socket_path(config).is_socket()
+    assert not client.socket_path(config).exists()
+
+
+def test_serve(config: Config, mocker: MockerFixture) -> None:
+    serve_forever_mock = mocker.patch.object(daemon.Server, "serve_forever")
+    serve_forever_mock.side_effect = KeyboardInterrupt
+    keep_session_mock = mocker.patch("scriptenv.pip.keep_session")
+
+    daemon.serve(config)
+
+    serve_forever_mock.assert_called_once()
+    keep_session_mock.assert_called_once_with()
+    assert not client.socket_path(config).exists()
@@ -0,0 +1,101 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import sys
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv.finder import IndexFinder, build_index
+
+
+def test_build_index(tmp_path: Path) -> None:
+    (tmp_path / "pkg0" / "package" / "sub").mkdir(parents=True)
+    (tmp_path / "pkg0" / "package" / "__init__.py").touch()
+    (tmp_path / "pkg0" / "module.py").touch()
+    (tmp_path / "pkg0" / "pkg0-0.1.0.dist-info").mkdir()
+    (tmp_path / "pkg0" / "bin").mkdir()
+    (tmp_path / "pkg0" / "__pycache__").mkdir()
+    (tmp_path / "pkg0" / "README.txt").touch()
+    (tmp_path / "pkg1" / "namespace").mkdir(parents=True)
+    (tmp_path / "pkg1" / f"extension{_extension_suffix()}").touch()
+    (tmp_path / "pkg2" / "namespace").mkdir(parents=True)
+
+    assert build_index(tmp_path, ["pkg0", "pkg1", "pkg2"]) == {
+        "package": ["pkg0"],
+        "module": ["pkg0"],
+        "extension": ["pkg1"],
+        "namespace": ["pkg1", "pkg2"],
+    }
+
+
+def test_find_spec(tmp_path: Path) -> None:
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "module.py").touch()
+
+    finder = IndexFinder(tmp_path, {"module": ["pkg"]})
+    spec = finder.find_spec("module", None)
+
+    assert spec is not None
+    assert spec.origin == str(tmp_path / "pkg" / "module.py")
+
+
+def test_find_spec_namespace_package(tmp_path: Path) -> None:
+    (tmp_path / "pkg0" / "namespace").mkdir(parents=True)
+    (tmp_path / "pkg1" / "namespace").mkdir(parents=True)
+
+    finder = IndexFinder(tmp_path, {"namespace": ["pkg0", "pkg1"]})
+    spec = finder.find_spec("namespace", None)
+
+    assert spec is not None
+    assert list(spec.submodule_search_locations or []) == [
+        str(tmp_path / "pkg0" / "namespace"),
+        str(tmp_path / "pkg1" / "namespace"),
+    ]
+
+
+def test_find_spec_unknown_module(tmp_path: Path) -> None:
+    finder = IndexFinder(tmp_path, {})
+    assert finder.find_spec("unknown", None) is None
+
+
+def test_find_spec_ignores_submodules(tmp_path: Path) -> None:
+    finder = IndexFinder(tmp_path, {"module": ["pkg"]})
+    assert finder.find_spec("module", [str(tmp_path)]) is None
+
+
+def test_import(tmp_path: Path) -> None:
+    (tmp_path / "pkg" / "indexed_package").mkdir(parents=True)
+    (tmp_path / "pkg" / "indexed_package" / "__init__.py").touch()
+    (tmp_path / "pkg" / "indexed_package" / "sub.py").write_text("value = 1")
+
+    sys.meta_path.insert(0, IndexFinder(tmp_path, {"indexed_package": ["pkg"]}))
+
+    assert __import__("indexed_package.sub").sub.value == 1
+
+
+def _distribution(path: Path, name: str) -> None:
+    (path / f"{name}-1.0.dist-info").mkdir(parents=True)
+    (path / f"{name}-1.0.dist-info" / "METADATA").write_text(
+        f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n"
+    )
+
+
+def test_find_distributions(tmp_path: Path, mocker: MockerFixture) -> None:
+    metadata = pytest.importorskip("importlib.metadata")
+    _distribution(tmp_path / "pkg0", "indexed_dist")
+    _distribution(tmp_path / "pkg1", "metadata_only_dist")
+    mocker.patch(
+        "sys.meta_path",
+        [IndexFinder(tmp_path, {"module": ["pkg0"]}, ["pkg1"]), *sys.meta_path],
+    )
+
+    assert metadata.version("indexed_dist") == "1.0"
+    assert metadata.version("metadata_only_dist") == "1.0"
+    assert {
+        dist.metadata["Name"]
+        for dist in IndexFinder(tmp_path, {"module": ["pkg0"]}).find_distributions()
+    } == {"indexed_dist"}
+
+
+def _extension_suffix() -> str:
+    return ".pyd" if sys.platform == "win32" else ".so"
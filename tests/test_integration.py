@@ -1,13 +1,22 @@
 # pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import asyncio
+import json
 import os
+import shutil
 import subprocess
 import sys
+import threading
 from pathlib import Path
+from typing import Tuple
 
 import pytest
+from pytest_mock import MockerFixture
 
 import scriptenv
-from testlibs.mockpi import MockPI, Package
+from scriptenv import cache, lockfile, pip, prefetch
+from scriptenv.builder import ScriptEnvBuilder
+from scriptenv.config import Config
+from testlibs.mockpi import DistType, MockPI, Package
 
 
 @pytest.fixture
@@ -17,12 +26,191 @@ def default_pkg(mockpi: MockPI) -> Package:
     return package
 
 
+@pytest.fixture
+def paused_pip(mocker: MockerFixture) -> Tuple[threading.Event, threading.Event]:
+    paused, resumed = threading.Event(), threading.Event()
+    keep_session = pip._keep_session  # pylint: disable=protected-access
+
+    def pause_before_keep_session(command: object) -> None:
+        paused.set()
+        resumed.wait(timeout=30)
+        keep_session(command)
+
+    mocker.patch("scriptenv.pip._keep_session", pause_before_keep_session)
+    return paused, resumed
+
+
 def test_install_package(default_pkg: Package) -> None:
     scriptenv.requires(default_pkg.name)
 
     __import__(default_pkg.name)
 
 
+def test_install_package_with_import_index(default_pkg: Package) -> None:
+    os.environ["SCRIPTENV_USE_IMPORT_INDEX"] = "true"
+
+    env = scriptenv.requires(default_pkg.name)
+    __import__(default_pkg.name)
+    metadata = pytest.importorskip("importlib.metadata")
+    assert metadata.version(default_pkg.name) == default_pkg.version
+
+    env.disable()
+    with pytest.raises(ModuleNotFoundError):
+        __import__(default_pkg.name)
+
+
+def test_install_package_with_metadata_resolution(mockpi: MockPI) -> None:
+    os.environ["SCRIPTENV_USE_METADATA_RESOLUTION"] = "true"
+    dep = Package(name="dep", dist_type=DistType.WHEEL)
+    mockpi.add(dep)
+    mockpi.add(Package(name="pkg", dependencies=[dep], dist_type=DistType.WHEEL))
+
+    scriptenv.requires("pkg")
+
+    __import__("pkg")
+    __import__("dep")
+
+
+def test_reinstall_from_lockfile_urls(mockpi: MockPI) -> None:
+    os.environ["SCRIPTENV_USE_METADATA_RESOLUTION"] = "true"
+    dep = Package(name="dep", dist_type=DistType.WHEEL)
+    mockpi.add(dep)
+    mockpi.add(Package(name="pkg", dependencies=[dep], dist_type=DistType.WHEEL))
+    scriptenv.requires("pkg").disable()
+    builder = ScriptEnvBuilder()
+    lock = lockfile.read(next(builder.locks_path.iterdir()))
+    shutil.rmtree(builder.install_path)
+    shutil.rmtree(builder.package_cache_path)
+    scriptenv.invalidate()
+    mockpi.requests.clear()
+
+    scriptenv.requires("pkg")
+
+    __import__("dep")
+    assert lock.packages["pkg-0.1.0-py3-none-any.whl"].dependencies == (
+        "dep-0.1.0-py3-none-any.whl",
+    )
+    assert sorted(mockpi.requests) == [
+        "/dep/dep-0.1.0-py3-none-any.whl",
+        "/pkg/pkg-0.1.0-py3-none-any.whl",
+    ]
+
+
+def test_requires_with_lockfile_of_unsupported_version(default_pkg: Package) -> None:
+    scriptenv.requires(default_pkg.name).disable()
+    builder = ScriptEnvBuilder()
+    lockfile_path = next(builder.locks_path.iterdir())
+    lockfile_path.write_text('{"version": 3}')
+    shutil.rmtree(builder.install_path)
+    scriptenv.invalidate()
+
+    scriptenv.requires(default_pkg.name)
+
+    __import__(default_pkg.name)
+    assert lockfile_path.read_text() == '{"version": 3}'
+
+
+@pytest.mark.parametrize(
+    "dist_type, offline", [(DistType.WHEEL, True), (DistType.TAR, False)]
+)
+def test_install_package_with_offline_resolution(
+    mockpi: MockPI, dist_type: DistType, offline: bool
+) -> None:
+    os.environ["SCRIPTENV_USE_OFFLINE_RESOLUTION"] = "true"
+    mockpi.add(Package(name="pkg", dist_type=dist_type))
+    scriptenv.requires("pkg")
+    shutil.rmtree(ScriptEnvBuilder().locks_path)
+    scriptenv.invalidate()
+    mockpi.requests.clear()
+
+    scriptenv.requires("pkg")
+
+    __import__("pkg")
+    assert bool(mockpi.requests) is not offline
+
+
+def test_repeated_requires(default_pkg: Package) -> None:
+    env = scriptenv.requires(default_pkg.name)
+    module = __import__(default_pkg.name)
+    assert scriptenv.requires(default_pkg.name) is env
+    assert __import__(default_pkg.name) is module
+
+    scriptenv.invalidate(default_pkg.name)
+    assert scriptenv.requires(default_pkg.name) is not env
+
+
+def test_requires_async(mockpi: MockPI) -> None:
+    mockpi.add(Package(name="pkg0"))
+    mockpi.add(Package(name="pkg1"))
+
+    async def requires_concurrently() -> None:
+        await asyncio.gather(
+            scriptenv.requires_async("pkg0"), scriptenv.requires_async("pkg1")
+        )
+
+    asyncio.run(requires_concurrently())
+
+    __import__("pkg0")
+    __import__("pkg1")
+
+
+def test_print_while_requires_async(
+    default_pkg: Package,
+    paused_pip: Tuple[threading.Event, threading.Event],
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    paused, resumed = paused_pip
+
+    async def print_while_requires() -> None:
+        requires = asyncio.ensure_future(scriptenv.requires_async(default_pkg.name))
+        await asyncio.get_running_loop().run_in_executor(None, paused.wait, 30)
+        print("printed while building")
+        resumed.set()
+        await requires
+
+    asyncio.run(print_while_requires())
+
+    assert capsys.readouterr().out == "printed while building\n"
+
+
+def test_requires_in_background(default_pkg: Package) -> None:
+    scriptenv.requires(default_pkg.name, background=True)
+
+    __import__(default_pkg.name)
+
+
+def test_print_while_requires_in_background(
+    default_pkg: Package,
+    paused_pip: Tuple[threading.Event, threading.Event],
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    paused, resumed = paused_pip
+    scriptenv.requires(default_pkg.name, background=True)
+    assert paused.wait(timeout=30)
+
+    print("printed while building")
+    resumed.set()
+    __import__(default_pkg.name)
+
+    assert capsys.readouterr().out == "printed while building\n"
+
+
+def test_add_layer(mockpi: MockPI) -> None:
+    mockpi.add(Package(name="dep", version="0.1.0"))
+    mockpi.add(Package(name="pkg0", dependencies=[Package(name="dep")]))
+    mockpi.add(Package(name="dep", version="0.2.0"))
+    mockpi.add(Package(name="pkg1", dependencies=[Package(name="dep")]))
+    env = scriptenv.requires("pkg0", "dep==0.1.0")
+
+    layer = env.add("pkg1")
+
+    assert layer.packages == ["pkg1-0.1.0.tar.gz"]
+    assert __import__("pkg1") and __import__("dep").__version__ == "0.1.0"
+    layer.disable()
+    with pytest.raises(ModuleNotFoundError):
+        __import__("pkg1")
+
+
 def test_as_contextmanager(default_pkg: Package) -> None:
     with scriptenv.requires(default_pkg.name):
         __import__(default_pkg.name)
@@ -47,6 +235,22 @@ def test_forward_to_subprocess(default_pkg: Package) -> None:
     )
 
 
+def test_warm_path_does_not_import_pip(default_pkg: Package) -> None:
+    scriptenv.requires(default_pkg.name).disable()
+
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, scriptenv;"
+            f"scriptenv.requires('{default_pkg.name}');"
+            f"import {default_pkg.name};"
+            "assert 'pip' not in sys.modules, 'pip got imported'",
+        ],
+        check=True,
+    )
+
+
 def test_from_pipfile_lock(tmp_path: Path, mockpi: MockPI) -> None:
     mockpi.add(Package(name="pkg"))
 
@@ -61,6 +265,42 @@ def test_from_pipfile_lock(tmp_path: Path, mockpi: MockPI) -> None:
     __import__("pkg")
 
 
+def test_from_hash_pinned_pipfile_lock(
+    tmp_path: Path, mockpi: MockPI, mocker: MockerFixture
+) -> None:
+    mockpi.add(Package(name="pkg", dist_type=DistType.WHEEL))
+    mockpi.add(Package(name="dep"))
+    sha256 = pip.file_hash(tmp_path / "mockpi/packages/dep/dep-0.1.0.tar.gz")
+    (tmp_path / "Pipfile.lock").write_text(
+        json.dumps(
+            {
+                "default": {
+                    "pkg": {"version": "==0.1.0"},
+                    "dep": {"version": "==0.1.0", "hashes": [f"sha256:{sha256}"]},
+                    "skipped": {"version": "==0.1.0", "markers": "python_version<'3'"},
+                },
+            }
+        )
+    )
+    mocker.patch("scriptenv.pip.download", side_effect=AssertionError("resolved"))
+    mocker.patch("scriptenv.pip.resolve", side_effect=AssertionError("resolved"))
+
+    scriptenv.from_pipfile_lock(tmp_path)
+
+    __import__("pkg")
+    __import__("dep")
+
+
+def test_import_from_packed_env(default_pkg: Package) -> None:
+    archive = ScriptEnvBuilder().pack([default_pkg.name])
+    scriptenv.invalidate()
+
+    scriptenv.requires(default_pkg.name)
+
+    module = __import__(default_pkg.name)
+    assert str(module.__file__).startswith(str(archive.path))
+
+
 def test_forward_binaries_to_subprocesses(mockpi: MockPI) -> None:
     package = Package(entry_points=dict(main="pass"))
     mockpi.add(package)
@@ -81,3 +321,64 @@ def test_cli_run(mockpi: MockPI, tmp_path: Path) -> None:
         check=False,
     )
     assert process.returncode == distinct_error_code
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires Unix sockets")
+def test_requires_by_daemon(default_pkg: Package, mocker: MockerFixture) -> None:
+    # the daemon can only be imported on platforms supporting Unix sockets
+    from scriptenv import daemon  # pylint: disable=import-outside-toplevel
+
+    build = mocker.spy(daemon.Server, "build")
+    with daemon.Server(Config()) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            scriptenv.requires(default_pkg.name)
+        finally:
+            server.shutdown()
+            thread.join()
+
+    __import__(default_pkg.name)
+    build.assert_called_once()
+
+
+def test_gc_keeps_recently_built_env(default_pkg: Package) -> None:
+    scriptenv.requires(default_pkg.name).disable()
+    for path in ScriptEnvBuilder().locks_path.parent.glob("*/*"):
+        os.utime(path, (0, 0))
+    scriptenv.invalidate()
+    scriptenv.requires(default_pkg.name)
+
+    assert not cache.collect_garbage(max_size=0)
+    __import__(default_pkg.name)
+
+
+def test_prefetch(mockpi: MockPI, tmp_path: Path, mocker: MockerFixture) -> None:
+    mockpi.add(Package(name="pkg0"))
+    mockpi.add(Package(name="pkg1"))
+    script = tmp_path / "script.py"
+    script.write_text("import scriptenv\nscriptenv.requires('pkg0', 'pkg1')")
+
+    prefetch.prefetch([script])
+    install = mocker.patch("scriptenv.pip.install")
+    scriptenv.requires("pkg0", "pkg1")
+
+    __import__("pkg0")
+    __import__("pkg1")
+    install.assert_not_called()
+
+
+def test_prefetch_hash_mismatch(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="pkg"))
+    (tmp_path / "Pipfile.lock").write_text(
+        json.dumps({"default": {"pkg": {"version": "==0.1.0", "hashes": ["sha256:0"]}}})
+    )
+    script = tmp_path / "script.py"
+    script.write_text("import scriptenv\nscriptenv.from_pipfile_lock('Pipfile.lock')")
+
+    (requirements, error), *_ = prefetch.prefetch([script]).failed
+
+    assert requirements == ["pkg==0.1.0"]
+    assert isinstance(error, pip.PipError)
+
+    assert not list(ScriptEnvBuilder().locks_path.glob("*"))
@@ -0,0 +1,237 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import importlib
+import os
+import sys
+import threading
+from pathlib import Path
+from subprocess import PIPE, run
+from typing import Callable, Generator, List
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv.config import Config
+from scriptenv.lazy import LazyScriptEnv
+from scriptenv.scriptenv import ScriptEnv
+
+
+@pytest.fixture(autouse=True)
+def isolated_runtime(mocker: MockerFixture) -> Generator[None, None, None]:
+    mocker.patch("sys.path", list(sys.path))
+    mocker.patch("os.environ", dict(os.environ))
+    yield
+    sys.modules.pop("lazy_module", None)
+
+
+@pytest.fixture
+def env(tmp_path: Path) -> ScriptEnv:
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "lazy_module.py").write_text("value = 1")
+    return ScriptEnv(
+        tmp_path, ["pkg"], bin_path=tmp_path / "bin", config=Config(cache_path=tmp_path)
+    )
+
+
+@pytest.fixture
+def built() -> threading.Event:
+    return threading.Event()
+
+
+@pytest.fixture
+def build(env: ScriptEnv, built: threading.Event) -> Callable[[], ScriptEnv]:
+    def build() -> ScriptEnv:
+        built.wait(timeout=30)
+        return env
+
+    return build
+
+
+def test_import_waits_for_build(
+    build: Callable[[], ScriptEnv], built: threading.Event, env: ScriptEnv
+) -> None:
+    meta_path = list(sys.meta_path)
+    lazy_env = LazyScriptEnv(build, ["lazy_module"])
+    lazy_env.enable()
+    assert sys.meta_path[:-1] == meta_path
+    assert str(env.packages_path / "pkg") not in sys.path
+
+    threading.Timer(0.2, built.set).start()
+    assert importlib.import_module("lazy_module").__file__ == str(
+        env.packages_path / "pkg" / "lazy_module.py"
+    )
+
+    assert str(env.packages_path / "pkg") in sys.path
+    assert lazy_env.packages == ["pkg"]
+    assert lazy_env.bin_path == env.bin_path
+    assert os.environ["PATH"].startswith(str(env.bin_path))
+
+
+def test_import_while_build_imports(
+    env: ScriptEnv, built: threading.Event, tmp_path: Path
+) -> None:
+    (tmp_path / "build_module.py").write_text("value = 2")
+    sys.path.append(str(tmp_path))
+
+    def build() -> ScriptEnv:
+        built.wait(timeout=30)
+        importlib.import_module("build_module")
+        return env
+
+    LazyScriptEnv(build, ["lazy_module"]).enable()
+    threading.Timer(0.2, built.set).start()
+    try:
+        assert getattr(importlib.import_module("lazy_module"), "value") == 1
+    finally:
+        sys.modules.pop("build_module", None)
+
+
+def test_find_spec_while_building(
+    build: Callable[[], ScriptEnv], built: threading.Event
+) -> None:
+    LazyScriptEnv(build, ["lazy_module"]).enable()
+
+    spec = importlib.util.find_spec("lazy_module")
+
+    assert spec is not None and spec.origin is None
+    built.set()
+
+
+def test_find_spec_of_unknown_module_while_building(
+    build: Callable[[], ScriptEnv], built: threading.Event
+) -> None:
+    LazyScriptEnv(build, ["lazy_module"]).enable()
+
+    assert importlib.util.find_spec("unknown_module") is None
+    built.set()
+
+
+def test_find_spec_when_built(
+    build: Callable[[], ScriptEnv], built: threading.Event, env: ScriptEnv
+) -> None:
+    LazyScriptEnv(build).enable()
+    built.set()
+    for thread in threading.enumerate():
+        if thread.name == "scriptenv-build":
+            thread.join(timeout=30)
+
+    spec = importlib.util.find_spec("lazy_module")
+
+    assert spec is not None
+    assert spec.origin == str(env.packages_path / "pkg" / "lazy_module.py")
+
+
+def _run_with_unfinished_build(code: str) -> str:
+    # a subprocess without coverage, which imports optional modules
+    return run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, threading\n"
+            "from scriptenv.lazy import LazyScriptEnv\n"
+            "env = LazyScriptEnv(threading.Event().wait)\n"
+            "env.enable()\n"
+            f"{code}\n",
+        ],
+        env={
+            name: value
+            for name, value in os.environ.items()
+            if not name.startswith("COV_")
+        },
+        stdout=PIPE,
+        text=True,
+        timeout=30,
+        check=True,
+    ).stdout
+
+
+def test_import_without_wait() -> None:
+    assert (
+        _run_with_unfinished_build(
+            "import colorsys\n"
+            "meta_path = list(sys.meta_path)\n"
+            "env.disable()\n"
+            "print(len(meta_path) - len(sys.meta_path))"
+        )
+        == "1\n"
+    )
+
+
+def test_import_in_build_thread(
+    build: Callable[[], ScriptEnv], built: threading.Event
+) -> None:
+    imported: List[bool] = []
+
+    def import_module() -> None:
+        imported.append(importlib.util.find_spec("lazy_module") is None)
+
+    LazyScriptEnv(build).enable()
+    thread = threading.Thread(target=import_module, name="scriptenv-install_0")
+    thread.start()
+    thread.join(timeout=30)
+
+    assert imported == [True]
+    built.set()
+
+
+def test_import_submodules_without_wait() -> None:
+    assert (
+        _run_with_unfinished_build(
+            "try:\n"
+            "    import email.missing\n"
+            "except ImportError:\n"
+            "    print('not found')"
+        )
+        == "not found\n"
+    )
+
+
+def test_import_error_from_build() -> None:
+    def build() -> ScriptEnv:
+        raise RuntimeError("build failed")
+
+    LazyScriptEnv(build, ["lazy_module"]).enable()
+    with pytest.raises(RuntimeError, match="build failed"):
+        importlib.import_module("lazy_module")
+
+
+def test_enable_when_built(env: ScriptEnv) -> None:
+    meta_path = list(sys.meta_path)
+    lazy_env = LazyScriptEnv(lambda: env)
+    lazy_env.wait()
+
+    with lazy_env:
+        assert sys.meta_path == meta_path
+        assert importlib.import_module("lazy_module").__file__ == str(
+            env.packages_path / "pkg" / "lazy_module.py"
+        )
+    assert str(env.packages_path / "pkg") not in sys.path
+
+
+def test_wait_takes_over_once(
+    build: Callable[[], ScriptEnv], built: threading.Event, env: ScriptEnv
+) -> None:
+    lazy_env = LazyScriptEnv(build)
+    built.set()
+
+    lazy_env.wait()
+    lazy_env.wait()
+
+    assert lazy_env.packages == ["pkg"]
+    assert lazy_env.config == env.config
+    assert str(lazy_env.packages_path / "pkg") not in sys.path
+
+
+def test_add_waits_for_build(
+    build: Callable[[], ScriptEnv],
+    built: threading.Event,
+    env: ScriptEnv,
+    mocker: MockerFixture,
+) -> None:
+    lazy_env = LazyScriptEnv(build)
+    build_mock = mocker.patch("scriptenv.builder.ScriptEnvBuilder.build")
+    build_mock.return_value = ScriptEnv(env.packages_path, [])
+
+    threading.Timer(0.2, built.set).start()
+    lazy_env.add("requirement")
+
+    assert build_mock.call_args.kwargs["base"].packages == ["pkg"]
@@ -0,0 +1,100 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import sys
+import sysconfig
+from typing import Optional
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv import lock
+
+
+@pytest.mark.parametrize(
+    "requirement, canonical",
+    [
+        ("pkg", "pkg"),
+        ("Foo_Bar.baz", "foo-bar-baz"),
+        ("foo == 1", "foo==1"),
+        ("Foo==1.0RC1", "foo==1.0rc1"),
+        ("foo>=1, <2", "foo<2,>=1"),
+        ("foo [Extra_B, extra-a] >=1", "foo[extra-a,extra-b]>=1"),
+        ("foo[]", "foo"),
+        ("foo @ https://host/foo.whl", "foo @ https://host/foo.whl"),
+        ("foo==1; python_version >= '3'", "foo==1"),
+        ("./local/path ", "./local/path"),
+        ("Local/Path", "Local/Path"),
+        ("foo@  https://host/Foo.whl", "foo @ https://host/Foo.whl"),
+        ("git+https://host/Org/Repo@Branch", "git+https://host/Org/Repo@Branch"),
+        ("https://host/Foo-1.0.tar.gz", "https://host/Foo-1.0.tar.gz"),
+    ],
+)
+def test_canonicalize(requirement: str, canonical: str) -> None:
+    assert lock.canonicalize(requirement) == canonical
+
+
+def test_canonicalize_not_matching_marker() -> None:
+    assert lock.canonicalize("foo; python_version < '3'") is None
+
+
+def test_lock_key_equivalent_requirements() -> None:
+    assert lock.lock_key(["a", "b"]) == lock.lock_key(["b", "a"])
+    assert lock.lock_key(["Foo==1"]) == lock.lock_key(["foo == 1"])
+    assert lock.lock_key(["a", "a"]) == lock.lock_key(["a"])
+    assert lock.lock_key(["a", "b; python_version < '3'"]) == lock.lock_key(["a"])
+
+
+def test_lock_key_different_requirements() -> None:
+    assert lock.lock_key(["a"]) != lock.lock_key(["b"])
+    assert lock.lock_key(["a==1"]) != lock.lock_key(["a==2"])
+    assert lock.lock_key(["git+https://host/Org/Repo"]) != lock.lock_key(
+        ["git+https://host/org/repo"]
+    )
+    assert lock.lock_key(["foo @ https://host/Foo.whl"]) != lock.lock_key(
+        ["foo @ https://host/foo.whl"]
+    )
+
+
+def test_lock_key_depends_on_interpreter(mocker: MockerFixture) -> None:
+    key = lock.lock_key(["a"])
+    mocker.patch.object(lock, "interpreter_tag").return_value = "other-interpreter"
+    assert lock.lock_key(["a"]) != key
+
+
+def test_interpreter_tag() -> None:
+    assert lock.interpreter_tag() == (
+        f"{sys.implementation.cache_tag}-{sysconfig.get_platform()}"
+    )
+
+
+def test_packages_key() -> None:
+    assert lock.packages_key(["pkg0", "pkg1"]) == lock.packages_key(
+        iter(["pkg1", "pkg0", "pkg1"])
+    )
+    assert lock.packages_key(["pkg0"]) != lock.packages_key(["pkg0", "pkg1"])
+
+
+@pytest.mark.parametrize(
+    "package, pin",
+    [
+        ("pkg-1.0-py3-none-any.whl", "pkg==1.0"),
+        ("Pkg_Name-1.0.post1-1-cp310-cp310-linux_x86_64.whl", "pkg-name==1.0.post1"),
+        ("pkg-name-1.0.tar.gz", "pkg-name==1.0"),
+        ("pkg-1.0.zip", "pkg==1.0"),
+    ],
+)
+def test_package_pin(package: str, pin: str) -> None:
+    assert lock.package_pin(package) == pin
+    assert lock.package_name(package) == pin.split("==")[0]
+
+
+@pytest.mark.parametrize(
+    "requirement, module",
+    [
+        ("pkg", "pkg"),
+        ("Pkg.Name[extra]>=1.0", "pkg_name"),
+        ("pkg-name @ https://host/Pkg.whl", "pkg_name"),
+        ("@", None),
+    ],
+)
+def test_module_name(requirement: str, module: Optional[str]) -> None:
+    assert lock.module_name(requirement) == module
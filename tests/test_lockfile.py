@@ -0,0 +1,115 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import hashlib
+import json
+from pathlib import Path
+
+import pytest
+
+from scriptenv import lockfile
+from scriptenv.lockfile import LockedPackage, Lockfile
+
+
+def _installed(path: Path, *requires: str) -> None:
+    dist_info = path / "pkg-1.0.dist-info"
+    dist_info.mkdir(parents=True)
+    (dist_info / "METADATA").write_text(
+        "Metadata-Version: 2.1\nName: pkg\nVersion: 1.0\n"
+        + "".join(f"Requires-Dist: {requirement}\n" for requirement in requires)
+    )
+
+
+def test_read_version_1(tmp_path: Path) -> None:
+    (tmp_path / "lock").write_text('["pkg0", "pkg1"]')
+
+    assert lockfile.read(tmp_path / "lock") == Lockfile(
+        {"pkg0": LockedPackage(), "pkg1": LockedPackage()}, version=1
+    )
+
+
+@pytest.mark.parametrize("content", ['{"version": 3}', '{"packages": {}}'])
+def test_read_unsupported_version(tmp_path: Path, content: str) -> None:
+    (tmp_path / "lock").write_text(content)
+
+    with pytest.raises(ValueError, match="unsupported version"):
+        lockfile.read(tmp_path / "lock")
+
+
+def test_dumps_and_read(tmp_path: Path) -> None:
+    lock = Lockfile(
+        {
+            "pkg1": LockedPackage(),
+            "pkg0": LockedPackage(
+                sha256="hash", size=1, url="url", dependencies=("pkg1",)
+            ),
+        },
+        state="compiled",
+    )
+
+    (tmp_path / "lock").write_text(lockfile.dumps(lock))
+
+    assert lockfile.read(tmp_path / "lock") == lock
+    assert list(json.loads(lockfile.dumps(lock))["packages"]) == ["pkg0", "pkg1"]
+
+
+def test_source() -> None:
+    assert LockedPackage().source is None
+    assert LockedPackage(url="url").source == "url"
+    assert LockedPackage(sha256="hash").source is None
+    assert LockedPackage(sha256="hash", url="url").source == "url#sha256=hash"
+
+
+@pytest.mark.parametrize(
+    "state, reached",
+    [("resolved", True), ("installed", True), ("compiled", False)],
+)
+def test_reached(state: str, reached: bool) -> None:
+    assert Lockfile({}, state="installed").reached(state) is reached
+
+
+def test_lock_packages(tmp_path: Path) -> None:
+    (tmp_path / "pkg0").write_bytes(b"pkg0")
+
+    assert lockfile.lock_packages(
+        tmp_path, {"pkg0": "url/pkg0#sha256=hash", "missing": "url/missing"}
+    ) == {
+        "pkg0": LockedPackage(
+            sha256=hashlib.sha256(b"pkg0").hexdigest(), size=4, url="url/pkg0"
+        ),
+        "missing": LockedPackage(url="url/missing"),
+    }
+
+
+def test_advance(tmp_path: Path) -> None:
+    (tmp_path / "cache").mkdir()
+    (tmp_path / "cache" / "dep-1.0.tar.gz").write_bytes(b"dep")
+    _installed(
+        tmp_path / "install" / "pkg-1.0-py3-none-any.whl",
+        "Dep>=1.0",
+        "base; python_version < '3'",
+        "unlocked",
+    )
+    locked = LockedPackage(sha256="hash", size=1, url="url")
+    lock = Lockfile(
+        {"pkg-1.0-py3-none-any.whl": locked, "dep-1.0.tar.gz": LockedPackage()},
+        version=1,
+    )
+
+    advanced = lockfile.advance(
+        lock,
+        "installed",
+        tmp_path / "cache",
+        tmp_path / "install",
+        ["base-2.0-py3-none-any.whl"],
+    )
+
+    assert advanced == Lockfile(
+        {
+            "pkg-1.0-py3-none-any.whl": locked._replace(
+                dependencies=("base-2.0-py3-none-any.whl", "dep-1.0.tar.gz")
+            ),
+            "dep-1.0.tar.gz": LockedPackage(
+                sha256=hashlib.sha256(b"dep").hexdigest(), size=3
+            ),
+        },
+        state="installed",
+    )
@@ -0,0 +1,128 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv import locking
+from scriptenv.locking import file_lock, remove_file_lock
+
+
+def test_file_lock_blocks_other_processes(tmp_path: Path) -> None:
+    lock_path = tmp_path / "mutex" / "entry.lock"
+    with file_lock(lock_path):
+        process = subprocess.Popen(  # pylint: disable=consider-using-with
+            [
+                sys.executable,
+                "-c",
+                "import sys; from pathlib import Path;"
+                "from scriptenv.locking import file_lock;"
+                "file_lock(Path(sys.argv[1])).__enter__();"
+                "print('locked')",
+                str(lock_path),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        time.sleep(1)
+        assert process.poll() is None
+
+    assert process.communicate(timeout=30)[0] == "locked\n"
+
+
+def test_file_lock_released_on_error(tmp_path: Path) -> None:
+    lock_path = tmp_path / "entry.lock"
+    try:
+        with file_lock(lock_path):
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+
+    with file_lock(lock_path):
+        assert lock_path.is_file()
+
+
+def test_file_lock_blocks_other_threads(tmp_path: Path) -> None:
+    events = []
+
+    def lock() -> None:
+        with file_lock(tmp_path / "entry.lock"):
+            events.append("locked")
+
+    with file_lock(tmp_path / "entry.lock"):
+        thread = threading.Thread(target=lock)
+        thread.start()
+        time.sleep(0.5)
+        events.append("released")
+    thread.join()
+
+    assert events == ["released", "locked"]
+
+
+def test_remove_file_lock(tmp_path: Path) -> None:
+    lock_path = tmp_path / "entry.lock"
+    remove_file_lock(lock_path)
+    assert not lock_path.exists()
+
+    with file_lock(lock_path):
+        pass
+    remove_file_lock(lock_path)
+    assert not lock_path.exists()
+
+
+def test_remove_file_lock_waits_until_released(tmp_path: Path) -> None:
+    lock_path = tmp_path / "entry.lock"
+    events = []
+
+    def remove() -> None:
+        remove_file_lock(lock_path)
+        events.append("removed")
+
+    with file_lock(lock_path):
+        thread = threading.Thread(target=remove)
+        thread.start()
+        time.sleep(0.5)
+        events.append("released")
+    thread.join()
+
+    assert events == ["released", "removed"]
+    assert not lock_path.exists()
+
+
+def test_file_lock_locks_again_after_removal(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    is_file_at = mocker.patch.object(locking, "_is_file_at", side_effect=[False, True])
+    lock_file = mocker.spy(locking, "_lock_file")
+
+    with file_lock(tmp_path / "entry.lock"):
+        assert lock_file.call_count == 2
+    assert is_file_at.call_count == 2
+
+
+def test_removed_lock_file_is_not_locked_anymore(tmp_path: Path) -> None:
+    lock_path = tmp_path / "entry.lock"
+    with file_lock(lock_path):
+        descriptor = os.open(lock_path, os.O_RDONLY)
+        lock_path.unlink()
+    try:
+        assert not locking._is_file_at(  # pylint: disable=protected-access
+            descriptor, lock_path
+        )
+    finally:
+        os.close(descriptor)
+
+
+def test_file_lock_error_while_locking(tmp_path: Path, mocker: MockerFixture) -> None:
+    close = mocker.spy(os, "close")
+    mocker.patch.object(locking, "_lock", side_effect=OSError())
+
+    with pytest.raises(OSError):
+        with file_lock(tmp_path / "entry.lock"):
+            pass
+    close.assert_called_once()
@@ -0,0 +1,126 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import importlib
+import importlib.machinery
+import sys
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv import pack
+from scriptenv.bytecode import CompiledMarker
+from scriptenv.pack import Archive
+
+
+def _package(install_path: Path, package: str, files: Dict[str, str]) -> None:
+    for name, content in files.items():
+        (install_path / package / name).parent.mkdir(parents=True, exist_ok=True)
+        (install_path / package / name).write_text(content)
+
+
+def _namelist(archive: Path) -> List[str]:
+    with zipfile.ZipFile(archive) as opened:
+        return opened.namelist()
+
+
+def _read(archive: Path, name: str) -> bytes:
+    with zipfile.ZipFile(archive) as opened:
+        return opened.read(name)
+
+
+def test_pack(tmp_path: Path) -> None:
+    _package(
+        tmp_path / "install",
+        "pkg",
+        {
+            "packedmodule/__init__.py": "VALUE = 'packed'",
+            "packedmodule/__pycache__/__init__.cpython.pyc": "",
+            "packednamespace/module.py": "",
+            "pkg.dist-info/METADATA": "",
+            "bin/binary": "",
+            CompiledMarker: "",
+        },
+    )
+
+    archive = pack.pack(tmp_path / "install", ["pkg"], tmp_path / "archive.zip")
+
+    assert archive == Archive(tmp_path / "archive.zip", ("pkg",))
+    assert _namelist(archive.path) == [
+        "packedmodule/",
+        "packednamespace/",
+        "pkg.dist-info/",
+        "packedmodule/__init__.py",
+        "packedmodule/__init__.pyc",
+        "packednamespace/module.py",
+        "packednamespace/module.pyc",
+        "pkg.dist-info/METADATA",
+    ]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "archive.zip",
+        "install",
+    ]
+
+
+def test_pack_importable(tmp_path: Path, mocker: MockerFixture) -> None:
+    _package(
+        tmp_path / "install",
+        "pkg",
+        {
+            "packedmodule/__init__.py": "VALUE = 'packed'",
+            "packednamespace/module.py": "VALUE = 'namespace'",
+        },
+    )
+    archive = pack.pack(tmp_path / "install", ["pkg"], tmp_path / "archive.zip")
+    mocker.patch("sys.path", [str(archive.path), *sys.path])
+    mocker.patch.dict("sys.modules")
+
+    module = importlib.import_module("packedmodule")
+
+    assert getattr(module, "VALUE") == "packed"
+    assert module.__file__ == str(archive.path / "packedmodule" / "__init__.pyc")
+    namespace_module = importlib.import_module("packednamespace.module")
+    assert getattr(namespace_module, "VALUE") == "namespace"
+
+
+def test_pack_skips_packages_with_extensions(tmp_path: Path) -> None:
+    suffix = importlib.machinery.EXTENSION_SUFFIXES[0]
+    _package(tmp_path / "install", "pkg", {"module.py": ""})
+    _package(tmp_path / "install", "native", {f"native/module{suffix}": ""})
+
+    archive = pack.pack(
+        tmp_path / "install", ["pkg", "native"], tmp_path / "archive.zip"
+    )
+
+    assert archive.packages == ("pkg",)
+    assert _namelist(archive.path) == ["module.py", "module.pyc"]
+
+
+def test_pack_first_package_wins(tmp_path: Path) -> None:
+    _package(tmp_path / "install", "pkg0", {"module.py": "VALUE = 0"})
+    _package(tmp_path / "install", "pkg1", {"module.py": "VALUE = 1"})
+
+    archive = pack.pack(tmp_path / "install", ["pkg1", "pkg0"], tmp_path / "a.zip")
+
+    assert _read(archive.path, "module.py") == b"VALUE = 0"
+
+
+def test_pack_keeps_invalid_modules_as_source(tmp_path: Path) -> None:
+    _package(tmp_path / "install", "pkg", {"module.py": "print 'python2'"})
+
+    archive = pack.pack(tmp_path / "install", ["pkg"], tmp_path / "archive.zip")
+
+    assert _namelist(archive.path) == ["module.py"]
+
+
+def test_pack_error_removes_temporary_archive(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    _package(tmp_path / "install", "pkg", {"module.py": ""})
+    mocker.patch("os.replace", side_effect=OSError())
+
+    with pytest.raises(OSError):
+        pack.pack(tmp_path / "install", ["pkg"], tmp_path / "archive.zip")
+
+    assert [path.name for path in tmp_path.iterdir()] == ["install"]
@@ -1,14 +1,26 @@
 # pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import csv
+import hashlib
 import os
+import subprocess
+import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest.mock import patch
 
 import pytest
+from pytest_mock import MockerFixture
 
 from scriptenv import pip
 from scriptenv.pip import _pip as pip_exec
 from testlibs.mockpi import DistType, MockPI, Package
 
+metadata_resolution = pytest.mark.skipif(
+    not pip.supports_metadata_resolution(),
+    reason="pip can not resolve by metadata files only",
+)
+
 
 @pytest.mark.parametrize("dist_type", list(DistType))
 def test_download_packages(dist_type: DistType, mockpi: MockPI, tmp_path: Path) -> None:
@@ -22,6 +34,21 @@ def test_download_packages(dist_type: DistType, mockpi: MockPI, tmp_path: Path)
         assert (tmp_path / pkg_name).is_file()
 
 
+def test_download_concurrently(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="pkg0"))
+    mockpi.add(Package(name="pkg1"))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        downloads = executor.map(
+            lambda name: pip.download([name], tmp_path / name), ["pkg0", "pkg1"]
+        )
+
+    assert [sorted(names) for names in downloads] == [
+        ["pkg0-0.1.0.tar.gz"],
+        ["pkg1-0.1.0.tar.gz"],
+    ]
+
+
 def test_download_dependencies(mockpi: MockPI, tmp_path: Path) -> None:
     dep = Package(name="dep")
     mockpi.add(dep)
@@ -38,6 +65,321 @@ def test_download_cached(mockpi: MockPI, tmp_path: Path) -> None:
     assert pip.download(["pkg"], tmp_path / "cached") == {"pkg-0.1.0.tar.gz"}
 
 
+def test_download_with_constraints(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="dep", version="0.1.0"))
+    dep = Package(name="dep", version="0.2.0")
+    mockpi.add(dep)
+    mockpi.add(Package(name="pkg", dependencies=[dep]))
+
+    assert pip.download(["pkg"], tmp_path, ["dep==0.1.0", "other==1.0"]) == {
+        "pkg-0.1.0.tar.gz",
+        "dep-0.1.0.tar.gz",
+    }
+
+
+@metadata_resolution
+def test_resolve_with_constraints(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="dep", version="0.1.0", dist_type=DistType.WHEEL))
+    dep = Package(name="dep", version="0.2.0", dist_type=DistType.WHEEL)
+    mockpi.add(dep)
+    mockpi.add(Package(name="pkg", dependencies=[dep], dist_type=DistType.WHEEL))
+
+    assert set(pip.resolve(["pkg"], tmp_path, ["dep==0.1.0"])) == {
+        "pkg-0.1.0-py3-none-any.whl",
+        "dep-0.1.0-py3-none-any.whl",
+    }
+
+
+def test_download_offline(
+    mockpi: MockPI, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    mockpi.add(Package(name="pkg", dist_type=DistType.WHEEL))
+    pip.download(["pkg"], tmp_path / "cache")
+    mockpi.requests.clear()
+    capsys.readouterr()
+
+    assert pip.download(["pkg"], tmp_path / "dest", find_links=tmp_path / "cache") == {
+        "pkg-0.1.0-py3-none-any.whl"
+    }
+    assert (tmp_path / "dest" / "pkg-0.1.0-py3-none-any.whl").is_file()
+    with pytest.raises(pip.PipError):
+        pip.download(["missing"], tmp_path / "dest", find_links=tmp_path / "cache")
+
+    assert not mockpi.requests
+    assert not capsys.readouterr().err
+
+
+def test_download_local_project(mockpi: MockPI, tmp_path: Path) -> None:
+    dep = Package(name="dep", dist_type=DistType.WHEEL)
+    mockpi.add(dep)
+    Package(name="local", dependencies=[dep]).build(tmp_path / "local")
+
+    assert pip.download([str(tmp_path / "local" / "local_0.1.0")], tmp_path) == {
+        "dep-0.1.0-py3-none-any.whl"
+    }
+
+
+def test_download_offline_only_wheels(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="pkg"))
+    pip.download(["pkg"], tmp_path / "cache")
+
+    with pytest.raises(pip.PipError):
+        pip.download(["pkg"], tmp_path / "dest", find_links=tmp_path / "cache")
+
+
+def test_download_offline_concurrently(mockpi: MockPI, tmp_path: Path) -> None:
+    stderr = sys.stderr
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(
+            executor.map(
+                lambda index: pytest.raises(
+                    pip.PipError,
+                    pip.download,
+                    ["missing"],
+                    tmp_path / str(index),
+                    find_links=tmp_path,
+                ),
+                range(8),
+            )
+        )
+
+    assert sys.stderr is stderr
+
+
+def test_keep_session(mockpi: MockPI, tmp_path: Path, mocker: MockerFixture) -> None:
+    mockpi.add(Package(name="pkg"))
+    # pylint: disable=import-outside-toplevel
+    from pip._internal.commands import create_command
+
+    build_session = mocker.spy(type(create_command("download")), "_build_session")
+
+    with pip.keep_session():
+        pip.download(["pkg"], tmp_path / "dest0")
+        pip.download(["pkg"], tmp_path / "dest1")
+    assert build_session.call_count == 1
+
+    pip.download(["pkg"], tmp_path / "dest2")
+    assert build_session.call_count == 2
+
+
+@metadata_resolution
+def test_resolve_with_metadata(mockpi: MockPI, tmp_path: Path) -> None:
+    dep = Package(name="dep", dist_type=DistType.WHEEL)
+    mockpi.add(dep)
+    mockpi.add(Package(name="pkg", dependencies=[dep], dist_type=DistType.WHEEL))
+
+    resolved = pip.resolve(["pkg"], tmp_path / "dest")
+
+    assert set(resolved) == {
+        "pkg-0.1.0-py3-none-any.whl",
+        "dep-0.1.0-py3-none-any.whl",
+    }
+    assert resolved["pkg-0.1.0-py3-none-any.whl"].startswith(
+        f"{mockpi.url}/pkg/pkg-0.1.0-py3-none-any.whl#sha256="
+    )
+    assert not list((tmp_path / "dest").iterdir())
+    assert "/pkg/pkg-0.1.0-py3-none-any.whl.metadata" in mockpi.requests
+    assert "/pkg/pkg-0.1.0-py3-none-any.whl" not in mockpi.requests
+
+
+@metadata_resolution
+def test_resolve_concurrently(mockpi: MockPI, tmp_path: Path) -> None:
+    # pylint: disable=import-outside-toplevel
+    from pip._internal.operations.prepare import RequirementPreparer
+
+    prepare = RequirementPreparer.prepare_linked_requirements_more
+    for index in range(4):
+        mockpi.add(Package(name=f"pkg{index}", dist_type=DistType.WHEEL))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        resolved = list(
+            executor.map(
+                lambda index: pip.resolve([f"pkg{index}"], tmp_path / str(index)),
+                range(4),
+            )
+        )
+
+    assert [list(urls) for urls in resolved] == [
+        [f"pkg{index}-0.1.0-py3-none-any.whl"] for index in range(4)
+    ]
+    assert RequirementPreparer.prepare_linked_requirements_more is prepare
+
+
+@pytest.mark.parametrize(
+    "version, supported",
+    [
+        ("22.2.2", False),
+        ("22.3", True),
+        ("23.1.2", True),
+        ("23.2.1", False),
+        ("24.0", False),
+        ("24.1", True),
+    ],
+)
+def test_supports_metadata_resolution(
+    version: str, supported: bool, mocker: MockerFixture
+) -> None:
+    mocker.patch("pip.__version__", version)
+    assert pip.supports_metadata_resolution() is supported
+
+
+@metadata_resolution
+def test_resolve_without_metadata(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="pkg", dist_type=DistType.TAR))
+
+    resolved = pip.resolve(["pkg"], tmp_path / "dest")
+
+    assert set(resolved) == {"pkg-0.1.0.tar.gz"}
+    assert (tmp_path / "dest" / "pkg-0.1.0.tar.gz").is_file()
+
+
+@metadata_resolution
+def test_resolve_cached(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="pkg", dist_type=DistType.WHEEL))
+    pip.download(["pkg"], tmp_path)
+    mockpi.requests.clear()
+
+    assert set(pip.resolve(["pkg"], tmp_path)) == {"pkg-0.1.0-py3-none-any.whl"}
+    assert not [request for request in mockpi.requests if "0.1.0" in request]
+
+
+def test_fetch(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="dep", dist_type=DistType.WHEEL))
+    mockpi.add(
+        Package(
+            name="pkg", dist_type=DistType.WHEEL, dependencies=[Package(name="dep")]
+        )
+    )
+
+    pip.fetch([f"{mockpi.url}/pkg/pkg-0.1.0-py3-none-any.whl"], tmp_path / "dest")
+
+    assert [path.name for path in (tmp_path / "dest").iterdir()] == [
+        "pkg-0.1.0-py3-none-any.whl"
+    ]
+
+
+def test_fetch_nothing(tmp_path: Path) -> None:
+    pip.fetch([], tmp_path / "dest")
+    assert not (tmp_path / "dest").exists()
+
+
+@metadata_resolution
+def test_fetch_concurrently(mockpi: MockPI, tmp_path: Path) -> None:
+    for index in range(4):
+        mockpi.add(Package(name=f"pkg{index}", dist_type=DistType.WHEEL))
+    urls = pip.resolve([f"pkg{index}" for index in range(4)], tmp_path / "dest")
+    mockpi.requests.clear()
+
+    pip.fetch(urls.values(), tmp_path / "dest", workers=4)
+
+    assert sorted(path.name for path in (tmp_path / "dest").iterdir()) == sorted(urls)
+    assert len(mockpi.requests) == 4
+
+
+@metadata_resolution
+def test_fetch_skips_packages_with_matching_hash(
+    mockpi: MockPI, tmp_path: Path
+) -> None:
+    mockpi.add(Package(name="pkg0", dist_type=DistType.WHEEL))
+    mockpi.add(Package(name="pkg1", dist_type=DistType.WHEEL))
+    urls = pip.resolve(["pkg0", "pkg1"], tmp_path / "dest")
+    pip.fetch(urls.values(), tmp_path / "dest")
+    (tmp_path / "dest" / "pkg1-0.1.0-py3-none-any.whl").write_bytes(b"corrupted")
+    mockpi.requests.clear()
+
+    pip.fetch(urls.values(), tmp_path / "dest")
+
+    assert mockpi.requests == ["/pkg1/pkg1-0.1.0-py3-none-any.whl"]
+    assert (tmp_path / "dest" / "pkg1-0.1.0-py3-none-any.whl").read_bytes() != (
+        b"corrupted"
+    )
+
+
+def test_fetch_skips_existing_packages_without_hash(
+    mockpi: MockPI, tmp_path: Path
+) -> None:
+    (tmp_path / "dest").mkdir()
+    (tmp_path / "dest" / "pkg-0.1.0-py3-none-any.whl").write_bytes(b"cached")
+
+    pip.fetch([f"{mockpi.url}/pkg/pkg-0.1.0-py3-none-any.whl"], tmp_path / "dest")
+
+    assert not mockpi.requests
+
+
+def test_fetch_hash_mismatch(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="pkg", dist_type=DistType.WHEEL))
+    url = f"{mockpi.url}/pkg/pkg-0.1.0-py3-none-any.whl#sha256=invalid"
+
+    with pytest.raises(pip.PipError) as error:
+        pip.fetch([url], tmp_path / "dest")
+
+    assert error.value.package == "pkg-0.1.0-py3-none-any.whl"
+    assert not list((tmp_path / "dest").iterdir())
+
+
+def test_fetch_missing_package(mockpi: MockPI, tmp_path: Path) -> None:
+    with pytest.raises(pip.PipError) as error:
+        pip.fetch([f"{mockpi.url}/pkg/missing-0.1.0.tar.gz"], tmp_path / "dest")
+
+    assert error.value.package == "missing-0.1.0.tar.gz"
+    assert not list((tmp_path / "dest").iterdir())
+
+
+def test_find(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="pkg0", dist_type=DistType.WHEEL))
+    mockpi.add(Package(name="pkg1", dependencies=[Package(name="dep")]))
+
+    assert pip.find({"pkg0==0.1.0": [], "pkg1==0.1.0": []}, workers=2) == {
+        "pkg0-0.1.0-py3-none-any.whl": (
+            f"{mockpi.url}/pkg0/pkg0-0.1.0-py3-none-any.whl#sha256="
+            + pip.file_hash(
+                tmp_path / "mockpi/packages/pkg0/pkg0-0.1.0-py3-none-any.whl"
+            )
+        ),
+        "pkg1-0.1.0.tar.gz": (
+            f"{mockpi.url}/pkg1/pkg1-0.1.0.tar.gz#sha256="
+            + pip.file_hash(tmp_path / "mockpi/packages/pkg1/pkg1-0.1.0.tar.gz")
+        ),
+    }
+    assert not [request for request in mockpi.requests if "dep" in request]
+
+
+def test_find_by_hash(mockpi: MockPI, tmp_path: Path) -> None:
+    mockpi.add(Package(name="pkg", dist_type=DistType.WHEEL))
+    sha256 = pip.file_hash(tmp_path / "mockpi/packages/pkg/pkg-0.1.0-py3-none-any.whl")
+
+    assert list(pip.find({"pkg==0.1.0": ["md5:0", f"sha256:{sha256}"]})) == [
+        "pkg-0.1.0-py3-none-any.whl"
+    ]
+
+
+def test_find_on_index_url(mockpi: MockPI, monkeypatch: pytest.MonkeyPatch) -> None:
+    mockpi.add(Package(name="pkg", dist_type=DistType.WHEEL))
+    monkeypatch.setenv("PIP_INDEX_URL", "http://localhost:1/simple")
+
+    assert list(pip.find({"pkg==0.1.0": []}, f"{mockpi.url}")) == [
+        "pkg-0.1.0-py3-none-any.whl"
+    ]
+
+
+def test_find_missing_package(mockpi: MockPI) -> None:
+    mockpi.add(Package(name="pkg", dist_type=DistType.WHEEL))
+
+    with pytest.raises(pip.PipError) as error:
+        pip.find({"pkg==1.0.0": []})
+
+    assert error.value.package == "pkg==1.0.0"
+
+
+@pytest.mark.parametrize("content", [b"", b"content"])
+def test_file_hash(content: bytes, tmp_path: Path) -> None:
+    (tmp_path / "file").write_bytes(content)
+
+    assert pip.file_hash(tmp_path / "file") == hashlib.sha256(content).hexdigest()
+    assert pip.file_hash(tmp_path / "file", "md5") == hashlib.md5(content).hexdigest()
+
+
 @pytest.mark.parametrize("dist_type", list(DistType))
 def test_install(dist_type: DistType, tmp_path: Path) -> None:
     install_path = tmp_path / "install"
@@ -50,6 +392,112 @@ def test_install(dist_type: DistType, tmp_path: Path) -> None:
     assert (install_path / "pkg-0.1.0.dist-info").is_dir()
 
 
+def test_install_wheel_console_scripts(tmp_path: Path) -> None:
+    install_path = tmp_path / "install"
+    pkg = Package(dist_type=DistType.WHEEL, entry_points=dict(main="return 3"))
+    dist = pkg.build(tmp_path)
+
+    pip.install(dist, install_path)
+
+    process = subprocess.run(
+        [str(install_path / "bin" / "main")],
+        env={**os.environ, "PYTHONPATH": str(install_path)},
+        check=False,
+    )
+    assert process.returncode == 3
+
+
+def test_install_wheel_data(tmp_path: Path) -> None:
+    install_path = tmp_path / "install"
+    wheel = tmp_path / "pkg-0.1.0-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w") as archive:
+        archive.writestr("pkg-0.1.0.dist-info/METADATA", "Name: pkg\nVersion: 0.1.0")
+        archive.writestr("pkg-0.1.0.data/purelib/purelib.py", "")
+        archive.writestr("pkg-0.1.0.data/platlib/sub/platlib.py", "")
+        archive.writestr("pkg-0.1.0.data/data/share/data.txt", "")
+        archive.writestr("pkg-0.1.0.data/headers/header.h", "")
+        archive.writestr("pkg-0.1.0.data/scripts/script", "#!python\nexit(5)\n")
+
+    pip.install(wheel, install_path)
+
+    assert (install_path / "purelib.py").is_file()
+    assert (install_path / "sub" / "platlib.py").is_file()
+    assert (install_path / "share" / "data.txt").is_file()
+    assert (install_path / "include" / "header.h").is_file()
+    assert not (install_path / "pkg-0.1.0.data").exists()
+    process = subprocess.run([str(install_path / "bin" / "script")], check=False)
+    assert process.returncode == 5
+
+
+def test_install_wheel_preserves_executable_bit(tmp_path: Path) -> None:
+    install_path = tmp_path / "install"
+    wheel = tmp_path / "pkg-0.1.0-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w") as archive:
+        archive.writestr("pkg-0.1.0.dist-info/METADATA", "")
+        executable = zipfile.ZipInfo("pkg/executable")
+        executable.external_attr = 0o755 << 16
+        archive.writestr(executable, "")
+        archive.writestr("pkg/regular", "")
+
+    pip.install(wheel, install_path)
+
+    assert os.access(install_path / "pkg" / "executable", os.X_OK)
+    assert not os.access(install_path / "pkg" / "regular", os.X_OK)
+
+
+def test_install_wheel_record(tmp_path: Path) -> None:
+    install_path = tmp_path / "install"
+    pkg = Package(dist_type=DistType.WHEEL, entry_points=dict(main="pass"))
+    dist = pkg.build(tmp_path)
+
+    pip.install(dist, install_path)
+
+    dist_info = install_path / f"{pkg.name}-{pkg.version}.dist-info"
+    with (dist_info / "RECORD").open(encoding="utf-8") as record:
+        recorded = {row[0]: row for row in csv.reader(record)}
+    installed = {
+        path.relative_to(install_path).as_posix()
+        for path in install_path.rglob("*")
+        if path.is_file()
+    }
+    assert set(recorded) == installed
+    assert recorded["bin/main"][1].startswith("sha256=")
+    assert recorded[f"{pkg.name}.py"][2] == str(
+        (install_path / f"{pkg.name}.py").stat().st_size
+    )
+    assert (dist_info / "INSTALLER").read_text() == "scriptenv\n"
+
+
+def test_install_invalid_wheel(tmp_path: Path) -> None:
+    wheel = tmp_path / "invalid-0.1.0-py3-none-any.whl"
+    wheel.write_text("invalid")
+
+    with pytest.raises(pip.PipError) as exc_info:
+        pip.install(wheel, tmp_path / "install")
+    assert exc_info.value.package == wheel.name
+
+
+def test_install_wheel_without_dist_info(tmp_path: Path) -> None:
+    wheel = tmp_path / "invalid-0.1.0-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w") as archive:
+        archive.writestr("invalid.py", "")
+
+    with pytest.raises(pip.PipError) as exc_info:
+        pip.install(wheel, tmp_path / "install")
+    assert exc_info.value.package == wheel.name
+
+
+def test_install_wheel_with_unknown_data_scheme(tmp_path: Path) -> None:
+    wheel = tmp_path / "invalid-0.1.0-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, "w") as archive:
+        archive.writestr("invalid-0.1.0.dist-info/METADATA", "")
+        archive.writestr("invalid-0.1.0.data/unknown/file", "")
+
+    with pytest.raises(pip.PipError) as exc_info:
+        pip.install(wheel, tmp_path / "install")
+    assert exc_info.value.package == wheel.name
+
+
 def test_install_override_user(tmp_path: Path) -> None:
     install_path = tmp_path / "install"
     pkg = Package()
@@ -67,13 +515,22 @@ def test_install_wheel_with_invalid_file(tmp_path: Path) -> None:
     pip.install(dist, install_path)
 
 
+def test_install_error_names_package(tmp_path: Path) -> None:
+    package = tmp_path / "missing-0.1.0.tar.gz"
+
+    with pytest.raises(pip.PipError) as exc_info:
+        pip.install(package, tmp_path / "install")
+    assert exc_info.value.package == package.name
+    assert exc_info.value.exit_code
+
+
 def test_pip_exit_code() -> None:
     with pytest.raises(pip.PipError):
         pip_exec("cache")
 
 
 def test_stdout_supression(capsys: pytest.CaptureFixture[str]) -> None:
-    pip_exec("help")
+    pip_exec("list")
 
     out, _err = capsys.readouterr()
     assert not out
@@ -2,7 +2,11 @@
 import json
 from pathlib import Path
 
+import pytest
+
 from scriptenv import pipfile
+from scriptenv.pip import PipError
+from scriptenv.pipfile import PipfileEntry
 
 
 def test_parse_pipfile_lock(tmp_path: Path) -> None:
@@ -34,3 +38,64 @@ def test_skip_meta_section(tmp_path: Path) -> None:
     pipfile_lock.write_text(json.dumps({"_meta": {"pipfile-spec": 6}}))
 
     assert not list(pipfile.parse_pipfile_lock(pipfile_lock))
+
+
+def test_read_pipfile_lock(tmp_path: Path) -> None:
+    pipfile_lock = tmp_path / "Pipfile.lock"
+    pipfile_lock.write_text(
+        json.dumps(
+            {
+                "_meta": {
+                    "sources": [
+                        {"name": "pypi", "url": "https://pypi.org/simple/"},
+                        {"name": "mirror", "url": "https://mirror/simple"},
+                    ]
+                },
+                "default": {
+                    "pkg": {"version": "==1.0.0", "hashes": ["sha256:0"]},
+                    "mirrored": {"version": "==2.0.0", "index": "mirror"},
+                    "unknown": {"version": "==3.0.0", "index": "unknown"},
+                    "skipped": {"version": "==4.0.0", "markers": "python_version<'3'"},
+                    "matching": {"version": "==5.0.0", "markers": "python_version>'3'"},
+                },
+            }
+        )
+    )
+
+    assert pipfile.read_pipfile_lock(pipfile_lock) == [
+        PipfileEntry("pkg", "==1.0.0", hashes=("sha256:0",)),
+        PipfileEntry("mirrored", "==2.0.0", index_url="https://mirror/simple"),
+        PipfileEntry("unknown", "==3.0.0"),
+        PipfileEntry("matching", "==5.0.0", markers="python_version>'3'"),
+    ]
+
+
+def test_read_pipfile_lock_first_source(tmp_path: Path) -> None:
+    pipfile_lock = tmp_path / "Pipfile.lock"
+    pipfile_lock.write_text(
+        json.dumps(
+            {
+                "_meta": {"sources": [{"name": "mirror", "url": "https://mirror"}]},
+                "default": {"pkg": {"version": "==1.0.0"}},
+            }
+        )
+    )
+
+    assert pipfile.read_pipfile_lock(pipfile_lock) == [
+        PipfileEntry("pkg", "==1.0.0", index_url="https://mirror")
+    ]
+
+
+def test_verify_hashes() -> None:
+    entries = [
+        PipfileEntry("Pkg_Name", "==1.0.0", hashes=("sha256:0", "sha256:1")),
+        PipfileEntry("unhashed", "==1.0.0"),
+    ]
+
+    pipfile.verify_hashes(
+        entries,
+        {"pkg.name-1.0.0-py3-none-any.whl": "1", "unhashed-1.0.0.tar.gz": "2"},
+    )
+    with pytest.raises(PipError) as error:
+        pipfile.verify_hashes(entries, {"pkg_name-1.0.0.tar.gz": "2"})
+    assert error.value.package == "pkg_name-1.0.0.tar.gz"
@@ -0,0 +1,166 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import json
+from pathlib import Path
+from typing import List, Set
+from unittest.mock import call
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv.builder import ScriptEnvBuilder
+from scriptenv.config import Config
+from scriptenv.pip import PipError
+from scriptenv.pipfile import PipfileEntry
+from scriptenv.prefetch import Prefetched, discover, prefetch
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> Config:
+    return Config(cache_path=tmp_path / "base")
+
+
+@pytest.fixture
+def scripts(tmp_path: Path) -> Path:
+    path = tmp_path / "scripts"
+    path.mkdir()
+    return path
+
+
+def _script(path: Path, code: str) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(code)
+    return path
+
+
+def test_discover_requires(scripts: Path) -> None:
+    _script(
+        scripts / "script.py",
+        "import scriptenv\n"
+        "from scriptenv import requires\n"
+        "scriptenv.requires('pkg0', 'pkg1==1.0')\n"
+        "def main():\n"
+        "    requires('pkg2', background=True)\n",
+    )
+
+    assert discover([scripts / "script.py"]) == [["pkg0", "pkg1==1.0"], ["pkg2"]]
+
+
+def test_discover_in_directories(scripts: Path) -> None:
+    _script(scripts / "a.py", "requires('pkg0')")
+    _script(scripts / "sub" / "b.py", "requires('pkg1')")
+    _script(scripts / "c.txt", "requires('pkg2')")
+
+    assert discover([scripts]) == [["pkg0"], ["pkg1"]]
+
+
+def test_discover_deduplicates_requirements(scripts: Path) -> None:
+    _script(scripts / "a.py", "requires('pkg0', 'pkg1')")
+    _script(scripts / "b.py", "requires('PKG1', 'pkg0')")
+
+    assert discover([scripts]) == [["pkg0", "pkg1"]]
+
+
+def test_discover_skips_non_literal_arguments(scripts: Path) -> None:
+    _script(
+        scripts / "script.py",
+        "requires(name)\n"
+        "requires('pkg0', *names)\n"
+        "requires(1)\n"
+        "requires()\n"
+        "print('pkg1')\n"
+        "call()()\n",
+    )
+
+    assert not discover([scripts])
+
+
+def test_discover_skips_invalid_scripts(scripts: Path) -> None:
+    _script(scripts / "syntax.py", "requires('pkg0'")
+    (scripts / "null.py").write_bytes(b"requires('pkg1')\0")
+
+    assert not discover([scripts])
+
+
+def test_discover_from_pipfile_lock(scripts: Path) -> None:
+    lock = {"_meta": {}, "default": {"pkg0": {"version": "==1.0"}}}
+    (scripts / "Pipfile.lock").write_text(json.dumps(lock))
+    (scripts / "dir").mkdir()
+    (scripts / "dir" / "Pipfile.lock").write_text(json.dumps(lock))
+    _script(
+        scripts / "script.py",
+        "scriptenv.from_pipfile_lock('Pipfile.lock')\n"
+        "from_pipfile_lock(Path('dir'))\n"
+        "from_pipfile_lock(Path('missing'))\n"
+        "from_pipfile_lock(Path(base, 'dir'))\n"
+        "from_pipfile_lock(path)\n"
+        "from_pipfile_lock()\n",
+    )
+
+    assert discover([scripts / "script.py"]) == [["pkg0==1.0"]]
+
+
+def test_prefetch(config: Config, scripts: Path, mocker: MockerFixture) -> None:
+    _script(scripts / "a.py", "requires('req0')")
+    _script(scripts / "b.py", "requires('req0', 'req1')")
+    fetch_mock = mocker.patch.object(ScriptEnvBuilder, "fetch_requirements")
+    fetch_mock.side_effect = lambda requirements: {
+        f"{requirement}-pkg" for requirement in requirements
+    }
+    install_mock = mocker.patch.object(ScriptEnvBuilder, "install_packages")
+    build_mock = mocker.patch.object(ScriptEnvBuilder, "build")
+
+    assert prefetch([scripts], config) == Prefetched([["req0"], ["req0", "req1"]], [])
+
+    install_mock.assert_called_once_with({"req0-pkg", "req1-pkg"})
+    build_mock.assert_has_calls([call(["req0"]), call(["req0", "req1"])])
+
+
+def test_prefetch_locks_pipfile_lock_pinned(
+    config: Config, scripts: Path, mocker: MockerFixture
+) -> None:
+    lock = {"default": {"pkg0": {"version": "==1.0", "hashes": ["sha256:0"]}}}
+    (scripts / "Pipfile.lock").write_text(json.dumps(lock))
+    _script(scripts / "script.py", "from_pipfile_lock('Pipfile.lock')")
+    lock_pinned_mock = mocker.patch.object(ScriptEnvBuilder, "lock_pinned")
+    fetch_mock = mocker.patch.object(ScriptEnvBuilder, "fetch_requirements")
+    fetch_mock.return_value = {"pkg0-pkg"}
+    mocker.patch.object(ScriptEnvBuilder, "install_packages")
+    mocker.patch.object(ScriptEnvBuilder, "build")
+
+    assert prefetch([scripts], config) == Prefetched([["pkg0==1.0"]], [])
+
+    lock_pinned_mock.assert_called_once_with(
+        [PipfileEntry("pkg0", "==1.0", hashes=("sha256:0",))]
+    )
+    fetch_mock.assert_called_once_with(["pkg0==1.0"])
+
+
+def test_prefetch_errors(config: Config, scripts: Path, mocker: MockerFixture) -> None:
+    _script(scripts / "a.py", "requires('req0')")
+    _script(scripts / "b.py", "requires('failing_fetch')")
+    _script(scripts / "c.py", "requires('failing_build')")
+    fetch_error = PipError(1, "failing_fetch")
+    build_error = PipError(2, "failing_build")
+    fetch_mock = mocker.patch.object(ScriptEnvBuilder, "fetch_requirements")
+    fetch_mock.side_effect = lambda requirements: _raise_for(
+        requirements, "failing_fetch", fetch_error
+    )
+    install_mock = mocker.patch.object(ScriptEnvBuilder, "install_packages")
+    build_mock = mocker.patch.object(ScriptEnvBuilder, "build")
+    build_mock.side_effect = lambda requirements: _raise_for(
+        requirements, "failing_build", build_error
+    )
+
+    assert prefetch([scripts], config) == Prefetched(
+        [["req0"]], [(["failing_fetch"], fetch_error), (["failing_build"], build_error)]
+    )
+
+    install_mock.assert_called_once_with({"req0", "failing_build"})
+    build_mock.assert_has_calls([call(["req0"]), call(["failing_build"])])
+    assert build_mock.call_count == 2
+
+
+def _raise_for(requirements: List[str], failing: str, error: Exception) -> Set[str]:
+    if failing in requirements:
+        raise error
+    return set(requirements)
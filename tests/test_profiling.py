@@ -0,0 +1,63 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import json
+import os
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from scriptenv import profiling
+
+
+def test_measure(events: List[profiling.Event]) -> None:
+    with profiling.measure("phase", package="pkg") as event:
+        event["cache_hit"] = True
+
+    assert events == [event]
+    assert event["phase"] == "phase"
+    assert event["package"] == "pkg"
+    assert event["cache_hit"] is True
+    assert event["pid"] == os.getpid()
+    assert event["duration"] >= 0
+    assert event["start"] > 0
+
+
+def test_measure_error(events: List[profiling.Event]) -> None:
+    with pytest.raises(KeyError):
+        with profiling.measure("phase"):
+            raise KeyError()
+
+    assert events[0]["error"] == "KeyError"
+
+
+def test_remove_hook(events: List[profiling.Event]) -> None:
+    profiling.remove_hook(events.append)
+    profiling.add_hook(events.append)
+
+    with profiling.measure("phase"):
+        pass
+
+    assert len(events) == 1
+
+
+def test_profile_file(tmp_path: Path) -> None:
+    os.environ[profiling.ProfileEnvName] = str(tmp_path / "profile.jsonl")
+
+    with profiling.measure("phase0", path=tmp_path):
+        pass
+    with profiling.measure("phase1"):
+        pass
+
+    lines = (tmp_path / "profile.jsonl").read_text().splitlines()
+    assert [json.loads(line)["phase"] for line in lines] == ["phase0", "phase1"]
+    assert json.loads(lines[0])["path"] == str(tmp_path)
+
+
+def test_unwritable_profile_file(tmp_path: Path, events: List[profiling.Event]) -> None:
+    os.environ[profiling.ProfileEnvName] = str(tmp_path / "missing" / "profile.jsonl")
+
+    with pytest.raises(KeyError):
+        with profiling.measure("phase"):
+            raise KeyError()
+
+    assert events[0]["error"] == "KeyError"
@@ -0,0 +1,123 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import asyncio
+import threading
+from dataclasses import replace
+from pathlib import Path
+from typing import Generator, List, Tuple
+from unittest.mock import Mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv import registry
+from scriptenv.config import Config
+from scriptenv.scriptenv import ScriptEnv
+
+
+@pytest.fixture(autouse=True)
+def clean_registry() -> Generator[None, None, None]:
+    registry.invalidate()
+    yield
+    registry.invalidate()
+
+
+@pytest.fixture
+def build(mocker: MockerFixture) -> Mock:
+    return mocker.patch("scriptenv.registry.ScriptEnvBuilder.build")
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> Config:
+    return Config(cache_path=tmp_path / "base")
+
+
+def test_build_once(build: Mock, config: Config) -> None:
+    env = registry.get(["pkg0", "pkg1"], config)
+
+    assert registry.get(iter(["pkg1", "pkg0"]), config) is env
+    assert env is build.return_value
+    build.assert_called_once_with(["pkg0", "pkg1"])
+
+
+def test_build_per_config(build: Mock, config: Config, tmp_path: Path) -> None:
+    registry.get(["pkg"], config)
+    registry.get(["pkg"], replace(config, cache_path=tmp_path / "other"))
+
+    assert build.call_count == 2
+
+
+def test_default_config(build: Mock) -> None:
+    registry.get(["pkg"])
+    registry.get(["pkg"], Config())
+
+    build.assert_called_once()
+
+
+def test_disabled_lockfile(build: Mock, config: Config) -> None:
+    registry.get(["pkg"], replace(config, use_lockfile=False))
+    registry.get(["pkg"], replace(config, use_lockfile=False))
+
+    assert build.call_count == 2
+
+
+def test_invalidate(build: Mock, config: Config) -> None:
+    registry.get(["pkg0"], config)
+    registry.get(["pkg1"], config)
+    registry.invalidate("pkg0")
+    registry.get(["pkg0"], config)
+    registry.get(["pkg1"], config)
+
+    assert build.call_count == 3
+
+
+def test_invalidate_all(build: Mock, config: Config) -> None:
+    registry.get(["pkg0"], config)
+    registry.get(["pkg1"], config)
+    registry.invalidate()
+    registry.get(["pkg0"], config)
+    registry.get(["pkg1"], config)
+
+    assert build.call_count == 4
+
+
+def test_get_async(build: Mock, config: Config) -> None:
+    threads = []
+    build.side_effect = lambda requirements: threads.append(threading.get_ident())
+
+    async def get_concurrently() -> Tuple[ScriptEnv, ScriptEnv]:
+        return await asyncio.gather(
+            registry.get_async(iter(["pkg"]), config),
+            registry.get_async(["pkg"], config),
+        )
+
+    env0, env1 = asyncio.run(get_concurrently())
+
+    assert env0 is env1
+    assert threading.get_ident() not in threads
+
+
+def test_concurrently_built_env_stored_first(build: Mock, config: Config) -> None:
+    def build_concurrently(requirements: List[str]) -> Mock:
+        if build.call_count == 1:
+            registry.get(requirements, config)
+        return Mock()
+
+    build.side_effect = build_concurrently
+
+    env = registry.get(["pkg"], config)
+    assert registry.get(["pkg"], config) is env
+    assert build.call_count == 2
+
+
+def test_modules(config: Config, mocker: MockerFixture) -> None:
+    indexed_modules = mocker.patch(
+        "scriptenv.registry.ScriptEnvBuilder.indexed_modules"
+    )
+    indexed_modules.return_value = {"module"}
+
+    assert registry.modules(["Pkg.Name>=1.0", "other-pkg", "@"], config) == {
+        "pkg_name",
+        "other_pkg",
+        "module",
+    }
+    indexed_modules.assert_called_once_with(["Pkg.Name>=1.0", "other-pkg", "@"])
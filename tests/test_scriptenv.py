@@ -3,10 +3,15 @@
 import os
 import sys
 from pathlib import Path
+from typing import List
 from unittest.mock import Mock
 
 from pytest_mock import MockerFixture
 
+from scriptenv import profiling
+from scriptenv.config import Config
+from scriptenv.finder import IndexFinder
+from scriptenv.pack import Archive
 from scriptenv.scriptenv import ScriptEnv
 
 
@@ -40,6 +45,30 @@ def test_enable(tmp_path: Path, mocker: MockerFixture) -> None:
     )
 
 
+def test_enable_with_index(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch("sys.path", ["existing_syspath"])
+    existing_finder = IndexFinder(tmp_path, {})
+    mocker.patch("sys.meta_path", [existing_finder])
+    mocker.patch("os.environ", dict(PATH="existing_path"))
+
+    env = ScriptEnv(install_base=tmp_path, packages=["pkg"], index={"mod": ["pkg"]})
+    env.enable()
+
+    assert sys.path == ["existing_syspath"]
+    assert isinstance(sys.meta_path[0], IndexFinder)
+    assert sys.meta_path[1:] == [existing_finder]
+    assert os.environ["PYTHONPATH"] == str(tmp_path / "pkg")
+    assert os.environ["PATH"] == os.pathsep.join(
+        [str(tmp_path / "pkg" / "bin"), "existing_path"]
+    )
+
+    env.enable()
+    assert len(sys.meta_path) == 2
+
+    env.disable()
+    assert sys.meta_path == [existing_finder]
+
+
 def test_enable_empty_paths(tmp_path: Path, mocker: MockerFixture) -> None:
     mocker.patch("sys.path", [])
     mocker.patch("os.environ", {})
@@ -83,12 +112,55 @@ def test_enable_avoid_duplicates(tmp_path: Path, mocker: MockerFixture) -> None:
     assert os.environ["PATH"] == os.pathsep.join([str(tmp_path / "package" / "bin")])
 
 
+def test_enable_with_bin_path(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch("sys.path", ["existing_syspath"])
+    mocker.patch("os.environ", dict(PATH="existing_path"))
+
+    env = ScriptEnv(
+        install_base=tmp_path, packages=["pkg0", "pkg1"], bin_path=tmp_path / "bin"
+    )
+    env.enable()
+
+    assert os.environ["PATH"] == os.pathsep.join(
+        [str(tmp_path / "bin"), "existing_path"]
+    )
+
+    env.disable()
+    assert os.environ["PATH"] == "existing_path"
+
+
+def test_enable_with_archive(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch("sys.path", ["existing_syspath"])
+    mocker.patch.dict(sys.modules)
+    mocker.patch("os.environ", dict(PYTHONPATH="existing_pythonpath"))
+    archive = Archive(tmp_path / "archive.zip", ("pkg0",))
+    module_mock = Mock()
+    module_mock.__file__ = str(tmp_path / "archive.zip" / "module.pyc")
+
+    env = ScriptEnv(tmp_path, ["pkg0", "pkg1"], archive=archive)
+    env.enable()
+
+    assert sys.path == [
+        str(tmp_path / "archive.zip"),
+        str(tmp_path / "pkg1"),
+        "existing_syspath",
+    ]
+    assert os.environ["PYTHONPATH"] == os.pathsep.join(
+        [str(tmp_path / "archive.zip"), str(tmp_path / "pkg1"), "existing_pythonpath"]
+    )
+
+    sys.modules["module"] = module_mock
+    env.disable()
+    assert sys.path == ["existing_syspath"]
+    assert "module" not in sys.modules
+
+
 def test_disable(tmp_path: Path, mocker: MockerFixture) -> None:
     module_mock = Mock()
     module_mock.__file__ = str(tmp_path / "package" / "some_file.py")
 
     mocker.patch("sys.path", ["existing_syspath", str(tmp_path / "package")])
-    mocker.patch.dict(sys.modules, dict(package=module_mock))
+    mocker.patch.dict(sys.modules)
     mocker.patch(
         "os.environ",
         dict(
@@ -100,6 +172,8 @@ def test_disable(tmp_path: Path, mocker: MockerFixture) -> None:
     )
 
     env = ScriptEnv(install_base=tmp_path, packages=["package"])
+    env.enable()
+    sys.modules["package"] = module_mock
     env.disable()
 
     assert sys.path == ["existing_syspath"]
@@ -108,6 +182,50 @@ def test_disable(tmp_path: Path, mocker: MockerFixture) -> None:
     assert os.environ["PATH"] == "existing_path"
 
 
+def test_disable_removes_only_modules_imported_since_enabled(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    imported_before, imported_elsewhere, imported = Mock(), Mock(), Mock()
+    imported_before.__file__ = str(tmp_path / "package" / "before.py")
+    imported_elsewhere.__file__ = str(tmp_path / "elsewhere.py")
+    imported.__file__ = str(tmp_path / "package" / "imported.py")
+    mocker.patch.dict(sys.modules, dict(before=imported_before))
+
+    env = ScriptEnv(install_base=tmp_path, packages=["package"])
+    env.disable()
+    assert sys.modules["before"] is imported_before
+
+    env.enable()
+    sys.modules["elsewhere"] = imported_elsewhere
+    sys.modules["imported"] = imported
+    env.disable()
+
+    assert sys.modules["before"] is imported_before
+    assert sys.modules["elsewhere"] is imported_elsewhere
+    assert "imported" not in sys.modules
+
+
+def test_enable_again_keeps_imported_modules(
+    tmp_path: Path, mocker: MockerFixture
+) -> None:
+    imported = Mock()
+    imported.__file__ = str(tmp_path / "package" / "imported.py")
+    mocker.patch.dict(sys.modules)
+    mocker.patch("sys.path", [])
+    mocker.patch("os.environ", {})
+
+    env = ScriptEnv(install_base=tmp_path, packages=["package"])
+    env.enable()
+    sys.modules["imported"] = imported
+    sys.path.insert(0, "elsewhere")
+    env.enable()
+
+    assert sys.modules["imported"] is imported
+    assert sys.path == [str(tmp_path / "package"), "elsewhere"]
+    env.disable()
+    assert "imported" not in sys.modules
+
+
 def test_as_contextmanager(tmp_path: Path, mocker: MockerFixture) -> None:
     env = ScriptEnv(install_base=tmp_path, packages=[])
     enable_mock = mocker.patch.object(env, "enable")
@@ -117,3 +235,67 @@ def test_as_contextmanager(tmp_path: Path, mocker: MockerFixture) -> None:
         assert context is None
         enable_mock.assert_called_once_with()
     disable_mock.assert_called_once_with()
+
+
+def test_profiling(tmp_path: Path, events: List[profiling.Event]) -> None:
+    env = ScriptEnv(install_base=tmp_path, packages=["pkg"])
+    env.enable()
+    env.disable()
+
+    assert [event["phase"] for event in events] == ["enable", "disable"]
+
+
+def test_pinned_packages(tmp_path: Path) -> None:
+    base = ScriptEnv(install_base=tmp_path, packages=["pkg0"])
+    layer = ScriptEnv(install_base=tmp_path, packages=["pkg1"], base=base)
+
+    assert ScriptEnv(tmp_path, ["pkg2"], base=layer).pinned_packages() == [
+        "pkg2",
+        "pkg1",
+        "pkg0",
+    ]
+
+
+def test_add(tmp_path: Path, mocker: MockerFixture) -> None:
+    base = ScriptEnv(install_base=tmp_path, packages=["pkg0"])
+    build_mock = mocker.patch("scriptenv.builder.ScriptEnvBuilder.build")
+    build_mock.return_value = ScriptEnv(tmp_path, ["pkg1"], base=base)
+
+    layer = base.add("requirement0", "requirement1")
+
+    build_mock.assert_called_once_with(("requirement0", "requirement1"), base=base)
+    assert layer is build_mock.return_value
+    assert sys.path[0] == str(tmp_path / "pkg1")
+
+
+def test_add_with_config(tmp_path: Path, mocker: MockerFixture) -> None:
+    config = Config(cache_path=tmp_path / "base")
+    base = ScriptEnv(install_base=tmp_path, packages=["pkg0"], config=config)
+    builder_mock = mocker.patch("scriptenv.builder.ScriptEnvBuilder")
+    builder_mock.return_value.build.return_value = ScriptEnv(tmp_path, ["pkg1"])
+
+    base.add("requirement")
+
+    builder_mock.assert_called_once_with(config)
+    builder_mock.return_value.build.assert_called_once_with(("requirement",), base=base)
+
+
+def test_layers_enabled_separately(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch("sys.path", ["existing_syspath"])
+    mocker.patch("os.environ", dict(PATH="existing_path"))
+    base = ScriptEnv(install_base=tmp_path, packages=["pkg0"])
+    layer = ScriptEnv(install_base=tmp_path, packages=["pkg1"], base=base)
+
+    base.enable()
+    layer.enable()
+    assert sys.path == [
+        str(tmp_path / "pkg1"),
+        str(tmp_path / "pkg0"),
+        "existing_syspath",
+    ]
+
+    layer.disable()
+    assert sys.path == [str(tmp_path / "pkg0"), "existing_syspath"]
+    assert os.environ["PATH"] == os.pathsep.join(
+        [str(tmp_path / "pkg0" / "bin"), "existing_path"]
+    )
@@ -0,0 +1,68 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,disable=redefined-outer-name,unused-argument
+import os
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from scriptenv import store
+
+
+@pytest.fixture
+def trees(tmp_path: Path) -> Path:
+    for tree in ["tree0", "tree1"]:
+        (tmp_path / tree / "sub").mkdir(parents=True)
+        (tmp_path / tree / "same.py").write_text("same")
+        (tmp_path / tree / "sub" / "same.py").write_text("same")
+        (tmp_path / tree / "different.py").write_text(tree)
+    return tmp_path
+
+
+def test_link_tree(trees: Path) -> None:
+    store.link_tree(trees / "tree0", trees / "store")
+    store.link_tree(trees / "tree1", trees / "store")
+
+    assert (trees / "tree0" / "same.py").samefile(trees / "tree1" / "same.py")
+    assert (trees / "tree0" / "same.py").samefile(trees / "tree1" / "sub" / "same.py")
+    assert not (trees / "tree0" / "different.py").samefile(
+        trees / "tree1" / "different.py"
+    )
+    assert (trees / "tree1" / "different.py").read_text() == "tree1"
+    assert len(list((trees / "store").rglob("*-*"))) == 3
+
+
+def test_link_tree_keeps_modes(trees: Path) -> None:
+    (trees / "tree1" / "same.py").chmod(0o755)
+
+    store.link_tree(trees / "tree0", trees / "store")
+    store.link_tree(trees / "tree1", trees / "store")
+
+    assert not (trees / "tree0" / "same.py").samefile(trees / "tree1" / "same.py")
+    assert os.access(trees / "tree1" / "same.py", os.X_OK)
+    assert not os.access(trees / "tree0" / "same.py", os.X_OK)
+
+
+def test_link_tree_twice(trees: Path) -> None:
+    store.link_tree(trees / "tree0", trees / "store")
+    store.link_tree(trees / "tree0", trees / "store")
+
+    assert (trees / "tree0" / "same.py").read_text() == "same"
+    assert not list((trees / "tree0").rglob("*.link"))
+
+
+def test_link_tree_skips_symlinks(trees: Path) -> None:
+    (trees / "tree0" / "symlink.py").symlink_to(trees / "tree0" / "same.py")
+
+    store.link_tree(trees / "tree0", trees / "store")
+
+    assert (trees / "tree0" / "symlink.py").is_symlink()
+
+
+def test_link_tree_fallback_to_copies(trees: Path, mocker: MockerFixture) -> None:
+    mocker.patch("os.link", side_effect=OSError("cross-device link"))
+
+    store.link_tree(trees / "tree0", trees / "store")
+    store.link_tree(trees / "tree1", trees / "store")
+
+    assert (trees / "tree0" / "same.py").read_text() == "same"
+    assert not (trees / "tree0" / "same.py").samefile(trees / "tree1" / "same.py")
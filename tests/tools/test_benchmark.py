@@ -0,0 +1,74 @@
+# pylint: disable=missing-module-docstring,missing-function-docstring,unused-argument,redefined-outer-name
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from tools import benchmark
+
+
+def test_run() -> None:
+    modules = set(sys.modules)
+
+    results = benchmark.run(packages=2, modules=10, repeat=1)
+
+    assert set(results) == {
+        "requires_cold",
+        "requires_warm",
+        "install_packages",
+        "fetch",
+        "fetch_serial",
+        "enable_disable",
+        "import_module",
+        "import_module_with_index",
+    }
+    assert all(duration > 0 for duration in results.values())
+    assert set(sys.modules) == modules
+
+
+def test_regressions() -> None:
+    assert (
+        benchmark.regressions(
+            dict(slower=1.0, faster=1.0, tolerated=1.0),
+            dict(slower=1.3, faster=0.5, tolerated=1.2, new=1.0),
+            tolerance=0.25,
+        )
+        == ["slower"]
+    )
+
+
+def test_report() -> None:
+    assert list(
+        benchmark.report(
+            dict(slower=0.001, faster=0.002),
+            dict(slower=0.002, faster=0.001, new=0.003),
+            tolerance=0.25,
+        )
+    ) == [
+        "slower: 1.00ms => 2.00ms (+100%) REGRESSION",
+        "faster: 2.00ms => 1.00ms (-50%)",
+        "new: 3.00ms (new)",
+    ]
+
+
+def test_save_and_compare(tmp_path: Path, mocker: MockerFixture) -> None:
+    run_mock = mocker.patch.object(benchmark, "run")
+    run_mock.return_value = dict(bench=0.001)
+    baseline = tmp_path / "baseline.json"
+
+    benchmark.save(str(baseline), packages=1, modules=2, repeat=3, latency=0.5)
+
+    run_mock.assert_called_once_with(packages=1, modules=2, repeat=3, latency=0.5)
+    assert json.loads(baseline.read_text())["results"] == dict(bench=0.001)
+    assert list(benchmark.compare(str(baseline))) == ["bench: 1.00ms => 1.00ms (+0%)"]
+
+
+def test_compare_regression(tmp_path: Path, mocker: MockerFixture) -> None:
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(dict(results=dict(bench=0.001))))
+    mocker.patch.object(benchmark, "run").return_value = dict(bench=0.002)
+
+    with pytest.raises(SystemExit, match="performance regressions: bench"):
+        list(benchmark.compare(str(baseline)))
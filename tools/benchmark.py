@@ -0,0 +1,233 @@
+"""Script to benchmark scriptenv against packages served by MockPI"""
+import importlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Dict, Generator, List
+
+import fire
+
+import scriptenv
+from scriptenv import pip, registry
+from scriptenv.builder import ScriptEnvBuilder
+from scriptenv.config import Config
+from scriptenv.scriptenv import ScriptEnv
+from testlibs.mockpi import DistType, MockPI, Package
+
+DefaultBaseline = Path(".benchmarks") / "baseline.json"
+Results = Dict[str, float]
+
+
+def run(
+    packages: int = 20, modules: int = 10000, repeat: int = 5, latency: float = 0.0
+) -> Results:
+    """
+    Runs all benchmarks and returns the median duration of each in seconds.
+
+    Arguments:
+        packages: Number of packages required by the benchmarked ScriptEnvs.
+        modules: Number of additional modules in sys.modules while enabling.
+        repeat: Number of runs of each benchmark.
+        latency: Seconds MockPI delays each response to simulate a remote index.
+    """
+    with tempfile.TemporaryDirectory() as tmp, _isolated_runtime():
+        mockpi = MockPI(Path(tmp) / "mockpi", latency=latency)
+        names = [f"benchmarkpackage{index}" for index in range(packages)]
+        for name in names:
+            mockpi.add(Package(name=name, dist_type=DistType.WHEEL))
+        with mockpi.server():
+            benchmarks = _Benchmarks(Path(tmp), names, modules)
+            return {
+                name: statistics.median(benchmark() for _ in range(repeat))
+                for name, benchmark in benchmarks.all().items()
+            }
+
+
+def save(
+    baseline: str = str(DefaultBaseline),
+    packages: int = 20,
+    modules: int = 10000,
+    repeat: int = 5,
+    latency: float = 0.0,
+) -> str:
+    """Runs all benchmarks and stores the results as baseline."""
+    results = run(packages=packages, modules=modules, repeat=repeat, latency=latency)
+    Path(baseline).parent.mkdir(parents=True, exist_ok=True)
+    Path(baseline).write_text(
+        json.dumps(
+            dict(
+                python=platform.python_version(),
+                platform=platform.platform(),
+                results=results,
+            ),
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    return f"saved baseline to {baseline}"
+
+
+def compare(  # pylint: disable=too-many-arguments
+    baseline: str = str(DefaultBaseline),
+    tolerance: float = 0.25,
+    packages: int = 20,
+    modules: int = 10000,
+    repeat: int = 5,
+    latency: float = 0.0,
+) -> Generator[str, None, None]:
+    """
+    Runs all benchmarks and compares the results with a baseline,
+    exits with an error if a benchmark got slower than the tolerance allows.
+    """
+    base = json.loads(Path(baseline).read_text(encoding="utf-8"))["results"]
+    results = run(packages=packages, modules=modules, repeat=repeat, latency=latency)
+    yield from report(base, results, tolerance)
+    regressed = regressions(base, results, tolerance)
+    if regressed:
+        sys.exit(f"performance regressions: {', '.join(regressed)}")
+
+
+def report(
+    baseline: Results, results: Results, tolerance: float
+) -> Generator[str, None, None]:
+    """Formats the changes of each benchmark compared to a baseline."""
+    regressed = regressions(baseline, results, tolerance)
+    for name, duration in results.items():
+        if name not in baseline:
+            yield f"{name}: {duration * 1000:.2f}ms (new)"
+        else:
+            yield (
+                f"{name}: {baseline[name] * 1000:.2f}ms => {duration * 1000:.2f}ms "
+                f"({duration / baseline[name] - 1:+.0%})"
+                f"{' REGRESSION' if name in regressed else ''}"
+            )
+
+
+def regressions(baseline: Results, results: Results, tolerance: float) -> List[str]:
+    """Returns the benchmarks which got slower than a tolerance allows."""
+    return [
+        name
+        for name, duration in results.items()
+        if name in baseline and duration > baseline[name] * (1 + tolerance)
+    ]
+
+
+class _Benchmarks:
+    def __init__(self, base: Path, names: List[str], modules: int) -> None:
+        self._base = base
+        self._names = names
+        self._modules = modules
+        self._warm = self._config()
+        self._warm_env = ScriptEnvBuilder(self._warm).build(names)
+        self._indexed_env = ScriptEnvBuilder(
+            Config(cache_path=self._warm.cache_path, use_import_index=True)
+        ).build(names)
+        self._urls = pip.resolve(names, self._config().cache_path).values()
+
+    def all(self) -> Dict[str, Callable[[], float]]:
+        """Benchmarks by name, each returns the duration of one run."""
+        return dict(
+            requires_cold=self.requires_cold,
+            requires_warm=self.requires_warm,
+            install_packages=self.install_packages,
+            fetch=lambda: self.fetch(self._warm.download_workers),
+            fetch_serial=lambda: self.fetch(1),
+            enable_disable=self.enable_disable,
+            import_module=lambda: self.import_module(self._warm_env),
+            import_module_with_index=lambda: self.import_module(self._indexed_env),
+        )
+
+    def _config(self) -> Config:
+        return Config(cache_path=Path(tempfile.mkdtemp(dir=self._base)))
+
+    def requires_cold(self) -> float:
+        """requires with an empty cache, downloading all packages."""
+        return self._requires(self._config())
+
+    def requires_warm(self) -> float:
+        """requires with the lock files and packages already cached."""
+        return self._requires(self._warm)
+
+    def _requires(self, config: Config) -> float:
+        os.environ["SCRIPTENV_CACHE_PATH"] = str(config.cache_path)
+        registry.invalidate()
+        with _stopwatch() as elapsed:
+            env = scriptenv.requires(*self._names)
+        env.disable()
+        return elapsed[0]
+
+    def install_packages(self) -> float:
+        """Installs all packages from the downloads cache."""
+        builder = ScriptEnvBuilder(self._config())
+        shutil.copytree(
+            ScriptEnvBuilder(self._warm).package_cache_path,
+            builder.package_cache_path,
+        )
+        with _stopwatch() as elapsed:
+            builder.install_packages(self._warm_env.packages)
+        return elapsed[0]
+
+    def fetch(self, workers: int) -> float:
+        """Downloads all packages resolved by their metadata files."""
+        dest = self._config().cache_path
+        with _stopwatch() as elapsed:
+            pip.fetch(self._urls, dest, workers=workers)
+        return elapsed[0]
+
+    def enable_disable(self) -> float:
+        """Enables and disables a ScriptEnv with many modules imported."""
+        modules = {f"benchmarkmodule{index}" for index in range(self._modules)}
+        sys.modules.update({name: ModuleType(name) for name in modules})
+        try:
+            with _stopwatch() as elapsed:
+                self._warm_env.enable()
+                self._warm_env.disable()
+        finally:
+            for name in modules:
+                del sys.modules[name]
+        return elapsed[0]
+
+    def import_module(self, env: ScriptEnv) -> float:
+        """Imports a module of the last package of an enabled ScriptEnv."""
+        env.enable()
+        try:
+            with _stopwatch() as elapsed:
+                importlib.import_module(self._names[-1])
+        finally:
+            env.disable()
+        return elapsed[0]
+
+
+@contextmanager
+def _stopwatch() -> Generator[List[float], None, None]:
+    elapsed: List[float] = []
+    start = time.perf_counter()
+    yield elapsed
+    elapsed.append(time.perf_counter() - start)
+
+
+@contextmanager
+def _isolated_runtime() -> Generator[None, None, None]:
+    path, meta_path, environ = list(sys.path), list(sys.meta_path), dict(os.environ)
+    modules = set(sys.modules)
+    try:
+        yield
+    finally:
+        sys.path, sys.meta_path = path, meta_path
+        os.environ.clear()
+        os.environ.update(environ)
+        for name in set(sys.modules) - modules:
+            del sys.modules[name]
+        registry.invalidate()
+
+
+if __name__ == "__main__":
+    fire.Fire()